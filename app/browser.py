@@ -0,0 +1,178 @@
+"""Long-lived Playwright browser pool for dynamic rendering.
+
+Playwright's sync API binds every object to the thread that created it, so
+each pooled browser lives on its own worker thread. Callers submit render
+jobs to a shared queue and block on the result; any idle worker leases its
+warm browser/context to the job. Browsers are recycled after `max_uses`
+renders or when they crash. Tunable via environment variables:
+
+  SCRAPER_BROWSERS           number of warm browsers (default 2)
+  SCRAPER_BROWSER_MAX_USES   renders before a browser is recycled (default 100)
+"""
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+# Resource types dropped when block_resources=True
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+
+
+def _block_route(route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+class _Worker:
+    """Owns one Playwright driver, browser and context on a dedicated thread."""
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.uses = 0
+        self.thread = threading.Thread(target=self.run, name=f"browser-pool-{index}", daemon=True)
+        self.thread.start()
+
+    def launch(self) -> None:
+        if self.playwright is None:
+            from playwright.sync_api import sync_playwright
+            self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(headless=True)
+        self.context = self.browser.new_context()
+        self.uses = 0
+
+    def recycle(self) -> None:
+        for closable in (self.context, self.browser):
+            if closable is None:
+                continue
+            try:
+                closable.close()
+            except Exception:
+                pass
+        self.context = None
+        self.browser = None
+
+    def render(self, url: str, wait_selector: Optional[str], wait_ms: Optional[int],
+               block_resources: bool, timeout_ms: int) -> Tuple[str, str]:
+        if self.browser is None or not self.browser.is_connected():
+            self.recycle()
+            self.launch()
+        page = self.context.new_page()
+        try:
+            if block_resources:
+                page.route("**/*", _block_route)
+            page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+            if wait_selector:
+                try:
+                    page.wait_for_selector(wait_selector, timeout=(wait_ms or 3000))
+                except Exception:
+                    pass
+            elif wait_ms:
+                page.wait_for_timeout(wait_ms)
+            return page.content(), page.url
+        finally:
+            try:
+                page.close()
+                self.context.clear_cookies()
+            except Exception:
+                pass
+            self.uses += 1
+
+    def run(self) -> None:
+        # Warm up eagerly; a failed launch is retried on the first job
+        try:
+            self.launch()
+        except Exception:
+            self.recycle()
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            future, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.render(*args))
+            except BaseException as e:
+                future.set_exception(e)
+                if self.browser is not None and not self.browser.is_connected():
+                    self.recycle()
+            if self.uses >= self.pool.max_uses:
+                self.recycle()
+        self.recycle()
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+
+class BrowserPool:
+    """Fixed-size pool of warm headless Chromium browsers."""
+
+    def __init__(self, size: int = 2, max_uses: int = 100):
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._workers = [_Worker(self, i) for i in range(self.size)]
+        self._closed = False
+
+    def render(
+        self,
+        url: str,
+        *,
+        wait_selector: Optional[str] = None,
+        wait_ms: Optional[int] = None,
+        block_resources: bool = False,
+        timeout_ms: int = 30000,
+    ) -> Tuple[str, str]:
+        """Render `url` on a leased browser and return (html, final_url)."""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        future: Future = Future()
+        self._jobs.put((future, (url, wait_selector, wait_ms, block_resources, timeout_ms)))
+        return future.result()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.thread.join(timeout=10)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    """Return the process-wide browser pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=int(os.getenv("SCRAPER_BROWSERS", "2")),
+                    max_uses=int(os.getenv("SCRAPER_BROWSER_MAX_USES", "100")),
+                )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(shutdown_pool)
@@ -0,0 +1,207 @@
+"""On-disk HTTP response cache with conditional revalidation.
+
+Entries are keyed by normalized URL plus render mode. Fresh entries (younger
+than the TTL) are served without touching the network; stale entries with an
+ETag or Last-Modified are revalidated with If-None-Match/If-Modified-Since so
+that a 304 costs only the round-trip. The cache is bounded in bytes and evicts
+least recently used entries. Tunable via environment variables:
+
+  SCRAPER_CACHE             set to 0 to disable the cache
+  SCRAPER_CACHE_DIR         cache directory (default <SCRAPER_DATA_DIR>/http-cache)
+  SCRAPER_CACHE_TTL         seconds an entry is served without revalidation (default 0)
+  SCRAPER_CACHE_MAX_BYTES   total body bytes kept on disk (default 256 MiB)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .jobs import data_dir, write_atomic
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form for cache keys: lowercase scheme/host, no default port,
+    sorted query parameters and no fragment."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class CachedResponse:
+    def __init__(self, key: str, meta: Dict[str, Any], body: bytes):
+        self.key = key
+        self.meta = meta
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.meta.get("encoding") or "utf-8", errors="replace")
+
+    @property
+    def url(self) -> str:
+        return self.meta["final_url"]
+
+    def age(self) -> float:
+        return time.time() - self.meta["stored_at"]
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, directory: Path, ttl: float = 0, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(url: str, mode: str = "static") -> str:
+        return hashlib.sha256(f"{normalize_url(url)}\0{mode}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        shard = self.directory / key[:2]
+        return shard / f"{key}.json", shard
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        meta_path, shard = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = (shard / meta["body"]).read_bytes()
+            os.utime(meta_path)  # LRU: access time is the meta file mtime
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return CachedResponse(key, meta, body)
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return entry.age() < self.ttl
+
+    def put(self, key: str, body: bytes, *, final_url: str, encoding: Optional[str] = None,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        meta_path, shard = self._paths(key)
+        shard.mkdir(exist_ok=True)
+        previous = self._read_meta(meta_path)
+        # Bodies are content-named so a concurrent reader never pairs new meta with an old body
+        body_name = f"{key}.{hashlib.sha256(body).hexdigest()[:12]}.body"
+        if not (shard / body_name).exists():
+            write_atomic(shard / body_name, body)
+        meta = {
+            "final_url": final_url,
+            "encoding": encoding,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+            "size": len(body),
+            "body": body_name,
+        }
+        write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        if previous and previous.get("body") != body_name:
+            self._unlink(shard / previous["body"])
+        self._account(len(body) - (previous.get("size", 0) if previous else 0))
+
+    def refresh(self, entry: CachedResponse) -> None:
+        """Mark a revalidated (304) entry fresh again without rewriting its body."""
+        meta_path, _ = self._paths(entry.key)
+        entry.meta["stored_at"] = time.time()
+        write_atomic(meta_path, json.dumps(entry.meta).encode("utf-8"))
+
+    @staticmethod
+    def _read_meta(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _scan(self):
+        entries = []
+        for meta_path in self.directory.glob("*/*.json"):
+            meta = self._read_meta(meta_path)
+            if not meta:
+                continue
+            try:
+                accessed = meta_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((accessed, meta_path, meta))
+        return entries
+
+    def _account(self, delta: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(meta.get("size", 0) for _, _, meta in self._scan())
+            else:
+                self._size += delta
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until 90% of the budget is free
+        entries = sorted(self._scan(), key=lambda e: e[0])
+        total = sum(meta.get("size", 0) for _, _, meta in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, meta_path, meta in entries:
+            if total <= target:
+                break
+            self._unlink(meta_path)
+            self._unlink(meta_path.parent / meta["body"])
+            total -= meta.get("size", 0)
+        self._size = total
+
+
+_cache: Optional[ResponseCache] = None
+_cache_disabled = False
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None when disabled or not writable."""
+    global _cache, _cache_disabled
+    if _cache is None and not _cache_disabled:
+        with _cache_lock:
+            if _cache is None and not _cache_disabled:
+                if os.getenv("SCRAPER_CACHE", "1").lower() in {"0", "false", "no", "off"}:
+                    _cache_disabled = True
+                    return None
+                try:
+                    directory = os.getenv("SCRAPER_CACHE_DIR") or str(data_dir() / "http-cache")
+                    _cache = ResponseCache(
+                        Path(directory),
+                        ttl=float(os.getenv("SCRAPER_CACHE_TTL", "0")),
+                        max_bytes=int(os.getenv("SCRAPER_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+                    )
+                except OSError:
+                    # Read-only filesystems (e.g. serverless bundles) simply run uncached
+                    _cache_disabled = True
+    return _cache
+
+
+def set_cache(cache: Optional[ResponseCache]) -> None:
+    """Replace the process-wide cache (None disables caching)."""
+    global _cache, _cache_disabled
+    with _cache_lock:
+        _cache = cache
+        _cache_disabled = cache is None
@@ -0,0 +1,291 @@
+"""Breadth-first site crawler.
+
+Starting from a seed URL, each page is scraped like a single `/scrape` page
+(same selector, dynamic rendering, cache and element cap) and the links
+matched by `follow_selector` (optionally filtered by `follow_pattern`) are
+queued one level deeper. The frontier and the dedup index of normalized URLs
+live in a temporary SQLite file, so memory stays bounded on 100k+ URL crawls:
+the process only holds the pages in flight. robots.txt rules and Crawl-delay
+are honored per host, and all fetches share one HostRateLimiter.
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
+from urllib.parse import urldefrag, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import pandas as pd
+
+from . import fetcher
+from .cache import normalize_url
+from .extract import ParsedPage
+from .utils import (
+    DEFAULT_CONCURRENCY, DEFAULT_PER_HOST, HostRateLimiter, ScrapeCancelled, add_stat, iter_pages, merge_pages,
+)
+
+DEFAULT_MAX_DEPTH = 2
+DEFAULT_MAX_PAGES = 100
+DEFAULT_FOLLOW_SELECTOR = "a[href]"
+
+# Links to files that are never HTML pages
+_SKIP_EXTENSIONS = re.compile(
+    r"\.(?:jpe?g|png|gif|webp|svg|ico|bmp|tiff?|pdf|zip|gz|tgz|bz2|xz|7z|rar|tar|exe|dmg|msi|"
+    r"mp3|mp4|m4a|avi|mov|mkv|webm|wav|ogg|woff2?|ttf|eot|css|js|json|xml|rss|atom|csv|xlsx?|docx?|pptx?)$",
+    re.IGNORECASE,
+)
+
+PageData = Union[pd.DataFrame, Dict[str, pd.DataFrame]]
+
+
+class Frontier:
+    """URL frontier plus dedup index in SQLite.
+
+    URLs are deduplicated by their normalized form and handed out lowest
+    depth first, then in discovery order (breadth-first).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._temp: Optional[str] = None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="crawl-", suffix=".sqlite")
+            os.close(fd)
+            self._temp = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # Scratch data: durability is not needed
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, url TEXT NOT NULL,"
+            " depth INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS pending ON urls (depth, id) WHERE done = 0")
+
+    def add(self, urls: Iterable[str], depth: int) -> int:
+        """Queue unseen `urls` at `depth`; returns how many were new."""
+        rows = [(normalize_url(u), u, depth) for u in urls]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self.db.total_changes
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR IGNORE INTO urls (key, url, depth) VALUES (?, ?, ?)", rows)
+            self.db.execute("COMMIT")
+            return self.db.total_changes - before
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Next (url, depth) to visit, or None when the frontier is empty."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT id, url, depth FROM urls WHERE done = 0 ORDER BY depth, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE urls SET done = 1 WHERE id = ?", (row[0],))
+            return row[1], row[2]
+
+    def seen(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def close(self) -> None:
+        self.db.close()
+        if self._temp:
+            try:
+                os.unlink(self._temp)
+            except FileNotFoundError:
+                pass
+
+
+class RobotsCache:
+    """robots.txt rules per host, fetched once through the shared session.
+
+    As in urllib.robotparser: 401/403 disallow the whole host, other 4xx
+    allow it; 5xx and unreachable hosts are treated as disallowed (RFC 9309).
+    """
+
+    def __init__(self, user_agent: str = fetcher.USER_AGENT):
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._parsers: Dict[str, RobotFileParser] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+
+    def _load(self, origin: str) -> RobotFileParser:
+        parser = RobotFileParser(origin + "/robots.txt")
+        try:
+            resp = fetcher.get_session().get(parser.url, timeout=fetcher.default_timeout())
+        except Exception:
+            parser.disallow_all = True
+            return parser
+        if resp.status_code in (401, 403) or resp.status_code >= 500:
+            parser.disallow_all = True
+        elif resp.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(resp.text.splitlines())
+        return parser
+
+    def get(self, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc.lower()}"
+        with self._lock:
+            parser = self._parsers.get(origin)
+            if parser is not None:
+                return parser
+            host_lock = self._host_locks.setdefault(origin, threading.Lock())
+        with host_lock:  # one robots.txt fetch per host even with many workers
+            with self._lock:
+                parser = self._parsers.get(origin)
+            if parser is None:
+                parser = self._load(origin)
+                with self._lock:
+                    self._parsers[origin] = parser
+        return parser
+
+    def allowed(self, url: str) -> bool:
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        delay = self.get(url).crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+
+
+def follow_links(page: ParsedPage, follow_selector: str = DEFAULT_FOLLOW_SELECTOR,
+                 pattern: Optional[Pattern] = None, host: Optional[str] = None) -> List[str]:
+    """Absolute http(s) links of `page` worth crawling, without fragments."""
+    links = []
+    for el in page.select(follow_selector):
+        url = page.resolver.resolve(el.get("href"))
+        if not url:
+            continue
+        url = urldefrag(url)[0]
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or _SKIP_EXTENSIONS.search(parts.path):
+            continue
+        if host is not None and parts.netloc.lower() != host:
+            continue
+        if pattern is not None and not pattern.search(url):
+            continue
+        links.append(url)
+    return links
+
+
+def _label(data: PageData, url: str) -> PageData:
+    frames = data.values() if isinstance(data, dict) else [data]
+    for df in frames:
+        df.insert(0, "source_url", url)
+    return data
+
+
+def iter_crawl(
+    seed_url: str,
+    selector: Optional[str] = None,
+    *,
+    follow_selector: Optional[str] = None,
+    follow_pattern: Optional[Union[str, Pattern]] = None,
+    same_host: bool = True,
+    max_depth: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    delay_ms: Optional[int] = None,
+    respect_robots: bool = True,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    stats: Optional[Dict[str, float]] = None,
+    frontier_path: Optional[str] = None,
+    **options,
+) -> Iterator[Tuple[int, PageData]]:
+    """Crawl breadth-first from `seed_url` and yield (n, data) per scraped page,
+    n counting from 1, in the shape iter_pages yields (so merge_pages and
+    iter_file export crawls unchanged). Every frame gets a leading
+    `source_url` column.
+
+    Links matched by `follow_selector` (default `a[href]`) and, when given,
+    the `follow_pattern` regex are followed up to `max_depth` levels below the
+    seed (default 2), staying on the seed's host unless same_host=False, until
+    `max_pages` pages were scraped (default 100). Up to `concurrency` pages are
+    fetched at once (default 4), `per_host`/`delay_ms` and robots.txt
+    Crawl-delay limit each host. Pages disallowed by robots.txt (unless
+    respect_robots=False) or failing to load are skipped and counted in
+    stats['robots_blocked'] / stats['errors']. Remaining `options` (dynamic,
+    use_cache, max_elements, ...) are passed to iter_pages for every page.
+    """
+    max_depth = DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+    max_pages = DEFAULT_MAX_PAGES if max_pages is None else max_pages
+    workers = max(1, concurrency or DEFAULT_CONCURRENCY)
+    pattern = re.compile(follow_pattern) if isinstance(follow_pattern, str) else follow_pattern
+    host = urlsplit(seed_url).netloc.lower() if same_host else None
+    limiter = HostRateLimiter(per_host or DEFAULT_PER_HOST, delay_ms)
+    robots = RobotsCache() if respect_robots else None
+    delays_set = set()
+
+    def visit(url: str, depth: int) -> Tuple[int, Optional[PageData], List[str]]:
+        if robots is not None:
+            if not robots.allowed(url):
+                add_stat(stats, "robots_blocked")
+                return depth, None, []
+            origin = urlsplit(url).netloc.lower()
+            if origin not in delays_set:
+                delays_set.add(origin)
+                delay = robots.crawl_delay(url)
+                if delay:
+                    limiter.set_delay(url, delay)
+        links: List[str] = []
+
+        def collect(page: ParsedPage) -> None:
+            if depth < max_depth:
+                links.extend(follow_links(page, follow_selector or DEFAULT_FOLLOW_SELECTOR, pattern, host))
+
+        try:
+            data = merge_pages(iter_pages(url, selector, limiter=limiter, page_hook=collect, stats=stats, **options))
+        except ScrapeCancelled:
+            raise
+        except Exception:
+            add_stat(stats, "errors")
+            return depth, None, []
+        return depth, _label(data, url), links
+
+    frontier = Frontier(frontier_path)
+    pending: deque = deque()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    scraped = 0
+    try:
+        frontier.add([seed_url], 0)
+
+        def fill() -> None:
+            # Pages in flight count against max_pages so the crawl never overshoots
+            while len(pending) < workers and scraped + len(pending) < max_pages:
+                nxt = frontier.pop()
+                if nxt is None:
+                    return
+                pending.append(pool.submit(visit, *nxt))
+
+        fill()
+        while pending:
+            # Results are taken in submission order, which keeps output deterministic
+            depth, data, links = pending.popleft().result()
+            if links:
+                frontier.add(links, depth + 1)
+            if data is not None:
+                scraped += 1
+                if progress:
+                    progress(scraped, None)
+                yield scraped, data
+            fill()
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=True)
+        add_stat(stats, "urls_seen", frontier.seen())
+        frontier.close()
+
+
+def crawl(seed_url: str, selector: Optional[str] = None, **options) -> PageData:
+    """Crawl from `seed_url` (see iter_crawl) and merge the pages like scrape_data."""
+    return merge_pages(iter_crawl(seed_url, selector, **options))
@@ -0,0 +1,200 @@
+"""Off-loop execution of synchronous scrapes in the web process.
+
+Scrapes (requests, the Playwright sync API, politeness sleeps, parsing and
+serialization) are blocking, so request handlers never run them on the event
+loop. They run on one bounded thread pool instead, behind admission control:
+
+  SCRAPER_WORKERS       threads running scrape work (default 8)
+  SCRAPER_QUEUE         admitted scrapes allowed to wait for a thread (default 16);
+                        beyond workers + queue new scrapes get 503
+  SCRAPER_CLIENT_MAX    scrapes in flight per client address (default 4, 0 = no
+                        limit); beyond it the client gets 429
+  SCRAPER_RETRY_AFTER   Retry-After seconds sent with 429/503 (default 5)
+
+Every admitted scrape carries a `cancel` event, passed to iter_pages: when the
+client disconnects the event is set and the scrape stops before its next
+page fetch.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from . import metrics
+
+T = TypeVar("T")
+
+# How often a waiting handler checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+
+_END = object()
+
+
+class ScrapeExecutor:
+    def __init__(self, workers: int = 8, queue: int = 16, per_client: int = 4, retry_after: int = 5):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue)
+        self.per_client = per_client
+        self.retry_after = retry_after
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scrape")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._clients: Dict[str, int] = {}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def admit(self, request: Request) -> "Ticket":
+        """Reserve a slot for one scrape, or raise 503 (server full) / 429 (client over its limit)."""
+        client = request.client.host if request.client else ""
+        with self._lock:
+            status = None
+            if self._active >= self.capacity:
+                status, detail = 503, "Scrape queue is full, retry later"
+            elif self.per_client and self._clients.get(client, 0) >= self.per_client:
+                status, detail = 429, "Too many scrapes in flight for this client"
+            if status is None:
+                self._active += 1
+                self._clients[client] = self._clients.get(client, 0) + 1
+                return Ticket(self, client)
+        metrics.SCRAPES_REJECTED.inc(status=str(status))
+        raise HTTPException(status_code=status, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+    def _release(self, client: str) -> None:
+        with self._lock:
+            self._active -= 1
+            left = self._clients.get(client, 1) - 1
+            if left:
+                self._clients[client] = left
+            else:
+                self._clients.pop(client, None)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Ticket:
+    """One admitted scrape: runs its blocking steps on the pool and frees the
+    slot once the last of them has finished."""
+
+    def __init__(self, executor: ScrapeExecutor, client: str):
+        self.executor = executor
+        self.client = client
+        self.cancel = threading.Event()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self, *_) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.executor._release(self.client)
+
+    def _release_after(self, future: Optional[Future]) -> None:
+        # A step still running on the pool keeps the slot until it returns
+        if future is None or future.done():
+            self.release()
+        else:
+            future.add_done_callback(self.release)
+
+    async def _wait(self, request: Request, future: Future):
+        # Await a pool step, setting `cancel` if the client disconnects meanwhile
+        waiter = asyncio.wrap_future(future)
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(waiter), DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if not self.cancel.is_set() and await request.is_disconnected():
+                        metrics.SCRAPES_CANCELLED.inc()
+                        self.cancel.set()
+        except asyncio.CancelledError:
+            self.cancel.set()
+            raise
+
+    async def run(self, request: Request, fn: Callable[[], T]) -> T:
+        """Run `fn` on the pool and release the slot afterwards."""
+        future = self.executor.pool.submit(fn)
+        try:
+            return await self._wait(request, future)
+        finally:
+            self._release_after(future)
+
+    async def first(self, request: Request, chunks: Iterator[bytes]) -> bytes:
+        """Pull the first chunk of a streamed export on the pool (b"" when empty);
+        for spooled formats this covers the whole scrape. The slot is released
+        if it fails, otherwise `stream` takes it over."""
+        future = self.executor.pool.submit(next, chunks, b"")
+        try:
+            return await self._wait(request, future)
+        except BaseException:
+            self._release_after(future)
+            raise
+
+    async def stream(self, first: bytes, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+        """Async body for StreamingResponse: each chunk is produced on the pool.
+        If the client goes away the response task is cancelled, which sets
+        `cancel`, closes `chunks` and frees the slot once the step in progress returns."""
+        future: Optional[Future] = None
+        finished = False
+        try:
+            yield first
+            while True:
+                future = self.executor.pool.submit(next, chunks, _END)
+                chunk = await asyncio.wrap_future(future)
+                if chunk is _END:
+                    finished = True
+                    return
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            metrics.SCRAPES_CANCELLED.inc()
+            raise
+        finally:
+            if not finished:
+                self.cancel.set()
+                # Closing runs the scrape's cleanup, which may block: do it on the pool,
+                # after the step in progress if there is one
+                if future is None or future.done():
+                    future = self.executor.pool.submit(chunks.close)
+                else:
+                    future.add_done_callback(lambda _: chunks.close())
+            self._release_after(future)
+
+
+_executor: Optional[ScrapeExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ScrapeExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ScrapeExecutor(
+                    workers=int(os.getenv("SCRAPER_WORKERS", "8")),
+                    queue=int(os.getenv("SCRAPER_QUEUE", "16")),
+                    per_client=int(os.getenv("SCRAPER_CLIENT_MAX", "4")),
+                    retry_after=int(os.getenv("SCRAPER_RETRY_AFTER", "5")),
+                )
+    return _executor
+
+
+def set_executor(executor: Optional[ScrapeExecutor]) -> None:
+    """Replace the process-wide executor (None rebuilds it from the environment on next use)."""
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, executor
+    if previous is not None and previous is not executor:
+        previous.shutdown()
+
+
+SCRAPES_IN_FLIGHT = metrics.Gauge(
+    "scraper_scrapes_in_flight",
+    "Synchronous scrapes admitted and not yet finished (running or queued).",
+    lambda: _executor.active if _executor is not None else None,
+)
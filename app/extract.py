@@ -0,0 +1,630 @@
+"""Single-parse extraction engine.
+
+Each page is parsed once into an lxml tree. Selector matching, table
+extraction and next-link discovery all run against that tree; tables are read
+cell by cell straight into pandas' TextParser instead of being serialized back
+to HTML for `pd.read_html`. Table handling mirrors `pd.read_html` (thead/tbody/
+tfoot detection, colspan/rowspan expansion, hidden elements, header inference,
+thousands separators) so results match the previous implementation.
+"""
+import re
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlsplit
+
+import pandas as pd
+from lxml import etree
+from lxml import html as lxml_html
+from pandas.io.parsers import TextParser
+
+# Same whitespace collapsing and table text test as pandas.io.html
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+_RE_ANY_TEXT = re.compile(r".+")
+# Leading digits of a span attribute, as browsers read "2px" or " 3 "
+_RE_SPAN = re.compile(r"\s*(\d+)")
+
+# Text under these elements is not part of an ancestor's visible text (as in bs4's get_text)
+_SKIP_TEXT_TAGS = ("script", "style", "template")
+_visible_text = etree.XPath(
+    ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]",
+    smart_strings=False,
+)
+_all_text = etree.XPath(".//text()", smart_strings=False)
+
+FALLBACK_CONTENT_SELECTOR = 'article, main, section, h1, h2, h3, h4, p, li, a'
+# Default cap on fallback-content elements per page; 0 or None means no cap
+MAX_ELEMENTS = 1000
+
+ROW_COLUMNS = ('tag', 'text', 'href', 'src', 'title', 'aria_label', 'classes')
+
+Element = lxml_html.HtmlElement
+
+
+def parse_document(html: str) -> Element:
+    """Parse an HTML document into an lxml tree (the only parse a page gets)."""
+    if not html or not html.strip():
+        return lxml_html.document_fromstring("<html></html>")
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # str input with an XML encoding declaration: hand lxml the bytes instead
+        parser = lxml_html.HTMLParser(encoding="utf-8")
+        return lxml_html.document_fromstring(html.encode("utf-8"), parser=parser)
+    except etree.ParserError:
+        return lxml_html.document_fromstring("<html></html>")
+
+
+def element_text(el: Element) -> str:
+    """Equivalent of bs4 `get_text(" ", strip=True)`."""
+    if el.tag in _SKIP_TEXT_TAGS:
+        getter = _all_text
+    elif next(el.iterdescendants(*_SKIP_TEXT_TAGS), None) is None and next(el.iterancestors("template"), None) is None:
+        # Nothing to exclude: skip the per-node ancestor test, which is slow on big subtrees
+        getter = _all_text
+    else:
+        getter = _visible_text
+    return " ".join(s for s in (t.strip() for t in getter(el)) if s)
+
+
+class UrlResolver:
+    """`urljoin(base, href)` for many hrefs against one base.
+
+    The base is split once and each distinct href is resolved once. Plain
+    root-relative paths and same-scheme absolute URLs, which make up most
+    links, skip urljoin entirely. The result is identical to urljoin because
+    those shapes have no dot segments, params, empty query/fragment markers or
+    characters that urlsplit would strip.
+    """
+
+    _UNSAFE = frozenset(";\\[] \t\r\n")
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._cache: Dict[str, str] = {}
+        parts = urlsplit(base_url) if base_url else None
+        if parts and parts.scheme in ("http", "https") and parts.netloc:
+            self._origin: Optional[str] = f"{parts.scheme}://{parts.netloc}"
+            self._absolute_prefix: Optional[str] = f"{parts.scheme}://"
+        else:
+            self._origin = self._absolute_prefix = None
+
+    def _fast(self, href: str) -> Optional[str]:
+        if (self._origin is None or "/." in href or "?#" in href or href[-1] in "?#"
+                or not self._UNSAFE.isdisjoint(href) or not href.isprintable()):
+            return None
+        if href[0] == "/" and href[1:2] != "/":
+            return self._origin + href
+        prefix = self._absolute_prefix
+        if href.startswith(prefix) and href[len(prefix):len(prefix) + 1] not in ("", "/"):
+            # Same scheme with a host: urljoin returns the URL re-assembled unchanged
+            rest = href[len(prefix):]
+            host = rest.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+            if host and ":" not in host and "@" not in host:
+                return href
+        return None
+
+    def resolve(self, href: Optional[str]) -> Optional[str]:
+        if not href:
+            return None
+        resolved = self._cache.get(href)
+        if resolved is None:
+            resolved = self._fast(href)
+            if resolved is None:
+                resolved = urljoin(self.base_url, href)
+            self._cache[href] = resolved
+        return resolved
+
+    def resolve_all(self, hrefs: Iterable[Optional[str]]) -> List[Optional[str]]:
+        resolve = self.resolve
+        return [resolve(h) for h in hrefs]
+
+
+def is_xpath(selector: str) -> bool:
+    """Selectors starting with `/`, `./` or `(` are XPath (no CSS selector can)."""
+    return selector.startswith(("/", "./", "("))
+
+
+def css_to_xpath(selector: str) -> Optional[str]:
+    """XPath for a CSS selector matched from (and including) the context node,
+    or None when cssselect cannot translate it."""
+    from cssselect import SelectorError
+    from cssselect.xpath import ExpressionError
+    from lxml.cssselect import LxmlHTMLTranslator
+    try:
+        path = LxmlHTMLTranslator().css_to_xpath(selector)
+    except (SelectorError, ExpressionError):
+        return None
+    if "descendant-or-self" not in selector:
+        # Descendant combinators: libxml2 evaluates `//a` as one descendant scan
+        # but `/descendant-or-self::*/a` per intermediate node (same matches)
+        path = path.replace("/descendant-or-self::*/", "//")
+    return path
+
+
+@lru_cache(maxsize=256)
+def compile_selector(selector: str) -> Callable[["ParsedPage"], List[Element]]:
+    """Compile a CSS (or XPath) selector once; falls back to soupsieve for CSS
+    syntax cssselect lacks."""
+    if is_xpath(selector):
+        try:
+            expression = etree.XPath(selector)
+        except etree.XPathSyntaxError as e:
+            raise ValueError(f"Invalid XPath selector {selector!r}: {e}") from None
+        # Only element results select anything (not attribute or text nodes)
+        return lambda page: [el for el in expression(page.root) if isinstance(el, etree._Element)]
+    path = css_to_xpath(selector)
+    if path is None:
+        return lambda page: _soupsieve_select(page, selector)
+    compiled = etree.XPath(path)
+    return lambda page: compiled(page.root)
+
+
+def _soupsieve_select(page: "ParsedPage", selector: str) -> List[Element]:
+    # Rare path: match with bs4/soupsieve, then map each hit back onto the lxml
+    # tree by its element-child index path
+    from bs4 import BeautifulSoup, Tag
+    soup = BeautifulSoup(page.html, "lxml")
+    matches: List[Element] = []
+    for tag in soup.select(selector):
+        path = []
+        node = tag
+        while node.parent is not None:
+            siblings = [c for c in node.parent.contents if isinstance(c, Tag)]
+            path.append(next(i for i, c in enumerate(siblings) if c is node))
+            node = node.parent
+        path.reverse()
+        if not path or path[0] != 0:
+            continue
+        el = page.root
+        for index in path[1:]:
+            children = [c for c in el if isinstance(c.tag, str)]
+            if index >= len(children):
+                el = None
+                break
+            el = children[index]
+        if el is not None:
+            matches.append(el)
+    return matches
+
+
+def _hidden_elements(table: Element) -> Set[Element]:
+    hidden = set(table.xpath(".//style"))
+    for el in table.xpath(".//*[@style]"):
+        if "display:none" in el.get("style", "").replace(" ", ""):
+            hidden.add(el)
+    return hidden
+
+
+def _is_hidden(el: Element, table: Element, hidden: Set[Element]) -> bool:
+    while el is not None and el is not table:
+        if el in hidden:
+            return True
+        el = el.getparent()
+    return False
+
+
+def _cell_text(cell: Element, hidden: Set[Element]) -> str:
+    if not hidden and cell.find(".//br") is None:
+        return _RE_WHITESPACE.sub(" ", cell.text_content().strip())
+    parts: List[str] = []
+
+    def walk(node: Element) -> None:
+        if node.text and isinstance(node.tag, str):
+            parts.append(node.text)
+        for child in node:
+            if child in hidden:
+                pass
+            elif child.tag == "br":
+                parts.append("\n")
+            elif isinstance(child.tag, str):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(cell)
+    return _RE_WHITESPACE.sub(" ", "".join(parts).strip())
+
+
+def _row_cells(row: Element) -> List[Element]:
+    return [c for c in row if c.tag == "td" or c.tag == "th"]
+
+
+def _span(value: Optional[str]) -> int:
+    # Malformed spans count as 1 instead of failing the table (or the page)
+    match = _RE_SPAN.match(value) if value else None
+    return int(match.group(1)) if match else 1
+
+
+def _expand_spans(rows: List[Element], hidden: Set[Element]) -> List[List[str]]:
+    """Rows of cell texts with colspan/rowspan copied into the covered cells."""
+    all_texts: List[List[str]] = []
+    remainder: List[tuple] = []  # (index, text, rows left)
+    for tr in rows:
+        texts: List[str] = []
+        next_remainder: List[tuple] = []
+        index = 0
+        for td in _row_cells(tr):
+            if td in hidden:
+                continue
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+            text = _cell_text(td, hidden)
+            rowspan = _span(td.get("rowspan"))
+            colspan = _span(td.get("colspan"))
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+    while remainder:
+        next_remainder = []
+        texts = []
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+    return all_texts
+
+
+def table_to_frame(table: Element, max_rows: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """Read one <table> element into a DataFrame, or None if it holds no data.
+    With `max_rows`, at most that many body rows are read (and no footer once
+    the limit is reached), so types are inferred from those rows only."""
+    return _table_frame(table, max_rows)[0]
+
+
+def _table_frame(table: Element, max_rows: Optional[int] = None,
+                 open_elements: Optional[Set[Element]] = None) -> Tuple[Optional[pd.DataFrame], bool]:
+    # (frame, final): on a partially parsed page a table is final once it is
+    # closed, or once max_rows of its rows are closed
+    hidden = _hidden_elements(table)
+
+    def visible(rows: List[Element]) -> List[Element]:
+        return [r for r in rows if not _is_hidden(r, table, hidden)] if hidden else rows
+
+    header_rows: List[Element] = []
+    for thead in visible(table.xpath(".//thead")):
+        header_rows.extend(visible(thead.xpath("./tr")))
+        if _row_cells(thead):
+            # <thead> holding cells without a <tr>: treat it as the row
+            header_rows.append(thead)
+    body_rows = visible(table.xpath(".//tbody//tr") + table.xpath("./tr"))
+    footer_rows = visible(table.xpath(".//tfoot//tr"))
+
+    if not header_rows:
+        while body_rows and all(td.tag == "th" for td in _row_cells(body_rows[0])):
+            header_rows.append(body_rows.pop(0))
+
+    final = not open_elements or table not in open_elements
+    if max_rows is not None and len(body_rows) >= max_rows:
+        body_rows = body_rows[:max_rows]
+        footer_rows = []
+        final = not open_elements or not any(row in open_elements for row in header_rows + body_rows)
+
+    head = _expand_spans(header_rows, hidden)
+    body = _expand_spans(body_rows, hidden)
+    foot = _expand_spans(footer_rows, hidden)
+
+    header = None
+    if head:
+        body = head + body
+        if len(head) == 1:
+            header = 0
+        else:
+            header = [i for i, row in enumerate(head) if any(text for text in row)]
+    if foot:
+        body += foot
+    if not body:
+        return None, final
+    width = max(len(row) for row in body)
+    for row in body:
+        if len(row) < width:
+            row += [""] * (width - len(row))
+    try:
+        with TextParser(body, header=header, thousands=",") as parser:
+            df = parser.read()
+    except ValueError:
+        return None, final
+    df.columns = [str(c).strip() for c in df.columns]
+    if max_rows is not None and len(df) > max_rows:
+        # Rows a rowspan carried past the last body row read
+        df = df.iloc[:max_rows]
+    return df, final
+
+
+def _row_values(el: Element) -> Optional[tuple]:
+    # ROW_COLUMNS values of one element (href/src unresolved), None when it has no content
+    get = el.get
+    text = element_text(el)
+    href = get('href') or None
+    src = get('src') or None
+    title = get('title')
+    aria = get('aria-label')
+    raw_class = get('class')
+    cls = " ".join(raw_class.split()) if raw_class is not None else None
+    if text or href or src or title or aria or cls:
+        return el.tag, text, href, src, title, aria, cls
+    return None
+
+
+class ParsedPage:
+    """One page parsed once; every extraction step reuses `root`."""
+
+    def __init__(self, html: str, base_url: str, root: Optional[Element] = None):
+        self.html = html
+        self.base_url = base_url
+        # `root` is a tree parsed elsewhere, e.g. incrementally by stream_extract
+        self.root = parse_document(html) if root is None else root
+        self.resolver = UrlResolver(base_url)
+        # Set when extract() dropped fallback elements beyond max_elements
+        self.truncated = False
+
+    def select(self, selector: str) -> List[Element]:
+        return compile_selector(selector)(self)
+
+    def next_url(self, next_selector: str) -> Optional[str]:
+        matches = self.select(next_selector)
+        return self.resolver.resolve(matches[0].get("href")) if matches else None
+
+    def text(self) -> str:
+        return element_text(self.root)
+
+    def tables(self, elements: List[Element]) -> List[pd.DataFrame]:
+        dfs: List[pd.DataFrame] = []
+        for el in elements:
+            for table in el.xpath("descendant-or-self::table"):
+                if "display:none" in table.get("style", "").replace(" ", ""):
+                    continue
+                if not any(_RE_ANY_TEXT.search(t) for t in _all_text(table)):
+                    continue
+                df = table_to_frame(table)
+                if df is not None:
+                    dfs.append(df)
+        return dfs
+
+    def rows(self, elements: List[Element], limit: Optional[int] = None) -> pd.DataFrame:
+        """One row per element with any content: tag, text, absolute href/src,
+        title, aria_label and normalized classes (at most `limit` rows).
+        Columns are collected as arrays and URLs resolved in bulk, then the
+        frame is built once."""
+        values = []
+        for el in elements:
+            row = _row_values(el)
+            if row is not None:
+                values.append(row)
+                if limit and len(values) >= limit:
+                    break
+        return self._rows_frame(values)
+
+    def _rows_frame(self, values: List[tuple]) -> pd.DataFrame:
+        if not values:
+            return pd.DataFrame()
+        tags, texts, hrefs, srcs, titles, arias, classes = (list(column) for column in zip(*values))
+        resolve_all = self.resolver.resolve_all
+        columns = (tags, texts, resolve_all(hrefs), resolve_all(srcs), titles, arias, classes)
+        return pd.DataFrame(dict(zip(ROW_COLUMNS, columns)))
+
+    def extract(self, selector: Optional[str] = None, max_elements: Optional[int] = MAX_ELEMENTS,
+                max_rows: Optional[int] = None) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """Tables or structured rows for `selector`, falling back to page content.
+
+        The fallback reads at most `max_elements` content elements (0 or None
+        for all of them); `truncated` records whether any were dropped.
+        With `max_rows` see extract_limited.
+        """
+        if max_rows is not None:
+            return self.extract_limited(selector, max_rows, max_elements)[0]
+        if selector:
+            selected = self.select(selector)
+            if selected:
+                tables = [el for el in selected if el.tag == 'table' or el.find('.//table') is not None]
+                if tables:
+                    dfs = self.tables(tables)
+                    if dfs:
+                        return {f"table_{i+1}": df for i, df in enumerate(dfs)}
+                df = self.rows(selected)
+                if df.empty:
+                    df = pd.DataFrame([{"message": "No content matched the selector."}])
+                return df
+
+        dfs = self.tables([self.root])
+        if dfs:
+            return {f"table_{i+1}": df for i, df in enumerate(dfs)}
+
+        elements = self.select(FALLBACK_CONTENT_SELECTOR)
+        if max_elements and len(elements) > max_elements:
+            elements = elements[:max_elements]
+            self.truncated = True
+        df = self.rows(elements)
+        if df.empty:
+            df = pd.DataFrame({'text': [self.text()]})
+        return df
+
+    def extract_limited(self, selector: Optional[str], max_rows: int, max_elements: Optional[int] = MAX_ELEMENTS,
+                        open_elements: Optional[Set[Element]] = None) -> Tuple[Union[pd.DataFrame, Dict[str, pd.DataFrame]], bool]:
+        """extract() reading at most `max_rows` rows.
+
+        Matches are read in document order until `max_rows` rows are collected,
+        so later matches cannot change the result: table rows fill the limit,
+        and content rows do until a table is seen (tables win, as in extract).
+
+        On a partially parsed page (`open_elements` holds the elements not
+        closed yet) the flag says whether the result is final, i.e. built from
+        closed elements only and not changeable by the rest of the document.
+        """
+        partial = open_elements is not None
+        is_open = open_elements.__contains__ if partial else (lambda el: False)
+        frames: List[pd.DataFrame] = []
+        budget = [max_rows]
+
+        def take_tables(elements: Iterable[Element]) -> Optional[bool]:
+            # Read tables into `frames` until the limit; True/False once that is
+            # known final/not final, None while the limit is not reached
+            for table in elements:
+                if "display:none" in table.get("style", "").replace(" ", ""):
+                    continue
+                if not any(_RE_ANY_TEXT.search(t) for t in _all_text(table)):
+                    if is_open(table):
+                        return False
+                    continue
+                df, final = _table_frame(table, budget[0], open_elements)
+                if df is not None:
+                    frames.append(df)
+                    budget[0] -= len(df)
+                if not final:
+                    return False
+                if budget[0] <= 0:
+                    return True
+            return None
+
+        def tables_result() -> Dict[str, pd.DataFrame]:
+            return {f"table_{i+1}": df for i, df in enumerate(frames)}
+
+        if selector:
+            selected = self.select(selector)
+            if selected:
+                values: List[tuple] = []
+                final = not partial
+                for el in selected:
+                    if el.tag == 'table' or (not is_open(el) and el.find('.//table') is not None):
+                        done = take_tables(el.xpath("descendant-or-self::table"))
+                        if done is not None:
+                            final = done
+                            break
+                    elif is_open(el):
+                        # Could still turn out to hold a table
+                        final = False
+                        break
+                    elif not frames:
+                        row = _row_values(el)
+                        if row is not None:
+                            values.append(row)
+                            if len(values) >= max_rows:
+                                final = True
+                                break
+                if frames:
+                    return tables_result(), final
+                df = self._rows_frame(values)
+                if df.empty:
+                    df = pd.DataFrame([{"message": "No content matched the selector."}])
+                return df, final
+            if partial:
+                return {}, False
+
+        done = take_tables(self.root.xpath("descendant-or-self::table"))
+        if frames and done is not False:
+            return tables_result(), bool(done) or not partial
+        if partial:
+            # A table (or more rows of one) may still come
+            return {}, False
+        elements = self.select(FALLBACK_CONTENT_SELECTOR)
+        if max_elements and len(elements) > max_elements:
+            elements = elements[:max_elements]
+            self.truncated = True
+        df = self.rows(elements, max_rows)
+        if df.empty:
+            df = pd.DataFrame({'text': [self.text()]})
+        return df, True
+
+
+# Longest partial tag held back between feeds ("</script" without its ">")
+_PARTIAL_TAG_MAX = len("</script")
+
+
+def _split_partial_tag(text: str) -> Tuple[str, str]:
+    # libxml2's push parser reads the rest of the page as script/style text
+    # when `</script>` or `</style>` is split across feeds, so a trailing
+    # unfinished tag waits for the next chunk
+    cut = text.rfind("<", max(0, len(text) - _PARTIAL_TAG_MAX))
+    if cut >= 0 and ">" not in text[cut:]:
+        return text[:cut], text[cut:]
+    return text, ""
+
+
+def stream_extract(
+    chunks: Iterable[str],
+    base_url: str,
+    extract: Callable[[ParsedPage, Optional[Set[Element]]], tuple],
+    clock: Optional[Callable[[], ContextManager]] = None,
+    check_bytes: int = 64 * 1024,
+) -> Tuple[ParsedPage, Union[pd.DataFrame, Dict[str, pd.DataFrame]], bool]:
+    """Parse a page while it downloads and stop once its data is final.
+
+    `chunks` (decoded text) are fed to an incremental lxml parser. After the
+    first `check_bytes`, and again each time the input doubles, `extract(page,
+    open_elements)` runs on the partial tree; as soon as it reports a final
+    result the download is abandoned (`chunks` is closed). Otherwise the page
+    is extracted once the document is complete with `extract(page, None)`.
+    Returns (page, data, stopped_early). `clock`, when given, is entered
+    around parsing work so callers can tell parse time from download time.
+    """
+    clock = clock or nullcontext
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    parser.set_element_class_lookup(lxml_html.HtmlElementClassLookup())
+    received: List[str] = []
+    stack: List[Element] = []
+    size = 0
+    next_check = check_bytes
+    root: Optional[Element] = None
+    incremental = True
+    held = ""
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            size += len(chunk)
+            if not incremental:
+                continue
+            with clock():
+                try:
+                    text, held = _split_partial_tag(held + chunk)
+                    parser.feed(text)
+                    for event, el in parser.read_events():
+                        if event == "start":
+                            stack.append(el)
+                            if root is None:
+                                root = el.getroottree().getroot()
+                        else:
+                            while stack and stack.pop() is not el:
+                                pass
+                except (etree.Error, ValueError):
+                    # Input the feed parser rejects: parse the whole document at the end
+                    incremental = False
+                    continue
+                if root is None or size < next_check:
+                    continue
+                next_check = size * 2
+                page = ParsedPage("".join(received), base_url, root=root)
+                data, final = extract(page, set(stack))
+                if final:
+                    return page, data, True
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    with clock():
+        html = "".join(received)
+        tree = None
+        if incremental and root is not None:
+            try:
+                if held:
+                    parser.feed(held)
+                tree = parser.close()
+            except (etree.Error, ValueError):
+                tree = None
+        page = ParsedPage(html, base_url, root=tree)
+        data, _ = extract(page, None)
+    return page, data, False
+
@@ -0,0 +1,290 @@
+"""Process-wide HTTP session layer shared by all scrapes.
+
+One pooled keep-alive `requests.Session` per process, with retries and
+exponential backoff on transient failures (honoring `Retry-After`) and
+compressed transfer negotiation. Tunable via environment variables:
+
+  SCRAPER_POOL_SIZE        connections kept per host (default 20)
+  SCRAPER_CONNECT_TIMEOUT  seconds to establish a connection (default 5)
+  SCRAPER_TIMEOUT          seconds to wait for response data (default 20)
+  SCRAPER_RETRIES          retries on 429/5xx and connection errors (default 3)
+  SCRAPER_BACKOFF          exponential backoff factor in seconds (default 0.5)
+  SCRAPER_MAX_BYTES        largest page body downloaded, after decompression
+                           (default 32 MiB, 0 = no limit)
+
+`fetch_text` and `stream_text` additionally go through the on-disk response
+cache (app/cache.py). Page bodies are downloaded in chunks: a body over
+`max_bytes`, or a response whose Content-Type is binary (images, PDFs,
+archives, ...), is rejected with ResponseRejected before it is held in memory.
+"""
+import codecs
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .cache import get_cache
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Cache status reported for each fetch
+HIT = "HIT"
+REVALIDATED = "REVALIDATED"
+MISS = "MISS"
+BYPASS = "BYPASS"
+
+_settings = {
+    "pool_size": int(os.getenv("SCRAPER_POOL_SIZE", "20")),
+    "connect_timeout": float(os.getenv("SCRAPER_CONNECT_TIMEOUT", "5")),
+    "timeout": float(os.getenv("SCRAPER_TIMEOUT", "20")),
+    "retries": int(os.getenv("SCRAPER_RETRIES", "3")),
+    "backoff": float(os.getenv("SCRAPER_BACKOFF", "0.5")),
+    "max_bytes": int(os.getenv("SCRAPER_MAX_BYTES", str(32 * 1024 * 1024))),
+}
+STREAM_CHUNK_SIZE = 64 * 1024
+# Content types that are never parsed as pages
+_BINARY_PREFIXES = ("image/", "audio/", "video/", "font/", "model/")
+_BINARY_TYPES = {
+    "application/octet-stream", "application/pdf", "application/zip", "application/gzip",
+    "application/x-gzip", "application/x-tar", "application/x-bzip2", "application/x-7z-compressed",
+    "application/x-rar-compressed", "application/vnd.rar", "application/java-archive",
+    "application/wasm", "application/msword", "application/x-msdownload", "application/x-shockwave-flash",
+}
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+
+
+class ResponseRejected(requests.RequestException):
+    """A page response that is not scraped: binary content or a body over max_bytes."""
+
+
+def _accept_encoding() -> str:
+    # urllib3 only decodes brotli when a brotli binding is importable
+    encodings = ["gzip", "deflate"]
+    for module in ("brotli", "brotlicffi"):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        encodings.append("br")
+        break
+    return ", ".join(encodings)
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=_settings["retries"],
+        connect=_settings["retries"],
+        read=_settings["retries"],
+        status=_settings["retries"],
+        backoff_factor=_settings["backoff"],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=_settings["pool_size"],
+        pool_maxsize=_settings["pool_size"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": _accept_encoding(),
+    })
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared session, creating it lazily (and again after a fork)."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def configure(**settings) -> None:
+    """Override session settings (pool_size, connect_timeout, timeout, retries, backoff, max_bytes).
+
+    The shared session is rebuilt on next use.
+    """
+    global _session
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise ValueError(f"Unknown fetcher settings: {', '.join(sorted(unknown))}")
+    with _lock:
+        _settings.update({k: v for k, v in settings.items() if v is not None})
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def default_timeout() -> Tuple[float, float]:
+    return (_settings["connect_timeout"], _settings["timeout"])
+
+
+def fetch(url: str, *, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> requests.Response:
+    """GET `url` through the shared session and raise for non-2xx responses."""
+    resp = get_session().get(url, headers=headers, timeout=timeout or default_timeout())
+    resp.raise_for_status()
+    return resp
+
+
+def check_content_type(resp: requests.Response) -> None:
+    """Reject responses whose Content-Type is binary (missing or unknown types pass)."""
+    content_type = resp.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+    binary = content_type.startswith(_BINARY_PREFIXES) or content_type in _BINARY_TYPES or (
+        content_type.startswith("application/vnd.") and not content_type.endswith(("+xml", "+json"))
+    )
+    if binary:
+        resp.close()
+        raise ResponseRejected(f"Not an HTML page (Content-Type: {content_type}): {resp.url}", response=resp)
+
+
+def max_bytes_limit() -> int:
+    """The configured response size limit (SCRAPER_MAX_BYTES, 0 = none)."""
+    return _settings["max_bytes"]
+
+
+def _limit(max_bytes: Optional[int]) -> int:
+    return _settings["max_bytes"] if max_bytes is None else max_bytes
+
+
+def _iter_body(resp: requests.Response, max_bytes: int) -> Iterator[bytes]:
+    # Decompressed body chunks, failing as soon as more than max_bytes arrive
+    declared = resp.headers.get("Content-Length", "")
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+        resp.close()
+        raise ResponseRejected(f"Page is {declared} bytes, over the {max_bytes} byte limit: {resp.url}", response=resp)
+    size = 0
+    try:
+        for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise ResponseRejected(f"Page exceeds the {max_bytes} byte limit: {resp.url}", response=resp)
+            yield chunk
+    finally:
+        metrics.FETCH_BYTES.observe(size, mode="static")
+        resp.close()
+
+
+def _encoding(resp: requests.Response, body: bytes) -> Optional[str]:
+    # As requests' Response.text: the header charset, else a guess from the body
+    return resp.encoding or (requests.compat.chardet.detect(body)["encoding"] if body else None)
+
+
+def _decode(body: bytes, encoding: Optional[str]) -> str:
+    try:
+        return str(body, encoding, errors="replace")
+    except (LookupError, TypeError):
+        return str(body, errors="replace")
+
+
+def _get(url: str, headers: Optional[Dict[str, str]]) -> requests.Response:
+    return get_session().get(url, headers=headers or None, timeout=default_timeout(), stream=True)
+
+
+def _store(cache, key: str, resp: requests.Response, body: bytes, encoding: Optional[str]) -> None:
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    storable = "no-store" not in resp.headers.get("Cache-Control", "").lower()
+    # Without validators an entry is only useful while it is fresh
+    if storable and (etag or last_modified or cache.ttl > 0):
+        cache.put(key, body, final_url=resp.url, encoding=encoding, etag=etag, last_modified=last_modified)
+
+
+def _open(url: str, use_cache: bool):
+    # (cache, key, cached text or None, response or None, cache status)
+    cache = get_cache() if use_cache else None
+    key = None
+    if cache is None:
+        resp = _get(url, None)
+        status = BYPASS
+    else:
+        key = cache.key(url)
+        entry = cache.get(key)
+        if entry is not None and cache.is_fresh(entry):
+            return cache, key, entry, None, HIT
+        resp = _get(url, entry.validators() if entry is not None else None)
+        if entry is not None and resp.status_code == 304:
+            resp.close()
+            cache.refresh(entry)
+            return cache, key, entry, None, REVALIDATED
+        status = MISS
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        resp.close()
+        raise
+    check_content_type(resp)
+    return cache, key, None, resp, status
+
+
+def fetch_text(url: str, *, use_cache: bool = True, max_bytes: Optional[int] = None) -> Tuple[str, str, str]:
+    """Fetch `url` as text, consulting the response cache.
+
+    Returns (text, final_url, cache_status) where cache_status is HIT (fresh
+    entry, no request), REVALIDATED (304 on a conditional request), MISS or
+    BYPASS (cache disabled). Raises ResponseRejected for binary responses and
+    bodies over `max_bytes` (default SCRAPER_MAX_BYTES, 0 for no limit).
+    """
+    cache, key, entry, resp, status = _open(url, use_cache)
+    if entry is not None:
+        return entry.text, entry.url, status
+    body = b"".join(_iter_body(resp, _limit(max_bytes)))
+    encoding = _encoding(resp, body)
+    if cache is not None:
+        _store(cache, key, resp, body, encoding)
+    return _decode(body, encoding), resp.url, status
+
+
+def stream_text(url: str, *, use_cache: bool = True, max_bytes: Optional[int] = None) -> Tuple[Iterator[str], str, str]:
+    """Like fetch_text, but the text arrives as an iterator of decoded chunks
+    while it downloads. Closing the iterator early aborts the download; only
+    bodies read to the end are cached."""
+    cache, key, entry, resp, status = _open(url, use_cache)
+    if entry is not None:
+        return iter([entry.text]), entry.url, status
+
+    def chunks() -> Iterator[str]:
+        body = _iter_body(resp, _limit(max_bytes))
+        kept = [] if cache is not None else None
+        decoder = None
+        encoding = resp.encoding
+        try:
+            for chunk in body:
+                if kept is not None:
+                    kept.append(chunk)
+                if decoder is None:
+                    # No charset header: guess from the first chunk
+                    encoding = _encoding(resp, chunk)
+                    try:
+                        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+                    except LookupError:
+                        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+            if decoder is not None:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield tail
+            if kept is not None:
+                _store(cache, key, resp, b"".join(kept), encoding)
+        finally:
+            body.close()
+
+    return chunks(), resp.url, status
@@ -0,0 +1,19 @@
+"""Export format constants that the web layer needs without importing pandas.
+
+app.utils (the writers) re-exports them.
+"""
+
+# Columnar formats and the codecs each accepts ('none' disables compression)
+COLUMNAR_COMPRESSION = {
+    'parquet': ('zstd', 'snappy', 'gzip', 'brotli', 'lz4', 'none'),
+    'arrow': ('zstd', 'lz4', 'none'),
+}
+
+# Formats that iter_file can stream; xlsx still goes through generate_file
+STREAM_FORMATS = {'csv', 'txt', 'json', 'jsonl'}
+
+
+def export_extension(format: str, partition: bool = False) -> str:
+    """File extension of generate_file output (partitioned columnar exports are zipped)."""
+    fmt = format.lower().strip()
+    return f"{fmt}.zip" if partition and fmt in COLUMNAR_COMPRESSION else fmt
@@ -0,0 +1,342 @@
+"""Incremental re-scrapes: content hashes per page, table and row.
+
+Recurring scrapes of the same target are identified by a job key (given, or
+derived from the URL, selector and extraction options). For each job the
+snapshot store keeps the SHA-256 of every page's HTML, a hash per table
+(named as in scrape_data: `table_k`, `p{n}_table_k` or `rows`) and one hash
+plus the serialized values per row. On the next run:
+
+  - pages whose HTML is unchanged are not parsed at all;
+  - tables whose hash is unchanged produce no output;
+  - changed tables produce only their added, removed and changed rows, with a
+    leading `_change` column (`added` | `removed` | `changed`).
+
+Rows are matched by `key` columns when given (a row whose key survives with
+different values is `changed`); otherwise by their full contents, so an edit
+shows up as one removed and one added row. Tables and pages that disappear
+report all their rows as removed.
+
+The snapshot is a SQLite file (`SCRAPER_INCREMENTAL_DB`, default
+`<SCRAPER_DATA_DIR>/incremental.sqlite`). Each page's new state is stored as
+soon as its changes are computed, so a scrape that fails half-way reports only
+the remaining pages again next time.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .jobs import data_dir
+from .plans import resolve_plan
+from .utils import add_stat, iter_pages
+
+CHANGE_COLUMN = "_change"
+TIME_COLUMN = "_at"
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+# Options that change how a scrape runs but not what it extracts
+_RUNTIME_OPTIONS = {
+    "concurrency", "per_host", "delay_ms", "use_cache", "progress", "stats", "limiter", "cancel", "page_hook",
+    "page_filter", "max_bytes", "parse_workers",
+}
+
+Changes = Dict[str, pd.DataFrame]
+
+
+def job_key(url: str, selector: Optional[str] = None, **options) -> str:
+    """Stable identity of a recurring scrape: URL, selector and extraction options."""
+    relevant = {k: v for k, v in options.items() if k not in _RUNTIME_OPTIONS and v is not None}
+    if "plan" in relevant and not isinstance(relevant["plan"], str):
+        # A plan object's repr differs between processes; its spec does not
+        relevant["plan"] = resolve_plan(relevant["plan"]).spec()
+    raw = json.dumps([url, selector or None, relevant], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def page_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One 64-bit content hash per row (column names excluded)."""
+    try:
+        return pd.util.hash_pandas_object(df, index=False).to_numpy()
+    except TypeError:  # unhashable cells (lists, dicts)
+        return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+
+def _row_keys(df: pd.DataFrame, hashes: np.ndarray, key: Optional[Sequence[str]]) -> List[str]:
+    if key and all(c in df.columns for c in key):
+        values = df[list(key)].astype(str).itertuples(index=False, name=None)
+        return [json.dumps(v) for v in values]
+    # Keyless: identity is the content; repeated rows are told apart by occurrence
+    seen: Dict[int, int] = {}
+    keys = []
+    for h in hashes.tolist():
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        keys.append(f"{h:x}.{n}")
+    return keys
+
+
+def _records(df: pd.DataFrame) -> List[str]:
+    if df.empty:
+        return []
+    # to_json escapes newlines inside values, so lines map 1:1 to rows
+    return df.to_json(orient="records", lines=True, force_ascii=False, date_format="iso").rstrip("\n").split("\n")
+
+
+class SnapshotStore:
+    """Per-job page, table and row hashes in one SQLite file."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " job TEXT NOT NULL, page TEXT NOT NULL, hash TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (job, page));"
+            "CREATE TABLE IF NOT EXISTS tables ("
+            " job TEXT NOT NULL, page TEXT NOT NULL, name TEXT NOT NULL, hash TEXT NOT NULL, columns TEXT NOT NULL,"
+            " PRIMARY KEY (job, page, name));"
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " job TEXT NOT NULL, page TEXT NOT NULL, name TEXT NOT NULL, key TEXT NOT NULL,"
+            " hash TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job, page, name, key));"
+        )
+
+    def page_hashes(self, job: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self.db.execute("SELECT page, hash FROM pages WHERE job = ?", (job,)))
+
+    def tables(self, job: str, page: str) -> Dict[str, Tuple[str, List[str]]]:
+        """{name: (table hash, columns)} stored for one page."""
+        with self._lock:
+            rows = self.db.execute("SELECT name, hash, columns FROM tables WHERE job = ? AND page = ?", (job, page))
+            return {name: (h, json.loads(cols)) for name, h, cols in rows}
+
+    def rows(self, job: str, page: str, name: str) -> Dict[str, Tuple[str, str]]:
+        """{row key: (row hash, JSON record)} of one stored table."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT key, hash, data FROM rows WHERE job = ? AND page = ? AND name = ?", (job, page, name))
+            return {k: (h, d) for k, h, d in rows}
+
+    def save_page(self, job: str, page: str, html_hash: str,
+                  tables: Dict[str, Tuple[str, List[str], List[Tuple[str, str, str]]]]) -> None:
+        """Replace a page's snapshot: {name: (table hash, columns, [(key, hash, data)])}.
+        Tables are only rewritten when their hash changed."""
+        with self._lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO pages (job, page, hash, updated_at) VALUES (?, ?, ?, ?)",
+                    (job, page, html_hash, time.time()))
+                stored = dict(self.db.execute("SELECT name, hash FROM tables WHERE job = ? AND page = ?", (job, page)))
+                for name in set(stored) - set(tables):
+                    self._drop_table(job, page, name)
+                for name, (h, columns, rows) in tables.items():
+                    if stored.get(name) == h:
+                        continue
+                    self._drop_table(job, page, name)
+                    self.db.execute("INSERT INTO tables (job, page, name, hash, columns) VALUES (?, ?, ?, ?, ?)",
+                                    (job, page, name, h, json.dumps(columns)))
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO rows (job, page, name, key, hash, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(job, page, name, k, rh, d) for k, rh, d in rows])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def drop_page(self, job: str, page: str) -> None:
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM pages WHERE job = ? AND page = ?", (job, page))
+            self.db.execute("DELETE FROM tables WHERE job = ? AND page = ?", (job, page))
+            self.db.execute("DELETE FROM rows WHERE job = ? AND page = ?", (job, page))
+            self.db.execute("COMMIT")
+
+    def _drop_table(self, job: str, page: str, name: str) -> None:
+        self.db.execute("DELETE FROM tables WHERE job = ? AND page = ? AND name = ?", (job, page, name))
+        self.db.execute("DELETE FROM rows WHERE job = ? AND page = ? AND name = ?", (job, page, name))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SnapshotStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SnapshotStore(os.getenv("SCRAPER_INCREMENTAL_DB") or str(data_dir() / "incremental.sqlite"))
+    return _store
+
+
+def set_store(store: Optional[SnapshotStore]) -> None:
+    """Replace the process-wide snapshot store (None reopens the default on next use)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def _page_id(p: Optional[int]) -> str:
+    return "" if p is None else f"p{p}"
+
+
+def _removed(columns: List[str], stored: Dict[str, Tuple[str, str]], keys: Iterable[str]) -> pd.DataFrame:
+    records = [json.loads(stored[k][1]) for k in keys]
+    return pd.DataFrame.from_records(records, columns=columns) if records else pd.DataFrame(columns=columns)
+
+
+def diff_table(df: pd.DataFrame, columns: List[str], stored: Dict[str, Tuple[str, str]],
+               key: Optional[Sequence[str]] = None,
+               hashes: Optional[np.ndarray] = None) -> Tuple[pd.DataFrame, List[Tuple[str, str, str]]]:
+    """Rows of `df` that differ from the `stored` snapshot of the table
+    (previous `columns` and rows), with a leading `_change` column, plus the
+    new snapshot rows (key, hash, data)."""
+    hashes = row_hashes(df) if hashes is None else hashes
+    keys = _row_keys(df, hashes, key)
+    hex_hashes = [f"{h:x}" for h in hashes.tolist()]
+    records = _records(df)
+    snapshot = list(zip(keys, hex_hashes, records))
+
+    if [str(c) for c in df.columns] != columns:
+        # Different layout: nothing lines up, report a full replacement
+        added_idx, changed_idx, removed_keys = list(range(len(df))), [], list(stored)
+    else:
+        added_idx, changed_idx = [], []
+        for i, (k, h) in enumerate(zip(keys, hex_hashes)):
+            old = stored.get(k)
+            if old is None:
+                added_idx.append(i)
+            elif old[0] != h:
+                changed_idx.append(i)
+        current = set(keys)
+        removed_keys = [k for k in stored if k not in current]
+
+    parts = []
+    if added_idx or changed_idx:
+        idx = sorted(added_idx + changed_idx)
+        changed = set(changed_idx)
+        new = df.iloc[idx].reset_index(drop=True)
+        new.insert(0, CHANGE_COLUMN, [CHANGED if i in changed else ADDED for i in idx])
+        parts.append(new)
+    if removed_keys:
+        old = _removed(columns, stored, removed_keys)
+        old.insert(0, CHANGE_COLUMN, REMOVED)
+        parts.append(old)
+    if not parts:
+        return pd.DataFrame(columns=[CHANGE_COLUMN] + list(df.columns)), snapshot
+    return (pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]), snapshot
+
+
+def _table_hash(columns: List[str], hashes: Iterable[str]) -> str:
+    digest = hashlib.sha256(json.dumps(columns, default=str).encode("utf-8"))
+    for h in hashes:
+        digest.update(h.encode("ascii"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def iter_changes(
+    url: str,
+    selector: Optional[str] = None,
+    *,
+    job: Optional[str] = None,
+    key: Optional[Sequence[str]] = None,
+    log: bool = False,
+    store: Optional[SnapshotStore] = None,
+    stats: Optional[Dict[str, float]] = None,
+    **options,
+) -> Iterator[Tuple[Optional[int], Changes]]:
+    """Scrape like iter_pages but yield (page_number, {table: changes}) with
+    only the rows that changed since the job's previous run (see module
+    docstring); every page yields a dict, empty when nothing changed.
+    Pass the result to merge_pages or iter_file like iter_pages output.
+
+    `job` names the snapshot (default: job_key of the URL, selector and
+    options); `key` lists the columns identifying a row. With log=True each
+    change also carries an `_at` UTC timestamp, so successive exports can be
+    appended into one change log. stats gains `pages_unchanged`,
+    `tables_unchanged` and `rows_added` / `rows_removed` / `rows_changed`.
+    """
+    store = store or get_store()
+    job = job or job_key(url, selector, key=list(key) if key else None, **options)
+    previous = store.page_hashes(job)
+    current: Dict[str, str] = {}
+    stamp = pd.Timestamp.now(tz="UTC").isoformat() if log else None
+
+    def page_filter(p: Optional[int], html: str) -> bool:
+        page = _page_id(p)
+        current[page] = page_hash(html)
+        if previous.get(page) == current[page]:
+            add_stat(stats, "pages_unchanged")
+            return False
+        return True
+
+    def finalize(diff: pd.DataFrame) -> pd.DataFrame:
+        counts = diff[CHANGE_COLUMN].value_counts()
+        for change in (ADDED, REMOVED, CHANGED):
+            add_stat(stats, f"rows_{change}", int(counts.get(change, 0)))
+        if stamp is not None:
+            diff.insert(1, TIME_COLUMN, stamp)
+        return diff
+
+    for p, data in iter_pages(url, selector, page_filter=page_filter, stats=stats, **options):
+        page = _page_id(p)
+        if previous.get(page) == current.get(page):
+            yield p, {}
+            continue
+        frames = data if isinstance(data, dict) else {"rows": data}
+        stored_tables = store.tables(job, page)
+        changes: Changes = {}
+        snapshot = {}
+        for name, df in frames.items():
+            hashes = row_hashes(df)
+            columns = [str(c) for c in df.columns]
+            table_hash = _table_hash(columns, (f"{h:x}" for h in hashes.tolist()))
+            old = stored_tables.get(name)
+            if old is not None and old[0] == table_hash:
+                add_stat(stats, "tables_unchanged")
+                snapshot[name] = (table_hash, columns, [])
+                continue
+            diff, rows = diff_table(df, old[1] if old else columns,
+                                    store.rows(job, page, name) if old else {}, key, hashes)
+            snapshot[name] = (table_hash, columns, rows)
+            if len(diff):
+                changes[name] = finalize(diff)
+        for name in set(stored_tables) - set(frames):
+            old_columns = stored_tables[name][1]
+            gone = store.rows(job, page, name)
+            removed = _removed(old_columns, gone, gone)
+            removed.insert(0, CHANGE_COLUMN, REMOVED)
+            if len(removed):
+                changes[name] = finalize(removed)
+        store.save_page(job, page, current[page], snapshot)
+        yield p, changes
+
+    # Pages that no longer exist (e.g. fewer result pages than last time)
+    for page in sorted(set(previous) - set(current), key=lambda page: int(page[1:] or 0)):
+        changes = {}
+        for name, (_, columns) in store.tables(job, page).items():
+            gone = store.rows(job, page, name)
+            if gone:
+                removed = _removed(columns, gone, gone)
+                removed.insert(0, CHANGE_COLUMN, REMOVED)
+                changes[name] = finalize(removed)
+        store.drop_page(job, page)
+        yield (int(page[1:]) if page else None), changes
@@ -0,0 +1,116 @@
+"""Job state shared between the web process and Celery workers.
+
+Status records (state, progress, result location) live in Redis when
+`REDIS_URL` is set and the `redis` package is installed, otherwise as JSON
+files under `SCRAPER_DATA_DIR` (default `temp`). Result artifacts are always
+written to `SCRAPER_DATA_DIR`, which must be shared by web and workers.
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+JOB_TTL_SECONDS = int(os.getenv("SCRAPER_JOB_TTL", str(24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def data_dir() -> Path:
+    path = Path(os.getenv("SCRAPER_DATA_DIR", "temp"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def result_path(job_id: str, format: str) -> Path:
+    return data_dir() / f"{job_id}.{format}"
+
+
+def write_atomic(path: Path, content: Union[bytes, Iterable[bytes]]) -> int:
+    """Write `content` (bytes or an iterable of chunks) to `path` so readers
+    never observe a partial file. Returns the number of bytes written."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in ([content] if isinstance(content, bytes) else content):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return size
+
+
+class FileJobStore:
+    def _path(self, job_id: str) -> Path:
+        path = data_dir() / "jobs"
+        path.mkdir(exist_ok=True)
+        return path / f"{job_id}.json"
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._path(job_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        record = self.get(job_id) or {"job_id": job_id}
+        record.update(fields)
+        write_atomic(self._path(job_id), json.dumps(record).encode("utf-8"))
+        return record
+
+
+class RedisJobStore:
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, job_id: str) -> str:
+        return f"scraper:job:{job_id}"
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {k.decode(): json.loads(v) for k, v in raw.items()}
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        key = self._key(job_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in {"job_id": job_id, **fields}.items()})
+        pipe.expire(key, JOB_TTL_SECONDS)
+        pipe.execute()
+        return self.get(job_id) or {}
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        url = os.getenv("REDIS_URL")
+        store = None
+        if url:
+            try:
+                store = RedisJobStore(url)
+            except ImportError:
+                store = None
+        _store = store or FileJobStore()
+    return _store
+
+
+def update_job(job_id: str, **fields) -> Dict[str, Any]:
+    fields["updated_at"] = time.time()
+    return get_store().update(job_id, fields)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_store().get(job_id)
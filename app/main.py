@@ -1,7 +1,12 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from .routes import router
+from .browser import shutdown_pool
+from .executor import set_executor
+from .parsepool import set_parse_pool
+from .warmup import start_warmup
 from pathlib import Path
+import os
 
 app = FastAPI(title="Web Scraper", version="1.0.0")
 
@@ -12,3 +17,13 @@ if STATIC_DIR.exists():
 	app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 app.include_router(router)
+
+# Scraping dependencies load on first use unless SCRAPER_WARMUP asks for them now
+start_warmup(os.getenv("SCRAPER_WARMUP"))
+
+
+@app.on_event("shutdown")
+def release_resources():
+	shutdown_pool()
+	set_executor(None)
+	set_parse_pool(None)
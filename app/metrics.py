@@ -0,0 +1,224 @@
+"""In-process metrics and per-stage timing spans.
+
+A minimal Prometheus-compatible registry (histograms, counters and derived
+gauges rendered in the text exposition format) so `/metrics` needs no extra
+dependency. Metrics are per process: with several web workers each exposes
+its own, and scrapes running in Celery workers are not visible here.
+
+Stages timed by `span`:
+
+  fetch    static HTTP fetch, including connection setup and body download
+  render   Playwright render of a dynamic page
+  parse    lxml parse plus table/row extraction
+  normalize  dtype normalization of extracted frames (normalize=True)
+  export   file serialization (generate_file / iter_file)
+
+When a `stats` dict is passed, each stage's seconds are also summed into it
+under `time_<stage>` (summed across concurrently fetched pages).
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTE_BUCKETS = tuple(2 ** n for n in range(10, 27, 2))  # 1 KiB .. 64 MiB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+ROW_BUCKETS = (0, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+_registry: List["_Metric"] = []
+_stats_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts, sum]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = {k: (list(counts), total) for k, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """A gauge computed from `fn` at render time; omitted while fn returns None."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def samples(self) -> Iterator[str]:
+        value = self.fn()
+        if value is not None:
+            yield f"{self.name} {_format_value(value)}"
+
+
+STAGE_SECONDS = Histogram("scraper_stage_seconds", "Time spent per scrape stage.", ("stage",))
+FETCH_SECONDS = Histogram("scraper_fetch_seconds", "Time to fetch or render one page.", ("mode",))
+FETCH_BYTES = Histogram("scraper_fetch_bytes", "Body bytes downloaded per page fetch.", ("mode",), BYTE_BUCKETS)
+JOB_PAGES = Histogram("scraper_job_pages", "Pages fetched per scrape.", buckets=COUNT_BUCKETS)
+JOB_ROWS = Histogram("scraper_job_rows", "Rows extracted per scrape.", buckets=ROW_BUCKETS)
+EXPORT_SECONDS = Histogram("scraper_export_seconds", "Time to serialize a scrape result.", ("format",))
+REQUEST_SECONDS = Histogram("scraper_request_seconds", "End-to-end time of synchronous /scrape requests.", ("format",))
+CACHE_REQUESTS = Counter("scraper_cache_requests_total", "Page fetches by response cache status.", ("status",))
+SCRAPES_REJECTED = Counter("scraper_scrapes_rejected_total", "Synchronous scrapes refused by admission control.", ("status",))
+SCRAPES_CANCELLED = Counter("scraper_scrapes_cancelled_total", "Synchronous scrapes stopped because the client disconnected.")
+
+
+def _cache_hit_ratio() -> Optional[float]:
+    hits = CACHE_REQUESTS.value(status="hit") + CACHE_REQUESTS.value(status="revalidated")
+    total = hits + CACHE_REQUESTS.value(status="miss") + CACHE_REQUESTS.value(status="bypass")
+    return hits / total if total else None
+
+
+CACHE_HIT_RATIO = Gauge(
+    "scraper_cache_hit_ratio",
+    "Share of page fetches served from the response cache (fresh or revalidated) since start.",
+    _cache_hit_ratio,
+)
+
+
+def record(stage: str, seconds: float, stats: Optional[dict] = None,
+           histogram: Optional[Histogram] = None, **labels: str) -> None:
+    """Record `seconds` spent in `stage` (and in `histogram`, if given)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if histogram is not None:
+        histogram.observe(seconds, **labels)
+    if stats is not None:
+        key = f"time_{stage}"
+        with _stats_lock:
+            stats[key] = stats.get(key, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str, stats: Optional[dict] = None, histogram: Optional[Histogram] = None, **labels: str):
+    """Time the enclosed block as one `stage` observation (see `record`)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start, stats, histogram, **labels)
+
+
+class Stopwatch:
+    """Accumulates time over several `with` blocks, for stages that are
+    interleaved with other work (e.g. streamed exports)."""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._start = 0.0
+
+    def __enter__(self) -> "Stopwatch":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed += time.perf_counter() - self._start
+
+
+def timings(stats: dict) -> Dict[str, float]:
+    """Stage timings accumulated in `stats`, in milliseconds."""
+    return {k[5:]: round(v * 1000, 3) for k, v in stats.items() if k.startswith("time_")}
+
+
+def server_timing(stats: dict, total: Optional[float] = None) -> str:
+    """`Server-Timing` header value for the stages in `stats` (plus `total` seconds)."""
+    entries = [f"{stage};dur={ms}" for stage, ms in timings(stats).items()]
+    if total is not None:
+        entries.append(f"total;dur={round(total * 1000, 3)}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    return "".join(metric.render() for metric in _registry)
@@ -8,7 +8,7 @@ class ScrapeRequest(BaseModel):
 
     @validator('format')
     def validate_format(cls, v):
-        if v not in ['csv', 'xlsx', 'json', 'txt']:
+        if v not in ['csv', 'xlsx', 'json', 'jsonl', 'txt', 'parquet', 'arrow']:
             raise ValueError('Invalid format')
         return v
 
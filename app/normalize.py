@@ -0,0 +1,130 @@
+"""Typed, compact DataFrames for scraped tables and rows.
+
+Tables come out of the parser with object columns wherever a cell is not a
+plain number ("1,234[a]", "−5", "12 Mar 2021"), and row extraction keeps one
+Python string per cell even for columns that repeat a handful of values
+(`tag`, `classes`, `href`). `normalize_frame` turns such columns into
+
+  - numbers, after stripping footnote markers ([1], [a], [note 2], †, *),
+    thousands separators and unicode minus signs;
+  - datetimes, for columns whose every value looks like a date;
+  - categoricals, for string columns with few distinct values;
+
+and downcasts integer columns. Cells that only differ by footnote markers
+change value, so normalization is opt-in (`normalize=True`).
+"""
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+# Strings of at most this share of distinct values become categoricals...
+CATEGORY_MAX_RATIO = 0.5
+# ...in frames of at least this many rows (the dictionary costs more below)
+CATEGORY_MIN_ROWS = 16
+
+_FOOTNOTES = re.compile(
+    r"\[(?:\d+|[a-z]{1,2}|[ivx]+|(?:note|nb|n|lower-alpha)\s*\d+|citation needed|clarification needed)\]"
+    r"|[†‡§¶*]+(?=\s*$)",
+    re.IGNORECASE,
+)
+# Thousands separators: a comma or (no-break, thin) space followed by exactly three digits
+_THOUSANDS = re.compile(r"(?<=\d)[,\s](?=\d{3}(?:\D|$))")
+_MISSING = {"", "-", "–", "—", "n/a", "na", "?", "none", "null"}
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_DATE_LIKE = re.compile(
+    r"^(?:\d{4}-\d{1,2}-\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?"
+    r"|\d{1,2}[/.]\d{1,2}[/.]\d{4}"
+    rf"|\d{{1,2}} {_MONTHS},? \d{{4}}"
+    rf"|{_MONTHS} \d{{1,2}},? \d{{4}})$",
+    re.IGNORECASE,
+)
+
+Data = Union[pd.DataFrame, Dict[str, pd.DataFrame]]
+
+
+def strip_footnotes(series: pd.Series) -> pd.Series:
+    return series.str.replace(_FOOTNOTES, "", regex=True).str.strip()
+
+
+def _to_number(text: pd.Series) -> Optional[pd.Series]:
+    cleaned = text.str.replace(_THOUSANDS, "", regex=True).str.replace("\u2212", "-", regex=False)
+    numbers = pd.to_numeric(cleaned, errors="coerce")
+    if numbers.notna().sum() != text.notna().sum():
+        return None
+    return pd.to_numeric(numbers, downcast="integer") if pd.api.types.is_integer_dtype(numbers) else numbers
+
+
+def _to_datetime(text: pd.Series) -> Optional[pd.Series]:
+    present = text.dropna()
+    if not present.str.match(_DATE_LIKE).all():
+        return None
+    iso = present.str.match(r"^\d{4}-").all()
+    dates = pd.to_datetime(text, errors="coerce", format="ISO8601" if iso else "mixed")
+    if dates.notna().sum() != len(present):
+        return None
+    return dates
+
+
+def normalize_column(series: pd.Series) -> pd.Series:
+    """Typed/compact version of one column (the column itself when nothing applies)."""
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if series.dtype != object:
+        return series
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind != "string":
+        return series
+    text = strip_footnotes(series)
+    text = text.where(~text.str.lower().isin(_MISSING))
+    if text.notna().any():
+        converted = _to_number(text)
+        if converted is None:
+            converted = _to_datetime(text)
+        if converted is not None:
+            return converted
+    n = len(series)
+    if n >= CATEGORY_MIN_ROWS and series.nunique(dropna=True) <= n * CATEGORY_MAX_RATIO:
+        return series.astype("category")
+    return series
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize every column of `df` (see module docstring), in place."""
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        converted = normalize_column(series)
+        if converted is not series:
+            df.isetitem(i, converted)
+    return df
+
+
+def frame_bytes(data: Data) -> int:
+    """Memory held by the frames of `data`, counting string contents."""
+    frames = data.values() if isinstance(data, dict) else [data]
+    return int(sum(df.memory_usage(deep=True, index=False).sum() for df in frames))
+
+
+def normalize_data(data: Data) -> Tuple[Data, int, int]:
+    """Normalize one page's data in place; returns (data, bytes before, bytes after)."""
+    before = frame_bytes(data)
+    for df in (data.values() if isinstance(data, dict) else [data]):
+        normalize_frame(df)
+    return data, before, frame_bytes(data)
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat that keeps columns categorical when they are in every frame
+    (plain concat falls back to object unless the categories are identical)."""
+    if len(frames) > 1:
+        shared = [
+            col for col in frames[0].columns
+            if all(col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames)
+        ]
+        if shared:
+            frames = [f.copy(deep=False) for f in frames]
+            for col in shared:
+                categories = pd.api.types.union_categoricals([f[col] for f in frames], ignore_order=True).categories
+                for f in frames:
+                    f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,170 @@
+"""Process pool for parsing fetched pages on every core.
+
+Fetching is I/O-bound and runs on threads, but building a page's tree and
+its DataFrames is CPU-bound Python that holds the GIL, so a threaded scrape
+parses one page at a time. With `parse_workers` (or SCRAPER_PARSE_WORKERS)
+iter_pages hands each fetched page's HTML to a pool of parser processes
+instead:
+
+  SCRAPER_PARSE_WORKERS   parser processes (default 0 = parse in the scraping
+                          thread); iter_pages' `parse_workers` overrides it
+  SCRAPER_PARSE_QUEUE     pages allowed to wait for a parser (default: one per
+                          parser); fetchers block once it is full
+
+Workers send back only the extracted (and, with normalize=True, compacted)
+DataFrames and the page's next link, never the parsed tree. The pool is
+shared by every scrape in the process: scrapes hold it between
+acquire_parse_pool and release_parse_pool, and a scrape asking for more
+workers than it has replaces it for later scrapes while current ones finish
+on the old processes. Daemonic processes (e.g. Celery's prefork children)
+cannot start one, so they parse in-thread.
+"""
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Mapping, Optional, Tuple
+
+
+def parse_page(
+    html: str,
+    base_url: str,
+    selector: Optional[str],
+    plan: Optional[Mapping[str, Any]],
+    max_elements: Optional[int],
+    max_rows: Optional[int],
+    normalize: bool,
+    next_selector: Optional[str] = None,
+    extract: bool = True,
+) -> Tuple[Any, bool, float, Optional[Tuple[float, int, int]], Optional[str]]:
+    """Extract one page in a parser process.
+
+    Returns (data, truncated, parse seconds, normalization, next url) where
+    normalization is (seconds, bytes before, bytes after) or None, and the
+    next url is what `next_selector` finds. With extract=False only the next
+    link is read and data is {}.
+    """
+    from .extract import ParsedPage
+    from .normalize import normalize_data
+    from .plans import resolve_plan
+
+    started = time.perf_counter()
+    page = ParsedPage(html, base_url)
+    if not extract:
+        data = {}
+    elif plan is not None:
+        data = resolve_plan(plan).extract(page, max_rows)
+    else:
+        data = page.extract(selector, max_elements, max_rows)
+    next_url = page.next_url(next_selector) if next_selector else None
+    parsed = time.perf_counter()
+    normalized = None
+    if normalize and extract:
+        data, before, after = normalize_data(data)
+        normalized = (time.perf_counter() - parsed, before, after)
+    return data, page.truncated, parsed - started, normalized, next_url
+
+
+class ParsePool:
+    def __init__(self, workers: int, queue: Optional[int] = None):
+        self.workers = max(1, workers)
+        # Pages parsing plus pages waiting for a parser
+        self._slots = threading.BoundedSemaphore(self.workers + (self.workers if queue is None else max(0, queue)))
+        self._lock = threading.Lock()
+        # Scrapes holding this pool, and whether a larger pool has replaced it
+        self.users = 0
+        self.retired = False
+        self.pool = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the scraping process runs threads (fetchers, browsers)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, *args) -> Future:
+        """Queue parse_page(*args), blocking while the queue is full."""
+        self._slots.acquire()
+        try:
+            try:
+                future = self.pool.submit(parse_page, *args)
+            except BrokenProcessPool:
+                # A parser died (e.g. killed for memory); its pages failed, later ones get new processes
+                with self._lock:
+                    broken, self.pool = self.pool, self._start()
+                broken.shutdown(wait=False)
+                future = self.pool.submit(parse_page, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool: Optional[ParsePool] = None
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    return int(os.getenv("SCRAPER_PARSE_WORKERS", "0") or 0)
+
+
+def acquire_parse_pool(workers: Optional[int] = None) -> Optional[ParsePool]:
+    """Return the process-wide parser pool with at least `workers` processes
+    (default SCRAPER_PARSE_WORKERS), or None when parsing stays in-thread.
+    Callers hand the pool back with release_parse_pool when done."""
+    global _pool
+    workers = default_workers() if workers is None else workers
+    if workers <= 0 or multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool.workers < workers:
+            # A larger pool replaces a smaller one; scrapes still using the old one
+            # keep it until they release it
+            previous, _pool = _pool, ParsePool(workers, _queue_size())
+            if previous is not None:
+                previous.retired = True
+                if not previous.users:
+                    previous.shutdown()
+            else:
+                # A multiprocessing child joins its own children before atexit handlers
+                # run, so stop the pool first (and before the queues it talks through close)
+                multiprocessing.util.Finalize(None, _shutdown_at_exit, exitpriority=100)
+        _pool.users += 1
+        return _pool
+
+
+def release_parse_pool(pool: ParsePool) -> None:
+    with _pool_lock:
+        pool.users -= 1
+        idle = pool.retired and not pool.users
+    if idle:
+        pool.shutdown()
+
+
+def _queue_size() -> Optional[int]:
+    queue = os.getenv("SCRAPER_PARSE_QUEUE")
+    return int(queue) if queue else None
+
+
+def _shutdown_at_exit() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def set_parse_pool(pool: Optional[ParsePool]) -> None:
+    """Replace the process-wide parser pool (None shuts it down until next use)."""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+        if previous is not None:
+            previous.retired = True
+    if previous is not None and previous is not pool:
+        previous.shutdown()
@@ -0,0 +1,209 @@
+"""Extraction plans: structured fields instead of the fixed row schema.
+
+A plan is a record selector plus named fields, each read from inside every
+record the selector matches:
+
+    {"selector": "li.product",
+     "fields": {"name": "h2", "price": ".price", "url": "a@href", "sku": "@data-sku"}}
+
+Field specs:
+
+  ""  or "."        text of the record itself
+  "@attr"           attribute of the record
+  "css"             text of the first element matching `css` inside the record
+  "css@attr"        attribute of that element
+  "./xpath"         first result of an XPath relative to the record: an
+                    element's text, or the string an attribute/text() step
+                    returns (e.g. "./a/@href")
+
+Selectors starting with `/`, `./` or `(` are XPath, others CSS. `href` and
+`src` values are resolved against the page URL. Each page yields one row per
+record with at least one non-empty field.
+
+Plans are compiled once (CSS translated to XPath and every expression
+compiled) and kept in an LRU cache keyed by their selectors, so paginated and
+batch jobs reuse the compiled plan on every page. Named plans come from
+`register_plan` or from the JSON object of plans in the file named by
+SCRAPER_PLANS; callers pass a name, a {"selector", "fields"} dict, or an
+ExtractionPlan wherever `plan` is accepted.
+"""
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
+
+import pandas as pd
+from lxml import etree
+
+from .extract import Element, ParsedPage, compile_selector, css_to_xpath, element_text, is_xpath
+
+# Attributes holding URLs, resolved to absolute ones
+URL_ATTRIBUTES = {"href", "src"}
+
+_ATTRIBUTE_SUFFIX = re.compile(r"^(.*?)\s*@([A-Za-z_][\w:.-]*)$", re.DOTALL)
+
+Field = Callable[[Element], Optional[str]]
+PlanSpec = Union[str, Mapping[str, Any], "ExtractionPlan"]
+
+
+def _first_text(results) -> Optional[str]:
+    for result in results if isinstance(results, list) else [results]:
+        if isinstance(result, etree._Element):
+            return element_text(result)
+        if isinstance(result, str):
+            return result.strip()
+        if isinstance(result, (int, float)) and not isinstance(result, bool):
+            return str(result)
+    return None
+
+
+def compile_field(spec: str) -> Tuple[Field, Optional[str]]:
+    """Compile one field spec into (reader, attribute it reads or None)."""
+    spec = spec.strip()
+    if spec in ("", "."):
+        return element_text, None
+    if is_xpath(spec):
+        try:
+            expression = etree.XPath(spec, smart_strings=False)
+        except etree.XPathSyntaxError as e:
+            raise ValueError(f"Invalid XPath field {spec!r}: {e}") from None
+        attribute = spec.rsplit("/@", 1)[1] if "/@" in spec else None
+        return (lambda el: _first_text(expression(el))), attribute
+    selector, attribute = spec, None
+    match = _ATTRIBUTE_SUFFIX.match(spec)
+    if match:
+        selector, attribute = match.group(1), match.group(2)
+    if not selector:
+        return (lambda el: el.get(attribute)), attribute
+    path = css_to_xpath(selector)
+    if path is None:
+        raise ValueError(f"Unsupported CSS in field {spec!r}")
+    # descendant-or-self: a field selector may match the record itself
+    first = etree.XPath(f"({path})[1]")
+    if attribute is None:
+        return (lambda el: _first_text(first(el))), None
+    return (lambda el: next((m.get(attribute) for m in first(el)), None)), attribute
+
+
+class ExtractionPlan:
+    """A compiled record selector and field mapping (see module docstring)."""
+
+    def __init__(self, selector: str, fields: Mapping[str, str], name: Optional[str] = None):
+        if not selector:
+            raise ValueError("An extraction plan needs a record selector")
+        if not fields:
+            raise ValueError("An extraction plan needs at least one field")
+        self.name = name
+        self.selector = selector
+        self.fields = dict(fields)
+        self._select = compile_selector(selector)
+        self._readers = [(field, *compile_field(spec)) for field, spec in self.fields.items()]
+
+    def spec(self) -> Dict[str, Any]:
+        """JSON form, as accepted by resolve_plan."""
+        return {"selector": self.selector, "fields": dict(self.fields)}
+
+    def extract(self, page: ParsedPage, max_rows: Optional[int] = None) -> pd.DataFrame:
+        """One row per matched record with any field set (at most `max_rows`);
+        columns in field order."""
+        return self.extract_limited(page, max_rows)[0]
+
+    def extract_limited(self, page: ParsedPage, max_rows: Optional[int] = None,
+                        open_elements: Optional[Set[Element]] = None) -> Tuple[pd.DataFrame, bool]:
+        """extract(), plus whether the result is final on a partially parsed
+        page (see ParsedPage.extract_limited): `max_rows` closed records read."""
+        columns: Dict[str, List[Optional[str]]] = {field: [] for field in self.fields}
+        readers = self._readers
+        count = 0
+        final = open_elements is None
+        for record in self._select(page):
+            if open_elements is not None and record in open_elements:
+                break
+            values = [read(record) or None for _, read, _ in readers]
+            if any(values):
+                for (field, _, _), value in zip(readers, values):
+                    columns[field].append(value)
+                count += 1
+                if max_rows and count >= max_rows:
+                    final = True
+                    break
+        if not count:
+            return pd.DataFrame([{"message": "No content matched the selector."}]), final
+        for field, _, attribute in readers:
+            if attribute in URL_ATTRIBUTES:
+                columns[field] = page.resolver.resolve_all(columns[field])
+        return pd.DataFrame(columns), final
+
+
+@lru_cache(maxsize=128)
+def compile_plan(selector: str, fields: Tuple[Tuple[str, str], ...]) -> ExtractionPlan:
+    return ExtractionPlan(selector, dict(fields))
+
+
+_registry: Dict[str, ExtractionPlan] = {}
+_registry_lock = threading.Lock()
+_loaded = False
+
+
+def _load_plans_file() -> None:
+    # Plans from SCRAPER_PLANS are read once, on first lookup
+    global _loaded
+    with _registry_lock:
+        if _loaded:
+            return
+        _loaded = True
+        path = os.getenv("SCRAPER_PLANS")
+        if not path:
+            return
+        with open(path, encoding="utf-8") as f:
+            plans = json.load(f)
+        for name, spec in plans.items():
+            _registry.setdefault(name, ExtractionPlan(spec["selector"], spec["fields"], name=name))
+
+
+def register_plan(name: str, selector: str, fields: Mapping[str, str]) -> ExtractionPlan:
+    """Compile and register a named plan (replacing any plan of that name)."""
+    _load_plans_file()
+    plan = ExtractionPlan(selector, fields, name=name)
+    with _registry_lock:
+        _registry[name] = plan
+    return plan
+
+
+def get_plan(name: str) -> ExtractionPlan:
+    _load_plans_file()
+    with _registry_lock:
+        plan = _registry.get(name)
+    if plan is None:
+        raise ValueError(f"Unknown extraction plan: {name}")
+    return plan
+
+
+def plan_names() -> List[str]:
+    _load_plans_file()
+    with _registry_lock:
+        return sorted(_registry)
+
+
+def clear_plans() -> None:
+    """Forget registered plans; SCRAPER_PLANS is read again on next use."""
+    global _loaded
+    with _registry_lock:
+        _registry.clear()
+        _loaded = False
+
+
+def resolve_plan(plan: PlanSpec) -> ExtractionPlan:
+    """A compiled plan from a registered name, a {"selector", "fields"} spec or a plan."""
+    if isinstance(plan, ExtractionPlan):
+        return plan
+    if isinstance(plan, str):
+        return get_plan(plan)
+    try:
+        selector, fields = plan["selector"], plan["fields"]
+        items = tuple((str(k), str(v)) for k, v in fields.items())
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError('An extraction plan spec needs "selector" and a "fields" object') from None
+    return compile_plan(selector, items)
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Form
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
-from .utils import scrape_data, generate_file
+# pandas, lxml and requests come in through app.utils; it is imported by the
+# handlers that scrape, so `GET /` and cold starts do not pay for it
+from .formats import COLUMNAR_COMPRESSION, STREAM_FORMATS, export_extension
+from . import jobs, metrics
+from .executor import Ticket, get_executor
+from .store import get_result_store
 from pathlib import Path
+import csv
+import json
+from email.utils import formatdate, parsedate_to_datetime
+import re
 import uuid
 import os
-from typing import Optional
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
 import io
+import time
 
 router = APIRouter()
 # Resolve templates path to absolute to work in serverless environments
@@ -14,12 +24,204 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 TEMPLATES_DIR = BASE_DIR / "templates"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
+# Map MIME types
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+    "jsonl": "application/x-ndjson",
+    "txt": "text/plain",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+# Extra MIME types for artifacts that are not a selectable format
+ARTIFACT_MIME_TYPES = {**MIME_TYPES, "zip": "application/zip"}
+# Most URLs accepted by one /scrape/batch request
+BATCH_MAX_URLS = int(os.getenv("SCRAPER_BATCH_MAX_URLS", "1000"))
+# Upper bound for a crawl's max_pages
+CRAWL_MAX_PAGES = int(os.getenv("SCRAPER_CRAWL_MAX_PAGES", "100000"))
+
+# Helpers to parse optional ints and bool form values
+def to_int(v: Optional[str]) -> Optional[int]:
+    if v is None:
+        return None
+    v = v.strip()
+    if v == "":
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        return None
+
+def to_bool(v: Optional[str]) -> bool:
+    if v is None:
+        return False
+    return v.strip().lower() in {"1", "true", "on", "yes"}
+
+def check_format(format: str) -> str:
+    fmt = format.lower().strip()
+    if fmt not in MIME_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    return fmt
+
+def scrape_options(form: Mapping) -> dict:
+    """iter_pages options from the shared scrape form fields."""
+    text = lambda name: form.get(name) or None
+    return dict(
+        dynamic=to_bool(form.get("dynamic")),
+        wait_selector=text("wait_selector"),
+        wait_ms=to_int(form.get("wait_ms")),
+        block_resources=to_bool(form.get("block_resources")),
+        page_param=text("page_param"),
+        page_start=to_int(form.get("page_start")),
+        page_end=to_int(form.get("page_end")),
+        next_selector=text("next_selector"),
+        max_pages=to_int(form.get("max_pages")),
+        delay_ms=to_int(form.get("delay_ms")),
+        concurrency=to_int(form.get("concurrency")),
+        per_host=to_int(form.get("per_host")),
+        max_elements=to_int(form.get("max_elements")),
+        max_rows=max_rows_option(form),
+        max_bytes=max_bytes_option(form),
+        use_cache=not to_bool(form.get("no_cache")),
+        normalize=to_bool(form.get("normalize")),
+        plan=plan_option(form),
+    )
+
+def max_rows_option(form: Mapping) -> Optional[int]:
+    value = to_int(form.get("max_rows"))
+    if value is not None and value <= 0:
+        raise HTTPException(status_code=400, detail="max_rows must be a positive number of rows")
+    return value
+
+def max_bytes_option(form: Mapping) -> Optional[int]:
+    """Client download size limit: positive, and never above SCRAPER_MAX_BYTES
+    (only the server can lift the limit)."""
+    value = to_int(form.get("max_bytes"))
+    if value is None:
+        return None
+    if value <= 0:
+        raise HTTPException(status_code=400, detail="max_bytes must be a positive number of bytes")
+    from .fetcher import max_bytes_limit
+    limit = max_bytes_limit()
+    return min(value, limit) if limit > 0 else value
+
+def plan_option(form: Mapping):
+    """Extraction plan from the form: a registered `plan` name, or inline `fields`
+    (JSON object of field specs) applied to the records `selector` matches."""
+    name = (form.get("plan") or "").strip()
+    fields = (form.get("fields") or "").strip()
+    if not name and not fields:
+        return None
+    if name and fields:
+        raise HTTPException(status_code=400, detail="Use either plan or fields, not both")
+    if name:
+        plan = name
+    else:
+        try:
+            plan = {"selector": (form.get("selector") or "").strip(), "fields": json.loads(fields)}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="fields must be a JSON object")
+    from .plans import resolve_plan
+    try:
+        resolve_plan(plan)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Names and specs stay JSON for async jobs; workers compile them again
+    return plan
+
+def export_settings(form: Mapping, fmt: str) -> Tuple[dict, str]:
+    """generate_file options and the resulting file extension."""
+    export_options = dict(
+        compression=(form.get("compression") or "").strip() or None,
+        partition=to_bool(form.get("partition")),
+    )
+    codec = export_options["compression"]
+    if codec and codec.lower() not in COLUMNAR_COMPRESSION.get(fmt, ()):
+        raise HTTPException(status_code=400, detail="Invalid compression for format")
+    return export_options, export_extension(fmt, export_options["partition"])
+
+def incremental_options(form: Mapping) -> Optional[dict]:
+    """iter_changes options when the form asks for an incremental scrape."""
+    mode = (form.get("incremental") or "").strip().lower()
+    if not mode or mode in {"0", "false", "off", "no"}:
+        return None
+    if mode not in {"diff", "log", "1", "true", "on", "yes"}:
+        raise HTTPException(status_code=400, detail="Invalid incremental mode")
+    key = [c.strip() for c in (form.get("key") or "").split(",") if c.strip()]
+    return dict(job=(form.get("job") or "").strip() or None, key=key or None, log=mode == "log")
+
+def wants_async(request: Request, form: Mapping) -> bool:
+    return to_bool(form.get("async")) or to_bool(request.query_params.get("async"))
+
+def enqueue(task_name: str, args: tuple, **record) -> JSONResponse:
+    # Record the job before enqueueing so /status works as soon as the id is returned
+    try:
+        from . import tasks
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Async jobs require Celery")
+    job_id = str(uuid.uuid4())
+    jobs.update_job(job_id, status=jobs.QUEUED, **record)
+    try:
+        getattr(tasks, task_name).delay(job_id, *args)
+    except Exception as e:
+        jobs.update_job(job_id, status=jobs.FAILED, error=f"Could not enqueue job: {e}")
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    return JSONResponse(
+        {"job_id": job_id, "status_url": f"/status/{job_id}", "result_url": f"/result/{job_id}"},
+        status_code=202,
+    )
+
+async def export_response(request: Request, ticket: Ticket, pages: Iterable, merge: Callable, fmt: str, ext: str,
+                          export_options: dict, stats: dict, started: float):
+    """Serialize iter_pages-style `pages` as a download (streamed when the format allows).
+    All scraping and serialization runs on the scrape executor under `ticket`."""
+    from .utils import ScrapeCancelled, generate_file, iter_file
+    try:
+        if fmt in STREAM_FORMATS:
+            # Stream page by page; pull the first chunk here so failures still get a 500
+            chunks = timed_body(iter_file(pages, fmt, stats), fmt, started)
+            first = await ticket.first(request, chunks)
+            body = ticket.stream(first, chunks)
+        else:
+            # Scrape and generate file in-memory
+            def build() -> bytes:
+                data = merge(pages)
+                with metrics.span("export", stats, metrics.EXPORT_SECONDS, format=fmt):
+                    return generate_file(data, fmt, **export_options)
+            body = io.BytesIO(await ticket.run(request, build))
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, format=fmt)
+    except ScrapeCancelled:
+        # The client is gone; nobody reads this
+        return Response(status_code=499)
+    except Exception as e:
+        return HTMLResponse(f"<h3>Scrape failed:</h3><pre>{str(e)}</pre>", status_code=500)
+
+    media_type = ARTIFACT_MIME_TYPES.get(ext.rsplit(".", 1)[-1], "application/octet-stream")
+    filename = f"scraped.{ext}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}", **cache_headers(stats)}
+    if stats.get("truncated"):
+        headers["X-Truncated-Pages"] = str(stats["truncated"])
+    if stats.get("errors"):
+        headers["X-Batch-Errors"] = str(stats["errors"])
+    if any(k.startswith("rows_") for k in stats) or "pages_unchanged" in stats:
+        headers["X-Changes"] = ", ".join(f"{c}={stats.get('rows_' + c, 0)}" for c in ("added", "removed", "changed"))
+        headers["X-Unchanged-Pages"] = str(stats.get("pages_unchanged", 0))
+    if "memory_bytes" in stats:
+        headers["X-Table-Memory"] = f"raw={int(stats['memory_raw_bytes'])}, normalized={int(stats['memory_bytes'])}"
+    if to_bool(os.getenv("SCRAPER_SERVER_TIMING")):
+        # Streamed formats send headers after the first chunk, so only that part is covered
+        headers["Server-Timing"] = metrics.server_timing(stats, time.perf_counter() - started)
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @router.post("/scrape")
 async def scrape(
+    request: Request,
     url: str = Form(...),
     selector: Optional[str] = Form(None),
     format: str = Form(...),
@@ -27,6 +229,7 @@ async def scrape(
     dynamic: Optional[str] = Form(None),
     wait_selector: Optional[str] = Form(None),
     wait_ms: Optional[str] = Form(None),
+    block_resources: Optional[str] = Form(None),
     # Pagination by query param
     page_param: Optional[str] = Form(None),
     page_start: Optional[str] = Form(None),
@@ -35,83 +238,318 @@ async def scrape(
     next_selector: Optional[str] = Form(None),
     max_pages: Optional[str] = Form(None),
     delay_ms: Optional[str] = Form(None),
+    # Concurrency for query-param pagination
+    concurrency: Optional[str] = Form(None),
+    per_host: Optional[str] = Form(None),
+    # Cap on fallback content elements per page (0 = no cap)
+    max_elements: Optional[str] = Form(None),
+    # Rows kept per table and download size limit per page
+    max_rows: Optional[str] = Form(None),
+    max_bytes: Optional[str] = Form(None),
+    # Skip the HTTP response cache
+    no_cache: Optional[str] = Form(None),
+    # Give columns compact types before export
+    normalize: Optional[str] = Form(None),
+    # Extraction plan: a registered plan name, or inline JSON field specs
+    plan: Optional[str] = Form(None),
+    fields: Optional[str] = Form(None),
+    # Columnar export options (parquet/arrow)
+    compression: Optional[str] = Form(None),
+    partition: Optional[str] = Form(None),
+    # Only return rows changed since the last run: diff | log, optional snapshot name and key columns
+    incremental: Optional[str] = Form(None),
+    job: Optional[str] = Form(None),
+    key: Optional[str] = Form(None),
+    # Enqueue as a background job instead of scraping inline
+    async_mode: Optional[str] = Form(None, alias="async"),
 ):
-    # Basic validation for format
-    allowed = {"csv", "xlsx", "json", "txt"}
-    fmt = format.lower().strip()
-    if fmt not in allowed:
-        raise HTTPException(status_code=400, detail="Invalid format")
-
-    # Helpers to parse optional ints and bool
-    def to_int(v: Optional[str]) -> Optional[int]:
-        if v is None:
-            return None
-        v = v.strip()
-        if v == "":
-            return None
-        try:
-            return int(v)
-        except ValueError:
-            return None
-
-    def to_bool(v: Optional[str]) -> bool:
-        if v is None:
-            return False
-        return v.strip().lower() in {"1", "true", "on", "yes"}
+    fmt = check_format(format)
 
     # Validate URL scheme
     if not (url.startswith("http://") or url.startswith("https://")):
         return HTMLResponse("<h3>Invalid URL. Only http/https allowed.</h3>", status_code=400)
 
-    # Scrape and generate file in-memory
-    try:
-        data = scrape_data(
-            url,
-            selector,
-            dynamic=to_bool(dynamic),
-            wait_selector=wait_selector,
-            wait_ms=to_int(wait_ms),
-            page_param=page_param,
-            page_start=to_int(page_start),
-            page_end=to_int(page_end),
-            next_selector=next_selector,
-            max_pages=to_int(max_pages),
-            delay_ms=to_int(delay_ms),
+    # The fields above document the form; options are read from the parsed form
+    # (cached by Starlette) so /scrape/batch shares the same parsing
+    form = await request.form()
+    options = scrape_options(form)
+    changes = incremental_options(form)
+    export_options, ext = export_settings(form, fmt)
+
+    if wants_async(request, form):
+        if changes is not None:
+            return enqueue(
+                "changes_task", (url, selector, fmt, options, export_options, changes),
+                url=url, format=fmt, artifact=ext, pages_done=0, pages_total=None,
+            )
+        return enqueue(
+            "scrape_task", (url, selector, fmt, options, export_options),
+            url=url, format=fmt, artifact=ext, pages_done=0, pages_total=None,
         )
-        file_bytes = generate_file(data, fmt)
-    except Exception as e:
-        return HTMLResponse(f"<h3>Scrape failed:</h3><pre>{str(e)}</pre>", status_code=500)
 
-    # Map MIME types
-    mime_map = {
-        "csv": "text/csv",
-        "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        "json": "application/json",
-        "txt": "text/plain",
-    }
-    media_type = mime_map.get(fmt, "application/octet-stream")
-    filename = f"scraped.{fmt}"
+    from .utils import iter_pages, merge_pages
+    ticket = get_executor().admit(request)
+    stats: dict = {}
+    started = time.perf_counter()
+    if changes is not None:
+        from .incremental import iter_changes
+        pages = iter_changes(url, selector, stats=stats, cancel=ticket.cancel, **changes, **options)
+    else:
+        pages = iter_pages(url, selector, stats=stats, cancel=ticket.cancel, **options)
+    return await export_response(request, ticket, pages, merge_pages, fmt, ext, export_options, stats, started)
+
+def parse_url_list(text: str) -> List[str]:
+    """URLs from pasted text or an uploaded file: one per line, or a CSV whose
+    rows hold a URL in some column. Blank lines, `#` comments and rows without
+    a URL (e.g. a header) are skipped."""
+    urls = []
+    for row in csv.reader(line for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")):
+        cells = [c.strip() for c in row if c.strip()]
+        url = next((c for c in cells if "://" in c), None)
+        if url is None and len(cells) == 1 and cells[0].lower() not in {"url", "urls"}:
+            url = cells[0]  # reported as an invalid URL rather than dropped
+        if url:
+            urls.append(url)
+    return urls
+
+@router.post("/scrape/batch")
+async def scrape_batch_endpoint(
+    request: Request,
+    format: str = Form(...),
+    urls: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    selector: Optional[str] = Form(None),
+    # URLs scraped in parallel (per-host limits still apply across the batch)
+    url_concurrency: Optional[str] = Form(None),
+):
+    # Same options as /scrape (dynamic, pagination, per_host, delay_ms, ...) apply to every URL
+    fmt = check_format(format)
+    url_list = parse_url_list(urls or "")
+    if file is not None:
+        url_list += parse_url_list((await file.read()).decode("utf-8-sig", errors="replace"))
+    if not url_list:
+        raise HTTPException(status_code=400, detail="No URLs given")
+    if len(url_list) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_URLS} URLs per batch")
+
+    form = await request.form()
+    options = scrape_options(form)
+    options["url_concurrency"] = to_int(url_concurrency)
+    export_options, ext = export_settings(form, fmt)
+
+    if wants_async(request, form):
+        return enqueue(
+            "batch_task", (url_list, selector, fmt, options, export_options),
+            urls_total=len(url_list), format=fmt, artifact=ext, urls_done=0,
+        )
+
+    from .utils import batch_pages, iter_batch, merge_batch
+    ticket = get_executor().admit(request)
+    stats: dict = {}
+    started = time.perf_counter()
+    pages = batch_pages(iter_batch(url_list, selector, stats=stats, cancel=ticket.cancel, **options))
+    return await export_response(request, ticket, pages, merge_batch, fmt, ext, export_options, stats, started)
 
-    return StreamingResponse(
-        io.BytesIO(file_bytes),
-        media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+@router.post("/crawl")
+async def crawl_endpoint(
+    request: Request,
+    url: str = Form(...),
+    format: str = Form(...),
+    selector: Optional[str] = Form(None),
+    # Which links to follow: CSS selector (default a[href]) and optional URL regex
+    follow_selector: Optional[str] = Form(None),
+    follow_pattern: Optional[str] = Form(None),
+    # Limits
+    max_depth: Optional[str] = Form(None),
+    max_pages: Optional[str] = Form(None),
+    # Follow links to other hosts too
+    all_hosts: Optional[str] = Form(None),
+    ignore_robots: Optional[str] = Form(None),
+):
+    # dynamic/wait options, concurrency, per_host, delay_ms, max_elements, max_rows, max_bytes and no_cache work as in /scrape
+    fmt = check_format(format)
+    if not (url.startswith("http://") or url.startswith("https://")):
+        return HTMLResponse("<h3>Invalid URL. Only http/https allowed.</h3>", status_code=400)
+    if follow_pattern:
+        try:
+            re.compile(follow_pattern)
+        except re.error:
+            raise HTTPException(status_code=400, detail="Invalid follow_pattern")
+
+    form = await request.form()
+    base = scrape_options(form)
+    options = dict(
+        {k: base[k] for k in ("dynamic", "wait_selector", "wait_ms", "block_resources", "delay_ms",
+                              "concurrency", "per_host", "max_elements", "max_rows", "max_bytes",
+                              "use_cache", "normalize", "plan")},
+        follow_selector=follow_selector or None,
+        follow_pattern=follow_pattern or None,
+        same_host=not to_bool(all_hosts),
+        respect_robots=not to_bool(ignore_robots),
+        max_depth=to_int(max_depth),
+        max_pages=min(to_int(max_pages) or 100, CRAWL_MAX_PAGES),
     )
+    export_options, ext = export_settings(form, fmt)
+
+    if wants_async(request, form):
+        return enqueue(
+            "crawl_task", (url, selector, fmt, options, export_options),
+            url=url, format=fmt, artifact=ext, pages_done=0, pages_total=None,
+        )
+
+    from .crawler import iter_crawl
+    from .utils import merge_pages
+    ticket = get_executor().admit(request)
+    stats: dict = {}
+    started = time.perf_counter()
+    pages = iter_crawl(url, selector, stats=stats, cancel=ticket.cancel, **options)
+    return await export_response(request, ticket, pages, merge_pages, fmt, ext, export_options, stats, started)
+
+def timed_body(chunks, fmt: str, started: float):
+    # Observe the full request time once the streamed body is finished
+    try:
+        yield from chunks
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, format=fmt)
+
+def cache_headers(stats: dict) -> dict:
+    # X-Cache summarizes the pages of a scrape: HIT when every page came from the cache
+    # (fresh or revalidated), MISS when none did, PARTIAL otherwise
+    hits = stats.get("cache_hit", 0) + stats.get("cache_revalidated", 0)
+    total = hits + stats.get("cache_miss", 0) + stats.get("cache_bypass", 0)
+    if not total:
+        return {}
+    status = "HIT" if hits == total else ("MISS" if hits == 0 else "PARTIAL")
+    return {"X-Cache": status, "X-Cache-Hits": f"{hits}/{total}"}
+
+@router.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def load_job(job_id: str) -> dict:
+    # Job ids are UUIDs; rejecting anything else also keeps them path-safe
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @router.get("/status/{job_id}")
 async def get_status(job_id: str):
-    # Check Redis for status
-    # Simplified
-    return {"job_id": job_id, "status": "completed"}  # Placeholder
-
-@router.get("/result/{job_id}")
-async def get_result(job_id: str):
-    # Retrieve file from storage
-    # Simplified
-    file_path = f"temp/{job_id}.csv"  # Placeholder
-    if os.path.exists(file_path):
-        def iterfile():
-            with open(file_path, 'rb') as f:
-                yield from f
-        return StreamingResponse(iterfile(), media_type='text/csv', headers={"Content-Disposition": f"attachment; filename=data.csv"})
-    raise HTTPException(status_code=404, detail="File not found")
+    return load_job(job_id)
+
+def etag_matches(header: str, *etags: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) in etags:
+            return True
+    return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, stop) of a single `bytes=` range; None when the header is not
+    one we serve (the whole file is sent then). Raises 416 when unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or "," in spec or not dash:
+        return None
+    try:
+        if first:
+            start, stop = int(first), (int(last) + 1 if last else size)
+            if last and stop <= start:
+                return None  # malformed: last byte before first
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            start, stop = (max(0, size - suffix) if suffix else size), size
+    except ValueError:
+        return None
+    stop = min(stop, size)
+    if start >= stop:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, stop
+
+def accepts_encoding(header: str, encoding: str) -> bool:
+    for token in header.split(","):
+        name, _, params = token.strip().partition(";")
+        if name.strip().lower() == encoding:
+            q = params.strip()
+            try:
+                return float(q[2:]) > 0 if q.startswith("q=") else True
+            except ValueError:
+                return False
+    return False
+
+@router.api_route("/result/{job_id}", methods=["GET", "HEAD"])
+async def get_result(job_id: str, request: Request):
+    job = load_job(job_id)
+    status = job.get("status")
+    if status == jobs.FAILED:
+        # The job's failure, not the server's: report it like /status does
+        raise HTTPException(status_code=409, detail=job.get("error") or "Job failed")
+    if status != jobs.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {status}")
+    ext = job.get("artifact") or job["format"]
+    media_type = ARTIFACT_MIME_TYPES.get(ext.rsplit(".", 1)[-1], "application/octet-stream")
+    result = get_result_store().open(job_id)
+    if result is None:
+        # Results written before the result store existed
+        file_path = jobs.result_path(job_id, ext)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="Result not found or expired")
+        return FileResponse(str(file_path), media_type=media_type, filename=f"scraped.{ext}")
+
+    etag = f'"{result.digest}"'
+    encoded_etag = f'"{result.digest}.{result.encoding}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename=scraped.{ext}",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(result.created_at, usegmt=True),
+    }
+    if result.encoding:
+        headers["Vary"] = "Accept-Encoding"
+
+    # Conditional GET: If-None-Match wins over If-Modified-Since
+    inm = request.headers.get("if-none-match")
+    ims = request.headers.get("if-modified-since")
+    if inm is not None:
+        not_modified = etag_matches(inm, etag, encoded_etag)
+    else:
+        try:
+            since = parsedate_to_datetime(ims).timestamp() if ims else None
+        except (TypeError, ValueError):
+            since = None
+        not_modified = since is not None and int(result.created_at) <= since
+    if not_modified:
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        byte_range = parse_range(range_header, result.size)
+
+    if byte_range is not None:
+        start, stop = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{result.size}"
+        headers["Content-Length"] = str(stop - start)
+        body = result.iter_range(start, stop)
+    elif result.encoding and accepts_encoding(request.headers.get("accept-encoding", ""), result.encoding):
+        # The compressed blob goes out as stored
+        status_code = 200
+        headers.update({"Content-Encoding": result.encoding, "ETag": encoded_etag,
+                        "Content-Length": str(result.stored_size)})
+        body = result.iter_encoded()
+    else:
+        status_code = 200
+        headers["Content-Length"] = str(result.size)
+        body = result.iter_range()
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(body, status_code=status_code, headers=headers, media_type=media_type)
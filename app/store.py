@@ -0,0 +1,294 @@
+"""Content-addressed store for async job results.
+
+Each result is stored once per distinct content: blobs are named by the
+SHA-256 of the export, and jobs hold a small reference to their blob, so
+identical results (e.g. recurring scrapes of an unchanged page) share
+storage. Text exports (csv, json, jsonl, txt) are compressed with zstd when
+the `zstandard` package is installed, gzip otherwise; parquet, arrow, xlsx
+and zip artifacts are already compressed and kept as-is.
+
+Compressed blobs are written as independent frames of `BLOCK_SIZE` raw bytes
+(a valid multi-frame zstd / multi-member gzip stream), with an index of frame
+offsets, so byte ranges of the decoded content are served by decompressing
+only the frames they touch, and clients accepting the encoding get the blob
+unchanged.
+
+References expire after a TTL and the oldest are evicted while blobs exceed
+the quota; blobs without references are deleted. Tunable via environment
+variables:
+
+  SCRAPER_RESULT_DIR        store directory (default <SCRAPER_DATA_DIR>/results)
+  SCRAPER_RESULT_TTL        seconds a result is kept (default SCRAPER_JOB_TTL)
+  SCRAPER_RESULT_MAX_BYTES  total stored blob bytes (default 1 GiB)
+  SCRAPER_RESULT_CODEC      zstd | gzip | none (default zstd if available, else gzip)
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from .jobs import JOB_TTL_SECONDS, data_dir, write_atomic
+
+BLOCK_SIZE = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+# Artifacts worth compressing; the others carry their own compression
+COMPRESSIBLE = {"csv", "json", "jsonl", "txt"}
+# Unreferenced blobs younger than this may be about to be referenced by a concurrent put
+_ORPHAN_GRACE_SECONDS = 60
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec() -> Optional[str]:
+    codec = (os.getenv("SCRAPER_RESULT_CODEC") or "").strip().lower()
+    if codec in {"none", "identity", "off"}:
+        return None
+    if codec == "gzip":
+        return "gzip"
+    return "zstd" if _zstd() is not None else "gzip"
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class StoredResult:
+    """A job's reference plus its blob: `size`/`digest` describe the decoded
+    content, `encoding` (zstd, gzip or None) and `stored_size` the blob."""
+
+    def __init__(self, ref: Dict[str, Any], path: Path, offsets: Optional[List[int]], block_size: int):
+        self.ref = ref
+        self.path = path
+        self.offsets = offsets
+        self.block_size = block_size
+
+    digest = property(lambda self: self.ref["digest"])
+    size = property(lambda self: self.ref["size"])
+    stored_size = property(lambda self: self.ref["stored_size"])
+    encoding = property(lambda self: self.ref.get("encoding"))
+    created_at = property(lambda self: self.ref["created_at"])
+
+    def iter_encoded(self) -> Iterator[bytes]:
+        """The blob as stored (compressed when `encoding` is set)."""
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Decoded bytes [start, stop)."""
+        stop = self.size if stop is None else min(stop, self.size)
+        with open(self.path, "rb") as f:
+            if self.encoding is None:
+                f.seek(start)
+                left = stop - start
+                while left > 0:
+                    chunk = f.read(min(CHUNK_SIZE, left))
+                    if not chunk:
+                        return
+                    left -= len(chunk)
+                    yield chunk
+                return
+            block = start // self.block_size
+            while start < stop and block + 1 < len(self.offsets):
+                f.seek(self.offsets[block])
+                data = _decompress(self.encoding, f.read(self.offsets[block + 1] - self.offsets[block]))
+                base = block * self.block_size
+                yield data[start - base:stop - base]
+                start = base + len(data)
+                block += 1
+
+
+class ResultStore:
+    def __init__(self, directory: Path, ttl: float = JOB_TTL_SECONDS, max_bytes: int = 1024 ** 3,
+                 codec: Optional[str] = "gzip", block_size: int = BLOCK_SIZE):
+        self.directory = Path(directory)
+        self.blobs = self.directory / "blobs"
+        self.refs = self.directory / "refs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.refs.mkdir(exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.block_size = block_size
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest: str, encoding: Optional[str]) -> Path:
+        return self.blobs / digest[:2] / f"{digest}.{encoding or 'raw'}"
+
+    def _ref_path(self, job_id: str) -> Path:
+        return self.refs / f"{job_id}.json"
+
+    def put(self, job_id: str, content: Union[bytes, Iterable[bytes]], artifact: str) -> Dict[str, Any]:
+        """Store `content` (bytes or chunks) as the result of `job_id` and
+        return its reference (digest, size, stored_size, encoding, ...)."""
+        encoding = self.codec if artifact.rsplit(".", 1)[-1] in COMPRESSIBLE else None
+        digest = hashlib.sha256()
+        size = 0
+        offsets = [0]
+        pending = bytearray()
+        fd, tmp = tempfile.mkstemp(dir=str(self.blobs), prefix=".put.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                def write_block(block: bytes) -> None:
+                    f.write(_compress(encoding, block))
+                    offsets.append(f.tell())
+
+                for chunk in ([content] if isinstance(content, bytes) else content):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if encoding is None:
+                        f.write(chunk)
+                        continue
+                    pending += chunk
+                    while len(pending) >= self.block_size:
+                        write_block(bytes(pending[:self.block_size]))
+                        del pending[:self.block_size]
+                if encoding is not None and (pending or size == 0):
+                    write_block(bytes(pending))
+                stored_size = f.tell()
+            digest = digest.hexdigest()
+            blob = self._blob_path(digest, encoding)
+            blob.parent.mkdir(exist_ok=True)
+            if blob.exists():
+                # Same content already stored: share it
+                os.unlink(tmp)
+                os.utime(blob)
+            else:
+                if encoding is not None:
+                    index = {"block_size": self.block_size, "offsets": offsets}
+                    write_atomic(blob.with_name(blob.name + ".idx"), json.dumps(index).encode("utf-8"))
+                os.replace(tmp, blob)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        ref = {
+            "digest": digest,
+            "artifact": artifact,
+            "encoding": encoding,
+            "size": size,
+            "stored_size": stored_size,
+            "created_at": time.time(),
+        }
+        write_atomic(self._ref_path(job_id), json.dumps(ref).encode("utf-8"))
+        self.evict()
+        return ref
+
+    def open(self, job_id: str) -> Optional[StoredResult]:
+        """The stored result of `job_id`, or None when missing or expired."""
+        try:
+            ref = json.loads(self._ref_path(job_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if self.ttl and time.time() - ref["created_at"] > self.ttl:
+            return None
+        blob = self._blob_path(ref["digest"], ref.get("encoding"))
+        index = {"block_size": 0, "offsets": None}
+        try:
+            if ref.get("encoding"):
+                index = json.loads(blob.with_name(blob.name + ".idx").read_text(encoding="utf-8"))
+            if not blob.exists():
+                return None
+        except (FileNotFoundError, ValueError):
+            return None
+        return StoredResult(ref, blob, index["offsets"], index["block_size"])
+
+    def evict(self) -> None:
+        """Drop expired references, then the oldest ones while blobs exceed
+        the quota, then blobs no reference points to."""
+        with self._lock:
+            now = time.time()
+            refs = []
+            for path in self.refs.glob("*.json"):
+                try:
+                    ref = json.loads(path.read_text(encoding="utf-8"))
+                except (FileNotFoundError, ValueError):
+                    continue
+                if self.ttl and now - ref["created_at"] > self.ttl:
+                    self._unlink(path)
+                else:
+                    refs.append((ref["created_at"], path, self._blob_path(ref["digest"], ref.get("encoding"))))
+            blobs = {}
+            for path in self.blobs.glob("*/*"):
+                if path.name.endswith(".idx"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                blobs[path] = (stat.st_size, stat.st_mtime)
+
+            users: Dict[Path, int] = {}
+            for _, _, blob in refs:
+                users[blob] = users.get(blob, 0) + 1
+            total = sum(size for size, _ in blobs.values())
+            refs.sort(key=lambda r: r[0])
+            for _, path, blob in refs:
+                if total <= self.max_bytes:
+                    break
+                self._unlink(path)
+                users[blob] -= 1
+                if not users[blob]:
+                    total -= blobs.pop(blob, (0, 0))[0]
+                    self._drop_blob(blob)
+            for blob, (_, mtime) in blobs.items():
+                if not users.get(blob) and now - mtime > _ORPHAN_GRACE_SECONDS:
+                    self._drop_blob(blob)
+
+    def _drop_blob(self, blob: Path) -> None:
+        self._unlink(blob)
+        self._unlink(blob.with_name(blob.name + ".idx"))
+
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore(
+                    Path(os.getenv("SCRAPER_RESULT_DIR") or str(data_dir() / "results")),
+                    ttl=float(os.getenv("SCRAPER_RESULT_TTL", str(JOB_TTL_SECONDS))),
+                    max_bytes=int(os.getenv("SCRAPER_RESULT_MAX_BYTES", str(1024 ** 3))),
+                    codec=default_codec(),
+                )
+    return _store
+
+
+def set_result_store(store: Optional[ResultStore]) -> None:
+    """Replace the process-wide result store (None rebuilds it from the environment on next use)."""
+    global _store
+    with _store_lock:
+        _store = store
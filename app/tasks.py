@@ -1,15 +1,125 @@
 from celery import Celery
 import os
+import time
 
-celery_app = Celery('tasks', broker=os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+from . import jobs, metrics
 
-@celery_app.task
-def scrape_task(job_id, url, selector, format):
-    from .utils import scrape_data, generate_file
-    data = scrape_data(url, selector)
-    file_content = generate_file(data, format)
-    # Store file_content in Redis or file system
-    # Simplified: save to temp
-    with open(f"temp/{job_id}.{format}", 'wb') as f:
-        f.write(file_content)
+celery_app = Celery(
+    'tasks',
+    broker=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+)
+# Run tasks inline (no broker/worker) for local development and tests
+celery_app.conf.task_always_eager = os.getenv('CELERY_TASK_ALWAYS_EAGER', '').lower() in {'1', 'true', 'yes'}
+celery_app.conf.task_ignore_result = True
+
+
+def incremental_summary(stats):
+    # Only incremental scrapes (iter_changes) record change counts
+    if 'pages_unchanged' not in stats and not any(k.startswith('rows_') for k in stats):
+        return {}
+    return {
+        'changes': {c: stats.get(f'rows_{c}', 0) for c in ('added', 'removed', 'changed')},
+        'unchanged_pages': stats.get('pages_unchanged', 0),
+    }
+
+
+def memory_summary(stats):
+    # Only normalized scrapes measure their frames
+    if 'memory_bytes' not in stats:
+        return {}
+    return {'memory': {'raw_bytes': stats['memory_raw_bytes'], 'normalized_bytes': stats['memory_bytes']}}
+
+
+def run_export_job(job_id, make_pages, merge, format, export_options=None):
+    """Write the export of `make_pages(stats)` to the job's result file and
+    record the outcome; `merge` combines pages for non-streamed formats."""
+    from .store import get_result_store
+    from .utils import STREAM_FORMATS, export_extension, generate_file, iter_file
+
+    jobs.update_job(job_id, status=jobs.RUNNING, started_at=time.time())
+    try:
+        stats = {}
+        pages = make_pages(stats)
+        if format in STREAM_FORMATS:
+            file_content = iter_file(pages, format, stats)
+        else:
+            data = merge(pages)
+            with metrics.span('export', stats, metrics.EXPORT_SECONDS, format=format):
+                file_content = generate_file(data, format, **(export_options or {}))
+        artifact = export_extension(format, (export_options or {}).get('partition', False))
+        stored = get_result_store().put(job_id, file_content, artifact)
+    except Exception as e:
+        jobs.update_job(job_id, status=jobs.FAILED, error=str(e))
+        raise
+    jobs.update_job(
+        job_id,
+        status=jobs.COMPLETED,
+        format=format,
+        artifact=artifact,
+        size=stored['size'],
+        stored_size=stored['stored_size'],
+        digest=stored['digest'],
+        pages=stats.get('pages', 0),
+        rows=stats.get('rows', 0),
+        truncated_pages=stats.get('truncated', 0),
+        errors=stats.get('errors', 0),
+        cache={k: v for k, v in stats.items() if k.startswith('cache_')},
+        timings=metrics.timings(stats),
+        **incremental_summary(stats),
+        **memory_summary(stats),
+    )
     return job_id
+
+
+@celery_app.task
+def scrape_task(job_id, url, selector, format, options=None, export_options=None):
+    from .utils import iter_pages, merge_pages
+
+    def report(done, total):
+        jobs.update_job(job_id, pages_done=done, pages_total=total)
+
+    def make_pages(stats):
+        return iter_pages(url, selector, progress=report, stats=stats, **(options or {}))
+
+    return run_export_job(job_id, make_pages, merge_pages, format, export_options)
+
+
+@celery_app.task
+def changes_task(job_id, url, selector, format, options=None, export_options=None, changes=None):
+    from .incremental import iter_changes
+    from .utils import merge_pages
+
+    def report(done, total):
+        jobs.update_job(job_id, pages_done=done, pages_total=total)
+
+    def make_pages(stats):
+        return iter_changes(url, selector, progress=report, stats=stats, **(changes or {}), **(options or {}))
+
+    return run_export_job(job_id, make_pages, merge_pages, format, export_options)
+
+
+@celery_app.task
+def batch_task(job_id, urls, selector, format, options=None, export_options=None):
+    from .utils import batch_pages, iter_batch, merge_batch
+
+    def report(done, total):
+        jobs.update_job(job_id, urls_done=done, urls_total=total)
+
+    def make_pages(stats):
+        return batch_pages(iter_batch(urls, selector, progress=report, stats=stats, **(options or {})))
+
+    return run_export_job(job_id, make_pages, merge_batch, format, export_options)
+
+
+@celery_app.task
+def crawl_task(job_id, url, selector, format, options=None, export_options=None):
+    from .crawler import iter_crawl
+    from .utils import merge_pages
+
+    def report(done, total):
+        jobs.update_job(job_id, pages_done=done, pages_total=total)
+
+    def make_pages(stats):
+        return iter_crawl(url, selector, progress=report, stats=stats, **(options or {}))
+
+    return run_export_job(job_id, make_pages, merge_pages, format, export_options)
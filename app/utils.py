@@ -1,307 +1,786 @@
-import requests
-from bs4 import BeautifulSoup
+import numpy as np
 import pandas as pd
 import io
-from typing import Dict, List, Tuple, Union, Optional
-from urllib.parse import urljoin
+import math
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union, Optional, TypeVar
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+import threading
+import time
 import os
+import pickle
+import re
+import tempfile
+import zipfile
 
-def scrape_data(
+from . import browser, fetcher, metrics
+from . import cache as response_cache
+from .extract import MAX_ELEMENTS, ParsedPage, stream_extract
+from .formats import COLUMNAR_COMPRESSION, STREAM_FORMATS, export_extension
+from .normalize import concat_frames, normalize_data
+from .plans import PlanSpec, resolve_plan
+
+# Defaults for concurrent query-param pagination
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PER_HOST = 4
+# URLs scraped in parallel by batch scrapes
+DEFAULT_BATCH_CONCURRENCY = 8
+# Fixed so a datetime column reads the same whichever page (or chunk) it is written from
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Guards `stats` dicts, which concurrent batch scrapes and crawls share
+_stats_lock = threading.Lock()
+
+
+def add_stat(stats: Optional[Dict[str, float]], key: str, amount: float = 1) -> None:
+    """Add `amount` to stats[key] (no-op without a stats dict)."""
+    if stats is not None:
+        with _stats_lock:
+            stats[key] = stats.get(key, 0) + amount
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class ScrapeCancelled(Exception):
+    """Raised inside a scrape once its `cancel` event is set."""
+
+    def __init__(self):
+        super().__init__("Scrape cancelled")
+
+
+def check_cancel(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise ScrapeCancelled()
+
+
+class HostRateLimiter:
+    """Per-host politeness shared by concurrent fetches.
+
+    Caps the number of in-flight requests per host and spaces request starts
+    to the same host at least `delay_ms` apart (or a per-host delay set with
+    `set_delay`, e.g. a robots.txt Crawl-delay).
+    """
+
+    def __init__(self, per_host: int = DEFAULT_PER_HOST, delay_ms: Optional[int] = None):
+        self.per_host = max(1, int(per_host))
+        self.interval = max(0, delay_ms or 0) / 1000.0
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+
+    def set_delay(self, url: str, seconds: float) -> None:
+        """Space requests to `url`'s host at least `seconds` apart (never less than delay_ms)."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            self._intervals[host] = max(self.interval, seconds)
+
+    @contextmanager
+    def limit(self, url: str, cancel: Optional[threading.Event] = None):
+        # `cancel` cuts a politeness wait short (raising ScrapeCancelled)
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            interval = self._intervals.get(host, self.interval)
+        slot.acquire()
+        try:
+            if interval:
+                # Reserve the next start time for this host, then sleep outside the lock
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_start.get(host, now))
+                    self._next_start[host] = start + interval
+                if start > now:
+                    if cancel is None:
+                        time.sleep(start - now)
+                    elif cancel.wait(start - now):
+                        raise ScrapeCancelled()
+            yield
+        finally:
+            slot.release()
+
+
+def ordered_map(fn: Callable[[T], R], items: Iterable[T], max_workers: int) -> Iterator[R]:
+    """Yield fn(item) in input order with at most `max_workers` calls in flight."""
+    if max_workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    source = iter(items)
+    pending: deque = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for item in source:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= max_workers:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                for item in source:
+                    pending.append(pool.submit(fn, item))
+                    break
+                yield result
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+def iter_pages(
     url: str,
     selector: Optional[str] = None,
     *,
     dynamic: bool = False,
     wait_selector: Optional[str] = None,
     wait_ms: Optional[int] = None,
+    block_resources: bool = False,
     page_param: Optional[str] = None,
     page_start: Optional[int] = None,
     page_end: Optional[int] = None,
     next_selector: Optional[str] = None,
     max_pages: Optional[int] = None,
     delay_ms: Optional[int] = None,
-) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
-    """Fetch URL(s) and return structured data.
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    use_cache: bool = True,
+    max_elements: Optional[int] = None,
+    stats: Optional[Dict[str, float]] = None,
+    limiter: Optional[HostRateLimiter] = None,
+    page_hook: Optional[Callable[[ParsedPage], None]] = None,
+    page_filter: Optional[Callable[[Optional[int], str], bool]] = None,
+    cancel: Optional[threading.Event] = None,
+    normalize: bool = False,
+    plan: Optional[PlanSpec] = None,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    parse_workers: Optional[int] = None,
+) -> Iterator[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]]:
+    """Fetch URL(s) and yield (page_number, data) for each page in page order.
+    page_number is None when no pagination is configured.
     Supports:
-      - Dynamic rendering via Playwright when dynamic=True
-      - Pagination via query param (page_param, page_start..page_end)
+      - Dynamic rendering via a pooled Playwright browser when dynamic=True,
+        optionally blocking images/fonts/media (block_resources=True)
+      - Pagination via query param (page_param, page_start..page_end), fetched
+        with up to `concurrency` pages in flight and `per_host` per host
       - Pagination via next link CSS (next_selector, max_pages)
-    Returns dict of DataFrames for multiple tables, or a single DataFrame otherwise.
+    `delay_ms` spaces request starts to the same host.
+    `progress(pages_done, pages_total)` is called after each page; the total
+    is None when it is not known up front (next-link pagination).
+    Fetches go through the response cache unless use_cache=False; when a
+    `stats` dict is given, per-status counters (`cache_hit`, `cache_miss`, ...),
+    `pages`, `rows` and stage timings (`time_fetch`, `time_parse`, ...; see
+    app/metrics.py) are accumulated into it.
+    Pages without tables or selector matches fall back to at most
+    `max_elements` content elements (default 1000, 0 for no cap); pages that
+    hit the cap are counted in stats['truncated'].
+    A shared `limiter` (batch scrapes, crawls) replaces the per-call one built
+    from `per_host` and `delay_ms`. `page_hook` is called with every parsed
+    page, e.g. to collect links from the same tree. `page_filter(page_number,
+    html)` is called before a page is parsed; pages it rejects are not
+    extracted and yield an empty dict (next-link pages are still parsed to
+    find the next link).
+    Setting `cancel` stops the scrape before its next fetch (or during a
+    delay_ms wait) with ScrapeCancelled.
+    With normalize=True each page's frames get compact dtypes (numbers with
+    footnotes stripped, dates, categoricals; see app/normalize.py) and the
+    memory they held before/after is added to stats['memory_raw_bytes'] /
+    stats['memory_bytes'].
+    A `plan` (registered name, {"selector", "fields"} spec or ExtractionPlan;
+    see app/plans.py) replaces `selector` and the table/row extraction with
+    one row per record holding the plan's fields.
+    `max_rows` (positive) caps the rows read per page (see
+    ParsedPage.extract_limited).
+    Static single and query-param pages are then parsed while they download
+    and the download stops as soon as the rows are known (counted in
+    stats['pages_stopped_early']); pages cut short are not cached. Static
+    downloads over `max_bytes` (default SCRAPER_MAX_BYTES) or with a binary
+    Content-Type fail with fetcher.ResponseRejected.
+    With `parse_workers` (default SCRAPER_PARSE_WORKERS) pages are parsed in
+    a shared pool of that many processes (see app/parsepool.py) while
+    fetching goes on: up to `parse_workers` pages parse ahead of the one being
+    yielded, and fetches wait while the pool's queue is full. Next-link pages
+    are parsed once, in the pool, which also finds the next link; their
+    fetches wait for it, so they gain from the pool when several scrapes
+    (e.g. a batch) run at once. Pages passed to
+    `page_hook` and pages streamed for `max_rows` are parsed in-thread.
+    Each page's data is a dict of DataFrames for tables, or a single DataFrame.
     """
+    if max_rows is not None and max_rows <= 0:
+        raise ValueError("max_rows must be a positive number of rows")
+    compiled_plan = resolve_plan(plan) if plan is not None else None
+    limiter = limiter or HostRateLimiter(per_host or DEFAULT_PER_HOST, delay_ms)
+    stats_lock = _stats_lock
+
+    counts = {'pages': 0, 'rows': 0, 'truncated': 0}
+    element_cap = MAX_ELEMENTS if max_elements is None else max_elements
+
+    def record(cache_status: str) -> None:
+        metrics.CACHE_REQUESTS.inc(status=cache_status.lower())
+        if stats is not None:
+            key = f"cache_{cache_status.lower()}"
+            with stats_lock:
+                stats[key] = stats.get(key, 0) + 1
+
+    def render_dynamic(target_url: str) -> Tuple[str, str]:
+        # Rendered pages carry no validators, so they are only reused while fresh
+        check_cancel(cancel)
+        cache = response_cache.get_cache() if use_cache else None
+        mode = f"dynamic:{wait_selector or ''}:{wait_ms or 0}:{int(block_resources)}"
+        key = cache.key(target_url, mode) if cache else None
+        if cache and cache.ttl > 0:
+            entry = cache.get(key)
+            if entry is not None and cache.is_fresh(entry):
+                record(fetcher.HIT)
+                return entry.text, entry.url
+        with limiter.limit(target_url, cancel), metrics.span('render', stats, metrics.FETCH_SECONDS, mode='dynamic'):
+            content, final_url = browser.get_pool().render(
+                target_url,
+                wait_selector=wait_selector,
+                wait_ms=wait_ms,
+                block_resources=block_resources,
+            )
+        body = content.encode('utf-8')
+        metrics.FETCH_BYTES.observe(len(body), mode='dynamic')
+        if cache and cache.ttl > 0:
+            cache.put(key, body, final_url=final_url, encoding='utf-8')
+            record(fetcher.MISS)
+        else:
+            record(fetcher.BYPASS)
+        return content, final_url
 
     def fetch_html(target_url: str) -> Tuple[str, str]:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"
-        }
         # Disable dynamic on Vercel serverless (no browser runtime)
         dynamic_allowed = dynamic and not os.getenv("VERCEL")
         if dynamic_allowed:
             try:
-                from playwright.sync_api import sync_playwright
-                with sync_playwright() as p:
-                    browser = p.chromium.launch(headless=True)
-                    context = browser.new_context()
-                    page = context.new_page()
-                    page.goto(target_url, wait_until="domcontentloaded", timeout=30000)
-                    if wait_selector:
-                        try:
-                            page.wait_for_selector(wait_selector, timeout=(wait_ms or 3000))
-                        except Exception:
-                            pass
-                    elif wait_ms:
-                        page.wait_for_timeout(wait_ms)
-                    content = page.content()
-                    final_url = page.url
-                    context.close()
-                    browser.close()
-                    return content, final_url
+                return render_dynamic(target_url)
+            except ScrapeCancelled:
+                raise
             except Exception:
                 # Fallback to static fetch
                 pass
-        resp = requests.get(target_url, timeout=20, headers=headers)
-        resp.raise_for_status()
-        return resp.text, resp.url
+        check_cancel(cancel)
+        with limiter.limit(target_url, cancel), metrics.span('fetch', stats, metrics.FETCH_SECONDS, mode='static'):
+            text, final_url, cache_status = fetcher.fetch_text(target_url, use_cache=use_cache, max_bytes=max_bytes)
+        record(cache_status)
+        return text, final_url
+
+    def extract(page: ParsedPage) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        if compiled_plan is not None:
+            return compiled_plan.extract(page, max_rows)
+        return page.extract(selector, element_cap, max_rows)
+
+    def extract_partial(page: ParsedPage, open_elements):
+        if compiled_plan is not None:
+            return compiled_plan.extract_limited(page, max_rows, open_elements)
+        return page.extract_limited(selector, max_rows, element_cap, open_elements)
+
+    # Parse while downloading when a row limit may make the rest of the page
+    # unnecessary; hooks and filters need the whole page
+    streamed = (max_rows is not None and page_hook is None and page_filter is None
+                and not (dynamic and not os.getenv("VERCEL")))
+
+    # Hooks need the parsed tree in this process; the pool is acquired inside
+    # the try below so finish() always releases it
+    pool, ahead = None, 0
+    plan_spec = compiled_plan.spec() if compiled_plan is not None else None
+
+    def stream_page(target_url: str) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        check_cancel(cancel)
+        parsing = metrics.Stopwatch()
+        with limiter.limit(target_url, cancel):
+            started = time.perf_counter()
+            chunks, final_url, cache_status = fetcher.stream_text(target_url, use_cache=use_cache, max_bytes=max_bytes)
+            page, data, stopped = stream_extract(chunks, final_url, extract_partial, lambda: parsing)
+            elapsed = time.perf_counter() - started
+        record(cache_status)
+        metrics.record('fetch', elapsed - parsing.elapsed, stats, metrics.FETCH_SECONDS, mode='static')
+        metrics.record('parse', parsing.elapsed, stats)
+        if stopped:
+            add_stat(stats, 'pages_stopped_early')
+        if page.truncated:
+            with stats_lock:
+                counts['truncated'] += 1
+        return compact(data)
+
+    def compact(data: Union[pd.DataFrame, Dict[str, pd.DataFrame]]) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        if not normalize:
+            return data
+        with metrics.span('normalize', stats):
+            data, before, after = normalize_data(data)
+        add_stat(stats, 'memory_raw_bytes', before)
+        add_stat(stats, 'memory_bytes', after)
+        return data
 
     def parse_html(html: str, base_url: str) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
-        soup = BeautifulSoup(html, 'lxml')
-        
-        def parse_tables_from(tags: List) -> List[pd.DataFrame]:
-            dfs: List[pd.DataFrame] = []
-            for t in tags:
-                try:
-                    sub = pd.read_html(str(t))
-                    for d in sub:
-                        d.columns = [str(c).strip() for c in d.columns]
-                        dfs.append(d)
-                except ValueError:
-                    continue
-            return dfs
-
-        if selector:
-            selected = soup.select(selector)
-            if selected:
-                tables = [el for el in selected if el.name == 'table' or el.find('table')]
-                if tables:
-                    dfs = parse_tables_from(tables)
-                    if dfs:
-                        return {f"table_{i+1}": df for i, df in enumerate(dfs)}
-                rows = []
-                for el in selected:
-                    tag = el.name
-                    text = el.get_text(" ", strip=True)
-                    raw_href = el.get('href')
-                    raw_src = el.get('src')
-                    href = urljoin(base_url, raw_href) if raw_href else None
-                    src = urljoin(base_url, raw_src) if raw_src else None
-                    title = el.get('title')
-                    aria = el.get('aria-label')
-                    classes = " ".join(el.get('class', [])) if el.has_attr('class') else None
-                    if any([text, href, src, title, aria, classes]):
-                        rows.append({
-                            'tag': tag,
-                            'text': text,
-                            'href': href,
-                            'src': src,
-                            'title': title,
-                            'aria_label': aria,
-                            'classes': classes,
-                        })
-                df = pd.DataFrame(rows)
-                if df.empty:
-                    df = pd.DataFrame([{"message": "No content matched the selector."}])
-                return df
-
-        page_tables = soup.find_all('table')
-        dfs = parse_tables_from(page_tables)
-        if dfs:
-            return {f"table_{i+1}": df for i, df in enumerate(dfs)}
-
-        candidates = soup.select('article, main, section, h1, h2, h3, h4, p, li, a')
-        rows = []
-        for el in candidates[:1000]:
-            tag = el.name
-            text = el.get_text(" ", strip=True)
-            raw_href = el.get('href')
-            raw_src = el.get('src')
-            href = urljoin(base_url, raw_href) if raw_href else None
-            src = urljoin(base_url, raw_src) if raw_src else None
-            title = el.get('title')
-            aria = el.get('aria-label')
-            classes = " ".join(el.get('class', [])) if el.has_attr('class') else None
-            if any([text, href, src, title, aria, classes]):
-                rows.append({
-                    'tag': tag,
-                    'text': text,
-                    'href': href,
-                    'src': src,
-                    'title': title,
-                    'aria_label': aria,
-                    'classes': classes,
-                })
-        df = pd.DataFrame(rows)
-        if df.empty:
-            body_text = soup.get_text(" ", strip=True)
-            df = pd.DataFrame({'text': [body_text]})
-        return df
+        with metrics.span('parse', stats):
+            page = ParsedPage(html, base_url)
+            data = extract(page)
+            if page_hook:
+                page_hook(page)
+        if page.truncated:
+            with stats_lock:
+                counts['truncated'] += 1
+        return compact(data)
+
+    def submit_parse(html: str, base_url: str, wanted: bool = True) -> Future:
+        return pool.submit(html, base_url, selector, plan_spec, element_cap, max_rows, normalize,
+                           next_selector, wanted)
+
+    def parsed(item) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        # Pages parsed in the pool report their stage timings with the result
+        if not isinstance(item, Future):
+            return item
+        data, truncated, parse_seconds, normalized, _ = item.result()
+        metrics.record('parse', parse_seconds, stats)
+        if normalized is not None:
+            seconds, before, after = normalized
+            metrics.record('normalize', seconds, stats)
+            add_stat(stats, 'memory_raw_bytes', before)
+            add_stat(stats, 'memory_bytes', after)
+        if truncated:
+            with stats_lock:
+                counts['truncated'] += 1
+        return data
+
+    def in_order(items: Iterable[Tuple[Optional[int], object]]) -> Iterator[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]]:
+        # Keep up to `ahead` pages parsing in the pool behind the page being yielded
+        window: deque = deque()
+        try:
+            for item in items:
+                window.append(item)
+                if len(window) > ahead:
+                    p, data = window.popleft()
+                    yield p, parsed(data)
+            while window:
+                p, data = window.popleft()
+                yield p, parsed(data)
+        finally:
+            for _, data in window:
+                if isinstance(data, Future):
+                    data.cancel()
+
+    def emit(p: Optional[int], data: Union[pd.DataFrame, Dict[str, pd.DataFrame]]):
+        counts['pages'] += 1
+        counts['rows'] += sum(len(df) for df in data.values()) if isinstance(data, dict) else len(data)
+        return p, data
+
+    def finish() -> None:
+        # Runs however the consumer stops (exhausted, closed early or failed)
+        if pool is not None:
+            release_parse_pool(pool)
+        metrics.JOB_PAGES.observe(counts['pages'])
+        metrics.JOB_ROWS.observe(counts['rows'])
+        if stats is not None:
+            with stats_lock:
+                stats['pages'] = stats.get('pages', 0) + counts['pages']
+                stats['rows'] = stats.get('rows', 0) + counts['rows']
+                if counts['truncated']:
+                    stats['truncated'] = stats.get('truncated', 0) + counts['truncated']
 
     # Single page helper
-    def scrape_single(target_url: str) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    def scrape_single(target_url: str, p: Optional[int] = None) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        if streamed:
+            return stream_page(target_url)
         html, final = fetch_html(target_url)
+        if page_filter and not page_filter(p, html):
+            return {}
+        if pool is not None:
+            return submit_parse(html, final)
         return parse_html(html, final)
 
-    # Pagination strategy 1: query param iteration
-    if page_param and page_start is not None and page_end is not None:
-        all_tables: Dict[str, pd.DataFrame] = {}
-        all_rows: List[pd.DataFrame] = []
-        for p in range(page_start, page_end + 1):
+    try:
+        if page_hook is None and not streamed:
+            from .parsepool import acquire_parse_pool, default_workers, release_parse_pool
+            ahead = default_workers() if parse_workers is None else parse_workers
+            pool = acquire_parse_pool(ahead)
+            if pool is None:
+                ahead = 0
+
+        # Pagination strategy 1: query param iteration
+        if page_param and page_start is not None and page_end is not None:
             connector = '&' if ('?' in url) else '?'
-            page_url = f"{url}{connector}{page_param}={p}"
-            data = scrape_single(page_url)
-            if isinstance(data, dict):
-                for name, df in data.items():
-                    all_tables[f"p{p}_{name}"] = df
-            else:
-                d = data.copy()
-                d.insert(0, 'page', p)
-                all_rows.append(d)
-            if delay_ms:
-                try:
-                    import time
-                    time.sleep(delay_ms / 1000.0)
-                except Exception:
-                    pass
-        if all_tables:
-            return all_tables
-        return pd.concat(all_rows, ignore_index=True) if all_rows else pd.DataFrame([{"message": "No data"}])
-
-    # Pagination strategy 2: next link selector
-    if next_selector:
-        visited = set()
-        current_url = url
-        count = 0
-        all_tables: Dict[str, pd.DataFrame] = {}
-        all_rows: List[pd.DataFrame] = []
-        while current_url and (max_pages is None or count < max_pages):
-            count += 1
-            html, final = fetch_html(current_url)
-            visited.add(final)
-            parsed = parse_html(html, final)
-            if isinstance(parsed, dict):
-                for name, df in parsed.items():
-                    all_tables[f"p{count}_{name}"] = df
-            else:
-                d = parsed.copy()
-                d.insert(0, 'page', count)
-                all_rows.append(d)
-            # find next
-            soup = BeautifulSoup(html, 'lxml')
-            nxt = soup.select_one(next_selector)
-            href = nxt.get('href') if nxt else None
-            nxt_url = urljoin(final, href) if href else None
-            if not nxt_url or nxt_url in visited:
-                break
-            current_url = nxt_url
-            if delay_ms:
-                try:
-                    import time
-                    time.sleep(delay_ms / 1000.0)
-                except Exception:
-                    pass
-        if all_tables:
-            return all_tables
-        return pd.concat(all_rows, ignore_index=True) if all_rows else pd.DataFrame([{"message": "No data"}])
-
-    # Default: single page
-    return scrape_single(url)
-
-    # Helper to parse tables from a list of tags
-    def parse_tables_from(tags: List) -> List[pd.DataFrame]:
-        dfs: List[pd.DataFrame] = []
-        for t in tags:
-            try:
-                sub = pd.read_html(str(t))
-                for i, d in enumerate(sub):
-                    # Normalize headers: if unnamed columns, keep as is; strip whitespace
-                    d.columns = [str(c).strip() for c in d.columns]
-                    dfs.append(d)
-            except ValueError:
-                # No tables parsed from this element
-                continue
-        return dfs
-
-    # 1) If selector provided and targets tables, prioritize that
-    if selector:
-        selected = soup.select(selector)
-        if selected:
-            tables = [el for el in selected if el.name == 'table' or el.find('table')]
-            if tables:
-                dfs = parse_tables_from(tables)
-                if dfs:
-                    return {f"table_{i+1}": df for i, df in enumerate(dfs)}
-            # Non-table elements: build structured rows
-            rows = []
-            for el in selected:
-                tag = el.name
-                text = el.get_text(" ", strip=True)
-                raw_href = el.get('href')
-                raw_src = el.get('src')
-                href = urljoin(base_url, raw_href) if raw_href else None
-                src = urljoin(base_url, raw_src) if raw_src else None
-                title = el.get('title')
-                aria = el.get('aria-label')
-                classes = " ".join(el.get('class', [])) if el.has_attr('class') else None
-                if any([text, href, src, title, aria, classes]):
-                    rows.append({
-                        'tag': tag,
-                        'text': text,
-                        'href': href,
-                        'src': src,
-                        'title': title,
-                        'aria_label': aria,
-                        'classes': classes,
-                    })
-            df = pd.DataFrame(rows)
-            if df.empty:
-                df = pd.DataFrame([{"message": "No content matched the selector."}])
-            return df
-
-    # 2) No selector or selector yielded no tables: try all tables on the page
-    page_tables = soup.find_all('table')
-    dfs = parse_tables_from(page_tables)
-    if dfs:
-        return {f"table_{i+1}": df for i, df in enumerate(dfs)}
-
-    # 3) Fallback: collect common content elements
-    candidates = soup.select('article, main, section, h1, h2, h3, h4, p, li, a')
-    rows = []
-    for el in candidates[:1000]:  # cap to avoid huge outputs
-        tag = el.name
-        text = el.get_text(" ", strip=True)
-        raw_href = el.get('href')
-        raw_src = el.get('src')
-        href = urljoin(base_url, raw_href) if raw_href else None
-        src = urljoin(base_url, raw_src) if raw_src else None
-        title = el.get('title')
-        aria = el.get('aria-label')
-        classes = " ".join(el.get('class', [])) if el.has_attr('class') else None
-        # Skip empty rows
-        if any([text, href, src, title, aria, classes]):
-            rows.append({
-                'tag': tag,
-                'text': text,
-                'href': href,
-                'src': src,
-                'title': title,
-                'aria_label': aria,
-                'classes': classes,
-            })
-    df = pd.DataFrame(rows)
-    if df.empty:
-        # As a last resort, dump full text
-        body_text = soup.get_text(" ", strip=True)
-        df = pd.DataFrame({'text': [body_text]})
-    return df
-
-def generate_file(data: Union[pd.DataFrame, Dict[str, pd.DataFrame], List[pd.DataFrame]], format: str) -> bytes:
+            pages = range(page_start, page_end + 1)
+            workers = max(1, concurrency or DEFAULT_CONCURRENCY)
+            # Pages are fetched concurrently but yielded strictly in page order
+            results = ordered_map(
+                lambda p: scrape_single(f"{url}{connector}{page_param}={p}", p),
+                pages,
+                min(workers, len(pages)),
+            )
+            for done, (p, data) in enumerate(in_order(zip(pages, results)), start=1):
+                if progress:
+                    progress(done, len(pages))
+                yield emit(p, data)
+            return
+
+        # Pagination strategy 2: next link selector
+        if next_selector:
+            def follow() -> Iterator[Tuple[int, object]]:
+                visited = set()
+                current_url = url
+                count = 0
+                while current_url and (max_pages is None or count < max_pages):
+                    count += 1
+                    html, final = fetch_html(current_url)
+                    visited.add(final)
+                    wanted = page_filter is None or page_filter(count, html)
+                    if pool is not None:
+                        # The worker reads the next link too, so the next fetch waits for it
+                        data = submit_parse(html, final, wanted)
+                        nxt_url = data.result()[4]
+                    else:
+                        # One tree per page drives both extraction and next-link discovery
+                        with metrics.span('parse', stats):
+                            page = ParsedPage(html, final)
+                            data = extract(page) if wanted else {}
+                            nxt_url = page.next_url(next_selector)
+                            if page_hook:
+                                page_hook(page)
+                        counts['truncated'] += page.truncated
+                        del page
+                        data = compact(data)
+                    yield count, data
+                    if not nxt_url or nxt_url in visited:
+                        break
+                    current_url = nxt_url
+
+            for p, data in in_order(follow()):
+                if progress:
+                    progress(p, None)
+                yield emit(p, data)
+            return
+
+        # Default: single page
+        data = parsed(scrape_single(url))
+        if progress:
+            progress(1, 1)
+        yield emit(None, data)
+    finally:
+        finish()
+
+def merge_pages(
+    pages: Iterable[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]],
+) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """Combine iter_pages output: tables keyed p{n}_table_k, or rows with a page column."""
+    all_tables: Dict[str, pd.DataFrame] = {}
+    all_rows: List[pd.DataFrame] = []
+    for p, data in pages:
+        if p is None:
+            return data
+        if isinstance(data, dict):
+            for name, df in data.items():
+                all_tables[f"p{p}_{name}"] = df
+        else:
+            # Pages are fresh frames owned by the caller: label them in place
+            data.insert(0, 'page', p)
+            all_rows.append(data)
+    if all_tables:
+        return all_tables
+    return concat_frames(all_rows) if all_rows else pd.DataFrame([{"message": "No data"}])
+
+
+def scrape_data(
+    url: str,
+    selector: Optional[str] = None,
+    *,
+    plan: Optional[PlanSpec] = None,
+    **options,
+) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """Fetch URL(s) and return structured data (see iter_pages for options).
+    Returns dict of DataFrames for multiple tables, or a single DataFrame otherwise;
+    with an extraction `plan` (e.g. a registered plan name), one row per record.
+    """
+    return merge_pages(iter_pages(url, selector, plan=plan, **options))
+
+
+BatchResult = Tuple[int, str, Optional[Union[pd.DataFrame, Dict[str, pd.DataFrame]]], Optional[str]]
+
+
+def iter_batch(
+    urls: Iterable[str],
+    selector: Optional[str] = None,
+    *,
+    url_concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    delay_ms: Optional[int] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    **options,
+) -> Iterator[BatchResult]:
+    """Scrape many URLs with the same options (see iter_pages) and yield
+    (index, url, data, error) in input order, index starting at 1.
+
+    Up to `url_concurrency` URLs run at once; `per_host` and `delay_ms` are
+    enforced across the whole batch by one shared HostRateLimiter. A failing
+    URL yields its error message (data None) instead of failing the batch and
+    is counted in stats['errors'].
+    `progress(urls_done, urls_total)` is called after each URL.
+    """
+    items = list(enumerate(urls, start=1))
+    limiter = HostRateLimiter(per_host or DEFAULT_PER_HOST, delay_ms)
+    stats = options.get('stats')
+
+    def failed(index: int, url: str, error: str) -> BatchResult:
+        add_stat(stats, 'errors')
+        return index, url, None, error
+
+    def run(item: Tuple[int, str]) -> BatchResult:
+        index, url = item
+        if not (url.startswith("http://") or url.startswith("https://")):
+            return failed(index, url, "Invalid URL. Only http/https allowed.")
+        try:
+            return index, url, merge_pages(iter_pages(url, selector, limiter=limiter, **options)), None
+        except ScrapeCancelled:
+            raise
+        except Exception as e:
+            return failed(index, url, str(e) or type(e).__name__)
+
+    workers = max(1, url_concurrency or DEFAULT_BATCH_CONCURRENCY)
+    for done, result in enumerate(ordered_map(run, items, min(workers, len(items))), start=1):
+        if progress:
+            progress(done, len(items))
+        yield result
+
+
+def batch_pages(results: Iterable[BatchResult]) -> Iterator[Tuple[None, Dict[str, pd.DataFrame]]]:
+    """Turn iter_batch results into iter_pages-style items for merge_batch/iter_file.
+
+    Each URL's frames get a leading `source_url` column and are keyed
+    u{index}_{name} (`u3_table_1`, `u3_p2_table_1`, or `u3_rows` for row
+    data); failed URLs are collected into a final `errors` table.
+    """
+    errors = []
+    for index, url, data, error in results:
+        if error is not None:
+            errors.append({'source_url': url, 'error': error})
+            continue
+        frames = data.items() if isinstance(data, dict) else [('rows', data)]
+        labelled = {}
+        for name, df in frames:
+            df.insert(0, 'source_url', url)
+            labelled[f"u{index}_{name}"] = df
+        yield None, labelled
+    if errors:
+        yield None, {'errors': pd.DataFrame(errors)}
+
+
+def merge_batch(pages: Iterable[Tuple[None, Dict[str, pd.DataFrame]]]) -> Dict[str, pd.DataFrame]:
+    """Combine batch_pages output into one dict of frames."""
+    combined: Dict[str, pd.DataFrame] = {}
+    for _, frames in pages:
+        combined.update(frames)
+    return combined
+
+
+def scrape_batch(urls: Iterable[str], selector: Optional[str] = None, **options) -> Dict[str, pd.DataFrame]:
+    """Scrape every URL (see iter_batch) into one dict of frames keyed by source."""
+    return merge_batch(batch_pages(iter_batch(urls, selector, **options)))
+
+
+def infer_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Give object columns a single concrete type so columnar writers keep
+    numbers numeric: numeric-looking columns become numbers, mixed columns
+    become strings (nulls preserved)."""
+    out = df.copy(deep=False)
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        series = out[col]
+        if series.dtype != object:
+            continue
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind in ('string', 'boolean', 'empty', 'bytes'):
+            continue
+        if kind in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            out[col] = pd.to_numeric(series)
+            continue
+        try:
+            out[col] = pd.to_numeric(series)
+        except (ValueError, TypeError):
+            out[col] = series.where(series.isna(), series.astype(str))
+    return out
+
+
+def _columnar_bytes(df: pd.DataFrame, fmt: str, compression: str) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError(f"{fmt} output requires pyarrow (pip install pyarrow)")
+    table = pa.Table.from_pandas(infer_dtypes(df), preserve_index=False)
+    codec = None if compression == 'none' else compression
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, buffer, compression=codec or 'none')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, buffer, compression=codec or 'uncompressed')
+    return buffer.getvalue()
+
+
+# Excel sheet names: at most 31 chars, none of []:*?/\, unique ignoring case
+_SHEET_NAME_MAX = 31
+_SHEET_NAME_INVALID = re.compile(r"[\[\]:*?/\\]")
+# Control characters that are not allowed in worksheet XML
+_XLSX_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+XLSX_CHUNK_ROWS = 10000
+# Rows per worksheet, header included (xlsxwriter silently drops the rest)
+XLSX_MAX_ROWS = 1048576
+
+
+def sheet_names(names: Iterable[str]) -> List[str]:
+    """Valid, unique Excel sheet names for `names`, in order.
+
+    Collisions after truncation get a `~2`, `~3`, ... suffix instead of
+    silently overwriting the earlier sheet.
+    """
+    result: List[str] = []
+    seen = set()
+    for name in names:
+        base = _SHEET_NAME_INVALID.sub('_', str(name or '')).strip("'") or 'Sheet'
+        candidate = base[:_SHEET_NAME_MAX]
+        n = 1
+        while candidate.lower() in seen:
+            n += 1
+            suffix = f"~{n}"
+            candidate = base[:_SHEET_NAME_MAX - len(suffix)] + suffix
+        seen.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def _xlsx_engine() -> str:
+    # xlsxwriter's constant_memory mode is much faster; openpyxl is the fallback
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return 'openpyxl'
+    return 'xlsxwriter'
+
+
+def _xlsx_rows(df: pd.DataFrame) -> Iterator[list]:
+    """Header then data rows as plain Python values (None for missing),
+    converted XLSX_CHUNK_ROWS rows at a time."""
+    yield [str(c) for c in df.columns]
+    for start in range(0, len(df), XLSX_CHUNK_ROWS):
+        chunk = df.iloc[start:start + XLSX_CHUNK_ROWS]
+        columns = []
+        for _, col in chunk.items():
+            if isinstance(col.dtype, pd.DatetimeTZDtype):
+                col = col.dt.tz_localize(None)
+            values = col.astype(object)
+            columns.append(values.where(col.notna(), None).tolist())
+        for row in zip(*columns):
+            yield list(row)
+
+
+def _xlsx_value(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        # Excel has no infinity; write it as text like to_excel's inf_rep
+        return 'inf' if value > 0 else '-inf'
+    if isinstance(value, str):
+        return _XLSX_ILLEGAL_CHARS.sub('', value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, pd.Timedelta):
+        return value.to_pytimedelta()
+    return value
+
+
+def _write_xlsx_xlsxwriter(buffer: io.BytesIO, sheets: Dict[str, pd.DataFrame]) -> None:
+    import xlsxwriter
+    # constant_memory flushes each row to disk as soon as the next one starts
+    workbook = xlsxwriter.Workbook(buffer, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    isfinite = math.isfinite
+    try:
+        for name, df in sheets.items():
+            worksheet = workbook.add_worksheet(name)
+            write_string, write_number, write = worksheet.write_string, worksheet.write_number, worksheet.write
+            for r, row in enumerate(_xlsx_rows(df)):
+                for c, value in enumerate(row):
+                    kind = type(value)
+                    if value is None:
+                        continue
+                    elif kind is str:
+                        write_string(r, c, _XLSX_ILLEGAL_CHARS.sub('', value))
+                    elif kind is int or kind is float and isfinite(value):
+                        write_number(r, c, value)
+                    else:
+                        write(r, c, _xlsx_value(value))
+    finally:
+        workbook.close()
+
+
+def _write_xlsx_openpyxl(buffer: io.BytesIO, sheets: Dict[str, pd.DataFrame]) -> None:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    # write_only streams rows into the sheet XML instead of building cell objects
+    workbook = Workbook(write_only=True)
+    for name, df in sheets.items():
+        worksheet = workbook.create_sheet(name)
+        for row in _xlsx_rows(df):
+            values = []
+            for value in row:
+                value = _xlsx_value(value)
+                if isinstance(value, str) and value.startswith('='):
+                    # Keep scraped text as text, never as a formula
+                    cell = WriteOnlyCell(worksheet, value)
+                    cell.data_type = 's'
+                    value = cell
+                values.append(value)
+            worksheet.append(values)
+    workbook.save(buffer)
+
+
+def write_xlsx(sheets: Dict[str, pd.DataFrame], engine: Optional[str] = None) -> bytes:
+    """Write one sheet per frame, streaming rows sheet by sheet.
+
+    Sheet names are sanitized and deduplicated with `sheet_names`; empty frames
+    get a "No data" row. `engine` defaults to xlsxwriter when installed.
+    Frames that do not fit in a worksheet raise ValueError before anything
+    is written.
+    """
+    engine = engine or _xlsx_engine()
+    frames = [df if not df.empty else pd.DataFrame([{"message": "No data"}]) for df in sheets.values()]
+    named = dict(zip(sheet_names(sheets.keys()), frames))
+    if not named:
+        named = {'Sheet1': pd.DataFrame([{"message": "No data"}])}
+    for name, df in named.items():
+        if len(df) + 1 > XLSX_MAX_ROWS:
+            raise ValueError(
+                f"Sheet {name!r} has {len(df)} rows; Excel allows {XLSX_MAX_ROWS - 1} per sheet. "
+                "Use csv, jsonl or parquet for larger tables.")
+    buffer = io.BytesIO()
+    if engine == 'xlsxwriter':
+        _write_xlsx_xlsxwriter(buffer, named)
+    elif engine == 'openpyxl':
+        _write_xlsx_openpyxl(buffer, named)
+    else:
+        raise ValueError(f"Unsupported xlsx engine: {engine}")
+    return buffer.getvalue()
+
+
+def generate_file(
+    data: Union[pd.DataFrame, Dict[str, pd.DataFrame], List[pd.DataFrame]],
+    format: str,
+    *,
+    compression: Optional[str] = None,
+    partition: bool = False,
+) -> bytes:
+    """Serialize scraped data.
+    csv/json/txt (and single-file parquet/arrow) combine multiple tables into one
+    frame with a `table` column; xlsx writes one sheet per table. With
+    partition=True, parquet/arrow produce a zip holding one file per table
+    (`table=<name>/part-0.parquet` or `<name>.arrow`).
+    """
     fmt = format.lower().strip()
 
     # Normalize input into a dict for multi-table handling where applicable
@@ -312,28 +791,30 @@ def generate_file(data: Union[pd.DataFrame, Dict[str, pd.DataFrame], List[pd.Dat
         sheets = {f"sheet_{i+1}": d for i, d in enumerate(data)}
 
     if fmt == 'xlsx':
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            if sheets:
-                for name, df in sheets.items():
-                    safe = (name or 'Sheet')[:31]
-                    to_write = df if not df.empty else pd.DataFrame([{"message": "No data"}])
-                    to_write.to_excel(writer, index=False, sheet_name=safe)
-            else:
-                df = data  # type: ignore
-                to_write = df if not getattr(df, 'empty', True) else pd.DataFrame([{"message": "No data"}])
-                to_write.to_excel(writer, index=False, sheet_name='Sheet1')
-        buffer.seek(0)
-        return buffer.getvalue()
+        if sheets:
+            return write_xlsx(sheets)
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame()
+        return write_xlsx({'Sheet1': df})
+
+    if fmt in COLUMNAR_COMPRESSION:
+        codec = (compression or COLUMNAR_COMPRESSION[fmt][0]).lower().strip()
+        if codec not in COLUMNAR_COMPRESSION[fmt]:
+            raise ValueError(f"Unsupported {fmt} compression: {codec}")
+        if partition:
+            parts = sheets if sheets else {'data': data}
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for name, df in parts.items():
+                    member = f"table={name}/part-0.parquet" if fmt == 'parquet' else f"{name}.arrow"
+                    archive.writestr(member, _columnar_bytes(df, fmt, codec))
+            return buffer.getvalue()
 
     # For CSV/JSON/TXT, if multiple sheets, concatenate with a label column
     if sheets:
-        labeled = []
-        for name, df in sheets.items():
-            d = df.copy()
-            d.insert(0, 'table', name)
-            labeled.append(d)
-        payload = pd.concat(labeled, ignore_index=True) if labeled else pd.DataFrame([{"message": "No data"}])
+        # One concat, then the label column, instead of copying every table to label it
+        payload = concat_frames(list(sheets.values()))
+        names = np.repeat(np.array(list(sheets), dtype=object), [len(df) for df in sheets.values()])
+        payload.insert(0, 'table', names)
     else:
         payload = data  # type: ignore
         if getattr(payload, 'empty', True):
@@ -341,14 +822,164 @@ def generate_file(data: Union[pd.DataFrame, Dict[str, pd.DataFrame], List[pd.Dat
 
     if fmt == 'csv':
         buf = io.StringIO()
-        payload.to_csv(buf, index=False)
+        payload.to_csv(buf, index=False, date_format=DATE_FORMAT)
         return buf.getvalue().encode('utf-8')
     if fmt == 'json':
         buf = io.StringIO()
-        payload.to_json(buf, orient='records', force_ascii=False)
+        payload.to_json(buf, orient='records', force_ascii=False, date_format='iso')
         return buf.getvalue().encode('utf-8')
     if fmt == 'txt':
         buf = io.StringIO()
-        payload.to_csv(buf, index=False, sep='\t')
+        payload.to_csv(buf, index=False, sep='\t', date_format=DATE_FORMAT)
         return buf.getvalue().encode('utf-8')
+    if fmt in COLUMNAR_COMPRESSION:
+        return _columnar_bytes(payload, fmt, codec)
     raise ValueError('Unsupported format')
+
+
+def _representative_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """First row plus the first non-null row of every column.
+
+    Concatenating these instead of the full frames yields the same columns and
+    dtypes (pandas' dtype resolution only looks at dtypes, emptiness and
+    all-NA columns), so a spooled export can be aligned exactly like pd.concat.
+    """
+    if len(df) <= 1:
+        return df
+    notna = df.notna().to_numpy()
+    first = notna.argmax(axis=0)[notna.any(axis=0)]
+    return df.iloc[sorted({0, *first.tolist()})]
+
+
+class _FrameSpool:
+    """Pickles frames to a temporary file so only one is held in memory."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.heads: List[pd.DataFrame] = []
+        self.count = 0
+        self.rows = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        pickle.dump(df, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.heads.append(_representative_rows(df))
+        self.count += 1
+        self.rows += len(df)
+
+    def frames(self) -> Iterator[pd.DataFrame]:
+        self.file.seek(0)
+        for _ in range(self.count):
+            yield pickle.load(self.file)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _page_frames(pages: Iterable[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]]) -> Iterator[Tuple[str, pd.DataFrame]]:
+    # Label frames the way merge_pages + generate_file would: a `table` column
+    # for tables, a `page` column for paginated rows
+    for p, data in pages:
+        if isinstance(data, dict):
+            for name, df in data.items():
+                df.insert(0, 'table', f"p{p}_{name}" if p is not None else name)
+                yield 'tables', df
+        else:
+            if p is not None:
+                data.insert(0, 'page', p)
+            yield 'rows', data
+
+
+def _serialize(df: pd.DataFrame, fmt: str, first: bool) -> bytes:
+    if fmt == 'csv':
+        return df.to_csv(index=False, header=first, date_format=DATE_FORMAT).encode('utf-8')
+    if fmt == 'txt':
+        return df.to_csv(index=False, header=first, sep='\t', date_format=DATE_FORMAT).encode('utf-8')
+    if fmt == 'jsonl':
+        return df.to_json(orient='records', lines=True, force_ascii=False, date_format='iso').encode('utf-8') if len(df) else b''
+    # json: emit the records of each chunk inside one top-level array
+    records = df.to_json(orient='records', force_ascii=False, date_format='iso')[1:-1]
+    if not records:
+        return b''
+    return (records if first else ',' + records).encode('utf-8')
+
+
+def iter_file(
+    pages: Iterable[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]],
+    format: str,
+    stats: Optional[Dict[str, float]] = None,
+) -> Iterator[bytes]:
+    """Serialize iter_pages output incrementally.
+
+    jsonl is written page by page as pages arrive, one record per line. csv,
+    txt and json must be byte-identical to generate_file(merge_pages(pages)),
+    whose header and dtypes depend on every page, so pages are spooled to disk
+    and written once the full column set is known; memory still holds one page
+    at a time.
+    Serialization time (not the time spent waiting for pages) is recorded as
+    the `export` stage, into `stats` when given.
+    """
+    fmt = format.lower().strip()
+    if fmt not in STREAM_FORMATS:
+        raise ValueError('Unsupported format')
+    clock = metrics.Stopwatch()
+    try:
+        yield from _iter_file(pages, fmt, clock)
+    finally:
+        metrics.record('export', clock.elapsed, stats, metrics.EXPORT_SECONDS, format=fmt)
+
+
+def _iter_file(
+    pages: Iterable[Tuple[Optional[int], Union[pd.DataFrame, Dict[str, pd.DataFrame]]]],
+    fmt: str,
+    clock: metrics.Stopwatch,
+) -> Iterator[bytes]:
+    if fmt == 'jsonl':
+        wrote = False
+        for _, df in _page_frames(pages):
+            with clock:
+                chunk = _serialize(df, fmt, not wrote)
+            if chunk:
+                wrote = True
+                yield chunk
+        if not wrote:
+            yield _serialize(pd.DataFrame([{"message": "No data"}]), fmt, True)
+        return
+
+    spools = {'tables': _FrameSpool(), 'rows': _FrameSpool()}
+    try:
+        for kind, df in _page_frames(pages):
+            with clock:
+                spools[kind].add(df)
+        # Pages with tables win over row pages, as in merge_pages
+        spool = spools['tables'] if spools['tables'].count else spools['rows']
+        if spool is spools['rows'] and not spool.rows:
+            frames: Iterable[pd.DataFrame] = [pd.DataFrame([{"message": "No data"}])]
+            template = None
+        else:
+            frames = spool.frames()
+            template = pd.concat(spool.heads, ignore_index=True)
+            # The heads hold only some of each categorical's values: such columns
+            # serialize like their values, so leave them to each frame
+            dtypes = {
+                col: dtype for col, dtype in template.dtypes.items()
+                if not isinstance(dtype, pd.CategoricalDtype)
+            }
+        if fmt == 'json':
+            yield b'['
+        first = True
+        for df in frames:
+            with clock:
+                if template is not None:
+                    df = df.reindex(columns=template.columns)
+                    if not df.dtypes.equals(template.dtypes):
+                        df = df.astype(dtypes)
+                chunk = _serialize(df, fmt, first)
+            if chunk or fmt != 'json':
+                first = False
+            if chunk:
+                yield chunk
+        if fmt == 'json':
+            yield b']'
+    finally:
+        for spool in spools.values():
+            spool.close()
@@ -0,0 +1,62 @@
+"""Optional warm-up of the scraping stack.
+
+The web app imports pandas, lxml and requests only when a scrape needs them,
+so cold starts (e.g. Vercel serverless invocations) serve `GET /` without
+paying for them. Long-running servers can load them up front instead:
+
+  SCRAPER_WARMUP  off (default) | on: load in a background thread at startup,
+                  so the first scrape finds them ready without delaying
+                  startup | sync: load before the app is returned (with a
+                  preloading server, forked workers inherit the imports)
+
+Warm-up imports the scraping modules, builds the shared HTTP session and
+compiles the fallback content selector. Its duration is exposed as the
+`scraper_warmup_seconds` gauge.
+"""
+import importlib
+import threading
+import time
+from typing import Optional
+
+from . import metrics
+
+# Modules behind scrape requests, heaviest dependencies first
+WARM_MODULES = ("app.utils", "app.plans", "app.normalize", "app.incremental", "app.crawler")
+
+_elapsed: Optional[float] = None
+
+
+def warm_up() -> float:
+    """Import and initialize the scraping stack; returns the seconds it took."""
+    global _elapsed
+    start = time.perf_counter()
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    from .extract import FALLBACK_CONTENT_SELECTOR, compile_selector
+    from .fetcher import get_session
+    get_session()
+    compile_selector(FALLBACK_CONTENT_SELECTOR)
+    _elapsed = time.perf_counter() - start
+    return _elapsed
+
+
+def start_warmup(mode: Optional[str]) -> Optional[threading.Thread]:
+    """Warm up as configured by `mode` (SCRAPER_WARMUP); returns the background thread, if any."""
+    mode = (mode or "").strip().lower()
+    if mode in {"", "0", "false", "off", "no"}:
+        return None
+    if mode == "sync":
+        warm_up()
+        return None
+    if mode not in {"1", "true", "on", "yes", "background"}:
+        raise ValueError(f"Invalid SCRAPER_WARMUP: {mode}")
+    thread = threading.Thread(target=warm_up, name="scraper-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+WARMUP_SECONDS = metrics.Gauge(
+    "scraper_warmup_seconds",
+    "Seconds the startup warm-up took (absent until it has run).",
+    lambda: _elapsed,
+)
@@ -0,0 +1 @@
+"""Offline benchmarks for the scrape and export hot paths (see benchmarks/README.md)."""
@@ -0,0 +1,105 @@
+"""Deterministic HTML fixtures for the benchmarks.
+
+Each fixture is generated from a fixed seed and recorded under
+`benchmarks/fixtures/` on first use, so every run (and every machine) parses
+byte-identical pages. Run `python -m benchmarks.fixtures` to (re)record them.
+"""
+import random
+from pathlib import Path
+from typing import Callable, Dict
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+
+WORDS = (
+    "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi "
+    "omicron pi rho sigma tau upsilon phi chi psi omega"
+).split()
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _page(title: str, body: str) -> str:
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{title}</title><style>td {{ padding: 2px }}</style></head>"
+        f"<body><main><h1>{title}</h1>{body}</main></body></html>"
+    )
+
+
+def _table(rng: random.Random, rows: int, cols: int) -> str:
+    head = "".join(f"<th>col_{c}</th>" for c in range(cols))
+    body = []
+    for r in range(rows):
+        cells = []
+        for c in range(cols):
+            if c == 0:
+                cells.append(f"<td>{_words(rng, 2)}</td>")
+            elif c % 3 == 0:
+                cells.append(f"<td>{rng.randint(1000, 9_999_999):,}</td>")
+            else:
+                cells.append(f"<td>{rng.random() * 1000:.2f}</td>")
+        body.append(f"<tr>{''.join(cells)}</tr>")
+    return f"<table class='data'><thead><tr>{head}</tr></thead><tbody>{''.join(body)}</tbody></table>"
+
+
+def small_page() -> str:
+    rng = random.Random(1)
+    paragraphs = "".join(f"<p>{_words(rng, 30)}</p>" for _ in range(5))
+    return _page("Small page", paragraphs + _table(rng, 20, 4))
+
+
+def huge_table() -> str:
+    rng = random.Random(2)
+    return _page("Huge table", _table(rng, 20000, 8))
+
+
+def many_tables() -> str:
+    rng = random.Random(3)
+    sections = "".join(
+        f"<section><h2>Table {i}</h2>{_table(rng, rng.randint(3, 15), 5)}</section>"
+        for i in range(300)
+    )
+    return _page("Many tables", sections)
+
+
+def link_heavy() -> str:
+    rng = random.Random(4)
+    items = "".join(
+        f"<li class='item item-{i % 7}'><a href='/articles/{i}?ref=bench' title='{_words(rng, 3)}'>"
+        f"{_words(rng, 6)}</a> <img src='/img/{i}.png' alt=''></li>"
+        for i in range(5000)
+    )
+    return _page("Link heavy", f"<ul>{items}</ul>")
+
+
+FIXTURES: Dict[str, Callable[[], str]] = {
+    "small_page": small_page,
+    "huge_table": huge_table,
+    "many_tables": many_tables,
+    "link_heavy": link_heavy,
+}
+
+
+def load(name: str) -> str:
+    """Return fixture `name`, recording it on first use."""
+    path = FIXTURE_DIR / f"{name}.html"
+    if path.exists():
+        return path.read_text(encoding="utf-8")
+    html = FIXTURES[name]()
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    path.write_text(html, encoding="utf-8")
+    return html
+
+
+def record() -> None:
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    for name, build in FIXTURES.items():
+        html = build()
+        (FIXTURE_DIR / f"{name}.html").write_text(html, encoding="utf-8")
+        print(f"{name}: {len(html.encode('utf-8')):,} bytes")
+
+
+if __name__ == "__main__":
+    record()
@@ -0,0 +1,285 @@
+"""Benchmark runner.
+
+    python -m benchmarks.run                      # all cases, results to benchmarks/results/
+    python -m benchmarks.run --only export/ --repeat 10
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Times `scrape_data` in each mode (single page per fixture, page_param and
+next_selector pagination against the local server), `generate_file` for
+each format (through `iter_file` for the streamed formats) and the cold start
+of the web app (importing `api/index.py` and serving `GET /` in a new interpreter). Each case runs in a fresh interpreter so its peak RSS is its own;
+results (p50/p99 latency, throughput, peak RSS) are written as JSON and can
+be compared against an earlier run.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+EXPORT_FORMATS = ("csv", "xlsx", "json", "jsonl", "txt", "parquet", "arrow")
+EXPORT_FIXTURES = ("many_tables", "huge_table")
+ROOT_DIR = Path(__file__).resolve().parents[1]
+# Dependencies a cold `GET /` should not have to import
+HEAVY_MODULES = ("pandas", "numpy", "lxml", "requests", "bs4", "pyarrow", "playwright", "celery")
+
+# Run in a fresh interpreter per startup sample; prints its measurements as JSON
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from api.index import app
+imported = time.perf_counter()
+from starlette.testclient import TestClient
+status = TestClient(app).get("/").status_code
+served = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "get_s": served - imported,
+    "status": status,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def cases(pages: int) -> List[Dict[str, Any]]:
+    from .fixtures import FIXTURES
+    result = [{"name": "startup/get_root", "kind": "startup"}]
+    result += [{"name": f"scrape/single/{name}", "kind": "scrape", "fixture": name} for name in FIXTURES]
+    result.append({
+        "name": "scrape/page_param/small_page", "kind": "scrape", "fixture": "small_page",
+        "path": "/list/small_page", "options": {"page_param": "page", "page_start": 1, "page_end": pages},
+    })
+    result.append({
+        "name": "scrape/next_selector/small_page", "kind": "scrape", "fixture": "small_page",
+        "path": "/list/small_page?page=1", "options": {"next_selector": "a.next", "max_pages": pages},
+    })
+    # The same CPU-heavy pages parsed in the fetch threads, then in a parser pool on every core
+    cores = os.cpu_count() or 1
+    paged = {"page_param": "page", "page_start": 1, "page_end": pages, "concurrency": cores}
+    result.append({
+        "name": "scrape/page_param/many_tables", "kind": "scrape", "fixture": "many_tables",
+        "path": "/list/many_tables", "options": paged,
+    })
+    result.append({
+        "name": "scrape/parse_workers/many_tables", "kind": "scrape", "fixture": "many_tables",
+        "path": "/list/many_tables", "options": dict(paged, parse_workers=cores),
+    })
+    for name in EXPORT_FIXTURES:
+        for fmt in EXPORT_FORMATS:
+            result.append({"name": f"export/{fmt}/{name}", "kind": "export", "fixture": name, "format": fmt})
+    return result
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _count_rows(data) -> int:
+    if isinstance(data, dict):
+        return sum(len(df) for df in data.values())
+    return len(data)
+
+
+def run_startup(repeat: int) -> Dict[str, Any]:
+    """Cold start: import the serverless entry point and serve `GET /`, each
+    sample in a new interpreter. Also lists the heavy modules that got loaded."""
+    env = {k: v for k, v in os.environ.items() if k != "SCRAPER_WARMUP"}
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], cwd=str(ROOT_DIR), env=env,
+                             capture_output=True, text=True, timeout=120)
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "startup failed"}
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    timings = [s["import_s"] + s["get_s"] for s in samples]
+    return {
+        "repeat": repeat,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "import_p50_ms": round(percentile([s["import_s"] for s in samples], 0.5) * 1000, 3),
+        "get_p50_ms": round(percentile([s["get_s"] for s in samples], 0.5) * 1000, 3),
+        "status": samples[-1]["status"],
+        "heavy_modules": samples[-1]["loaded"],
+        "peak_rss_mb": None,
+    }
+
+
+def run_case(case: Dict[str, Any], repeat: int, latency: float, pages: int) -> Dict[str, Any]:
+    """Run one case in this process and return its measurements."""
+    if case["kind"] == "startup":
+        return run_startup(repeat)
+    from app.cache import set_cache
+    from app.extract import ParsedPage
+    from app.utils import STREAM_FORMATS, generate_file, iter_file, scrape_data
+    from .fixtures import load
+    from .server import BenchServer
+
+    set_cache(None)  # measure the network and parse path, not the response cache
+    html = load(case["fixture"])
+    timings: List[float] = []
+    with BenchServer(latency=latency, pages=pages) as server:
+        if case["kind"] == "scrape":
+            url = server.base + case.get("path", f"/fixture/{case['fixture']}")
+            options = case.get("options", {})
+            fetched = len(html.encode("utf-8")) * (pages if options else 1)
+
+            def once():
+                return scrape_data(url, **options)
+        else:
+            data = ParsedPage(html, server.base).extract()
+            fmt = case["format"]
+
+            if fmt in STREAM_FORMATS:
+                # The path /scrape takes for streamable formats. iter_file labels
+                # the frames it is given in place, so hand it shallow copies
+                def once():
+                    fresh = {k: df.copy(deep=False) for k, df in data.items()}
+                    return b"".join(iter_file([(None, fresh)], fmt))
+            else:
+                def once():
+                    return generate_file(data, fmt)
+
+        try:
+            result = once()  # warm-up: imports, connection pool, selector cache
+        except (ImportError, ValueError) as e:
+            return {"skipped": str(e)}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = once()
+            timings.append(time.perf_counter() - start)
+
+    p50 = percentile(timings, 0.5)
+    measured: Dict[str, Any] = {
+        "repeat": repeat,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "peak_rss_mb": None,
+    }
+    if case["kind"] == "scrape":
+        rows = _count_rows(result)
+        measured.update(rows=rows, input_bytes=fetched, mb_per_s=round(fetched / p50 / 1e6, 3))
+    else:
+        rows = _count_rows(data)
+        measured.update(rows=rows, output_bytes=len(result), mb_per_s=round(len(result) / p50 / 1e6, 3))
+    measured["rows_per_s"] = round(rows / p50, 1)
+    rss = peak_rss_bytes()
+    if rss is not None:
+        measured["peak_rss_mb"] = round(rss / 2**20, 1)
+    return measured
+
+
+def _child(case, repeat, latency, pages, queue) -> None:
+    try:
+        queue.put(run_case(case, repeat, latency, pages))
+    except Exception as e:  # report, don't hang the parent
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(case: Dict[str, Any], repeat: int, latency: float, pages: int) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(case, repeat, latency, pages, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print p50 ratios against `baseline`; return the cases slower than `threshold`."""
+    regressions = []
+    print(f"\n{'case':45} {'base p50':>10} {'p50':>10} {'ratio':>7}")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name, {})
+        if "p50_ms" not in result or "p50_ms" not in before:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        flag = "  <-- slower" if ratio > threshold else ""
+        print(f"{name:45} {before['p50_ms']:>10.1f} {result['p50_ms']:>10.1f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", default=[], help="run cases whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed iterations per case (after one warm-up)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated server latency per response")
+    parser.add_argument("--pages", type=int, default=10, help="pages fetched by the pagination cases")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio counted as a regression")
+    parser.add_argument("--no-isolate", action="store_true", help="run all cases in this process (peak RSS is then cumulative)")
+    args = parser.parse_args(argv)
+
+    selected = [c for c in cases(args.pages) if not args.only or any(s in c["name"] for s in args.only)]
+    runner = run_case if args.no_isolate else run_isolated
+    latency = args.latency_ms / 1000
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "latency_ms": args.latency_ms,
+            "pages": args.pages,
+        },
+        "results": {},
+    }
+    for case in selected:
+        result = runner(case, args.repeat, latency, args.pages)
+        report["results"][case["name"]] = result
+        if "p50_ms" in result:
+            throughput = (f"{result['rows_per_s']:>12,.0f} rows/s" if "rows_per_s" in result
+                          else f"heavy imports: {', '.join(result.get('heavy_modules', [])) or 'none'}")
+            print(f"{case['name']:45} p50 {result['p50_ms']:>9.1f} ms  p99 {result['p99_ms']:>9.1f} ms  "
+                  f"{throughput}  rss {result['peak_rss_mb']} MB")
+        else:
+            print(f"{case['name']:45} {result.get('skipped') or result.get('error')}")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Local stand-in HTTP server for benchmarks.
+
+  /fixture/<name>                a recorded fixture
+  /list/<name>?page=N            fixture <name> paginated: pages 1..`pages`,
+                                 each but the last with an `a.next` link to the next one
+
+Every response is delayed by `latency` seconds to simulate a remote site.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from . import fixtures
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like real sites
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        segments = parts.path.strip("/").split("/")
+        if server.latency:
+            time.sleep(server.latency)
+        body: Optional[str] = None
+        if len(segments) == 2 and segments[1] in fixtures.FIXTURES:
+            kind, name = segments
+            if kind == "fixture":
+                body = server.page(name)
+            elif kind == "list":
+                page = int(parse_qs(parts.query).get("page", ["1"])[0])
+                if 1 <= page <= server.pages:
+                    body = server.page(name)
+                if body is not None and page < server.pages:
+                    link = f"<a class='next' href='/list/{name}?page={page + 1}'>next</a>"
+                    body = body.replace("</main>", f"{link}</main>", 1)
+        if body is None:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, pages: int = 10):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.pages = pages
+        self.base = f"http://127.0.0.1:{self.server_address[1]}"
+        self._pages = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def page(self, name: str) -> str:
+        if name not in self._pages:
+            self._pages[name] = fixtures.load(name)
+        return self._pages[name]
+
+    def __enter__(self) -> "BenchServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+
+def page_html(n):
+    return (
+        "<html><body>"
+        f"<h1>Page {n}</h1>"
+        f"<table><tr><th>item</th><th>value</th></tr><tr><td>row{n}</td><td>{n * 10}</td></tr></table>"
+        f"<a class='next' href='/list?page={n + 1}'>next</a>"
+        "</body></html>"
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        page = int(parse_qs(parts.query).get('page', ['1'])[0])
+        with server.lock:
+            server.hits.append((self.path, time.monotonic()))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            with server.lock:
+                failures = server.flaky.get(parts.path, 0)
+                if failures:
+                    server.flaky[parts.path] = failures - 1
+            if failures:
+                self.send_response(503)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if parts.path in server.pages:
+                body = server.pages[parts.path]
+            elif parts.path == '/list' and page <= server.last_page:
+                body = page_html(page)
+            else:
+                self.send_error(404)
+                return
+            content_type = 'text/html; charset=utf-8'
+            if isinstance(body, tuple):
+                content_type, body = body
+            data = body if isinstance(body, bytes) else body.encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(data).hexdigest()
+            if server.etags and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            if server.etags:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    """Local HTML site: /list?page=N pages with a table each, plus custom `pages`.
+
+    A `pages` value may be a (content type, body) pair.
+    `flaky` maps a path to a number of 503 responses served before succeeding.
+    Responses carry an ETag and honor If-None-Match unless `etags` is False.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.latency = 0.0
+    server.last_page = 5
+    server.pages = {}
+    server.flaky = {}
+    server.etags = True
+    server.base = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def response_cache(tmp_path):
+    """Give every test its own empty HTTP response cache."""
+    from app.cache import ResponseCache, set_cache
+    cache = ResponseCache(tmp_path / 'http-cache')
+    set_cache(cache)
+    yield cache
+    set_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def result_store(tmp_path):
+    """Give every test its own empty result store."""
+    from app.store import ResultStore, set_result_store
+    store = ResultStore(tmp_path / 'results')
+    set_result_store(store)
+    yield store
+    set_result_store(None)
@@ -12,3 +12,156 @@ def test_scrape():
     response = client.post("/scrape", json={"url": "https://en.wikipedia.org/wiki/List_of_countries_by_GDP_(nominal)", "format": "csv"})
     assert response.status_code == 200
     assert "job_id" in response.json()
+
+def test_scrape_async_job(site, tmp_path, monkeypatch):
+    from app.tasks import celery_app
+    monkeypatch.setenv("SCRAPER_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    response = client.post("/scrape?async=1", data={
+        "url": f"{site.base}/list", "format": "csv",
+        "page_param": "page", "page_start": "1", "page_end": "3",
+    })
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    status = client.get(f"/status/{job_id}").json()
+    assert status["status"] == "completed"
+    assert (status["pages_done"], status["pages_total"]) == (3, 3)
+    result = client.get(f"/result/{job_id}")
+    assert result.headers["content-type"].startswith("text/csv")
+    assert "p3_table_1,row3,30" in result.text
+
+    # Compressed at rest, served as stored to clients that accept gzip
+    assert result.headers["content-encoding"] == "gzip"
+    etag = result.headers["etag"]
+    assert client.get(f"/result/{job_id}", headers={"If-None-Match": etag}).status_code == 304
+    plain = client.get(f"/result/{job_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.text == result.text
+    part = client.get(f"/result/{job_id}", headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206 and part.content == result.content[:10]
+    assert part.headers["content-range"] == f"bytes 0-9/{len(result.content)}"
+    assert client.get(f"/result/{job_id}", headers={"Range": "bytes=99999-"}).status_code == 416
+
+def test_status_unknown_job():
+    assert client.get("/status/not-a-job").status_code == 404
+
+def test_scrape_streams_jsonl(site):
+    response = client.post("/scrape", data={
+        "url": f"{site.base}/list", "format": "jsonl",
+        "page_param": "page", "page_start": "1", "page_end": "2",
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.splitlines() == [
+        '{"table":"p1_table_1","item":"row1","value":10}',
+        '{"table":"p2_table_1","item":"row2","value":20}',
+    ]
+
+
+def test_metrics_and_server_timing(site, monkeypatch):
+    monkeypatch.setenv("SCRAPER_SERVER_TIMING", "1")
+    response = client.post("/scrape", data={"url": f"{site.base}/list?page=1", "format": "csv"})
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert "fetch;dur=" in timing and "parse;dur=" in timing and "total;dur=" in timing
+    body = client.get("/metrics").text
+    assert 'scraper_stage_seconds_count{stage="fetch"}' in body
+    assert 'scraper_request_seconds_bucket{format="csv",le="+Inf"}' in body
+    assert "scraper_cache_hit_ratio" in body
+
+
+def test_scrape_batch_reports_errors(site):
+    urls = f"{site.base}/list?page=1\n# comment\n{site.base}/missing\nftp://nope\n"
+    response = client.post(
+        "/scrape/batch",
+        data={"urls": urls, "format": "csv", "per_host": "2"},
+        files={"file": ("urls.csv", f"url\n{site.base}/list?page=2\n".encode())},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Batch-Errors"] == "2"
+    lines = response.text.splitlines()
+    assert lines[0].startswith("table,source_url,item,value")
+    assert f"u1_table_1,{site.base}/list?page=1,row1,10" in response.text
+    assert f"u4_table_1,{site.base}/list?page=2,row2,20" in response.text
+    assert "ftp://nope" in response.text and "Invalid URL" in response.text
+
+
+def test_crawl_endpoint(site):
+    site.pages['/'] = "<html><body><table><tr><th>n</th></tr><tr><td>1</td></tr></table><a href='/list'>x</a></body></html>"
+    response = client.post("/crawl", data={"url": f"{site.base}/", "format": "csv", "max_depth": "1"})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0].startswith("table,source_url")
+    assert f"p2_table_1,{site.base}/list" in response.text
+    bad = client.post("/crawl", data={"url": f"{site.base}/", "format": "csv", "follow_pattern": "("})
+    assert bad.status_code == 400
+
+
+def test_scrape_incremental_headers(site, tmp_path):
+    from app.incremental import SnapshotStore, set_store
+    set_store(SnapshotStore(str(tmp_path / 'snapshots.sqlite')))
+    try:
+        form = {"url": f"{site.base}/list?page=1", "format": "csv", "incremental": "diff"}
+        first = client.post("/scrape", data=form)
+        assert first.headers["X-Changes"] == "added=1, removed=0, changed=0"
+        assert "table,_change,item,value" in first.text
+        second = client.post("/scrape", data=form)
+        assert second.headers["X-Unchanged-Pages"] == "1"
+        assert client.post("/scrape", data={**form, "incremental": "bogus"}).status_code == 400
+    finally:
+        set_store(None)
+
+
+def test_scrape_with_fields_plan(site):
+    site.pages['/items'] = "<ul><li id='a'><b>one</b></li><li id='b'><b>two</b></li></ul>"
+    form = {"url": f"{site.base}/items", "format": "csv", "selector": "li"}
+    response = client.post("/scrape", data={**form, "fields": '{"id": "@id", "label": "b"}'})
+    assert response.text.splitlines() == ["id,label", "a,one", "b,two"]
+    assert client.post("/scrape", data={**form, "plan": "no-such-plan"}).status_code == 400
+    assert client.post("/scrape", data={**form, "fields": "[1]"}).status_code == 400
+
+
+def test_client_max_bytes_is_capped_by_the_server_limit(site):
+    from app import fetcher
+    from app.routes import scrape_options
+    previous = fetcher.max_bytes_limit()
+    fetcher.configure(max_bytes=1000)
+    try:
+        assert scrape_options({"max_bytes": "50000"})["max_bytes"] == 1000
+        assert scrape_options({"max_bytes": "500"})["max_bytes"] == 500
+        form = {"url": f"{site.base}/list?page=1", "format": "csv"}
+        for value in ("0", "-1"):
+            assert client.post("/scrape", data={**form, "max_bytes": value}).status_code == 400
+            assert client.post("/crawl", data={**form, "max_bytes": value}).status_code == 400
+    finally:
+        fetcher.configure(max_bytes=previous)
+
+
+def test_max_rows_must_be_positive(site):
+    from app.utils import iter_pages
+    form = {"url": f"{site.base}/list?page=1", "format": "csv"}
+    for value in ("0", "-1"):
+        for path in ("/scrape", "/crawl"):
+            assert client.post(path, data={**form, "max_rows": value}).status_code == 400
+        with pytest.raises(ValueError):
+            next(iter_pages(form["url"], max_rows=int(value)))
+    response = client.post("/scrape", data={**form, "max_rows": "1"})
+    assert response.status_code == 200 and response.text.splitlines()[1:] == ["table_1,row1,10"]
+
+
+def test_warmup_modes():
+    from app import metrics
+    from app.warmup import start_warmup
+    assert start_warmup("off") is None
+    start_warmup("on").join(timeout=30)
+    assert "scraper_warmup_seconds " in metrics.render()
+    with pytest.raises(ValueError):
+        start_warmup("later")
+
+def test_result_of_failed_job_is_a_conflict(tmp_path, monkeypatch):
+    import uuid
+    from app import jobs
+    monkeypatch.setenv("SCRAPER_DATA_DIR", str(tmp_path))
+    job_id = str(uuid.uuid4())
+    jobs.update_job(job_id, status=jobs.FAILED, error="No tables found")
+    response = client.get(f"/result/{job_id}")
+    assert response.status_code == 409
+    assert response.json()["detail"] == "No tables found"
@@ -0,0 +1,24 @@
+from benchmarks.run import percentile, run_case
+
+
+def test_percentile_interpolates():
+    assert percentile([1, 2, 3, 4], 0.5) == 2.5
+    assert percentile([5], 0.99) == 5
+
+
+def test_run_case_scrape_and_export():
+    scrape = run_case({'name': 's', 'kind': 'scrape', 'fixture': 'small_page'}, repeat=1, latency=0, pages=2)
+    assert scrape['rows'] == 20 and scrape['p50_ms'] > 0
+    paged = run_case({
+        'name': 'p', 'kind': 'scrape', 'fixture': 'small_page', 'path': '/list/small_page?page=1',
+        'options': {'next_selector': 'a.next', 'max_pages': 5},
+    }, repeat=1, latency=0, pages=2)
+    assert paged['rows'] == 40
+    export = run_case({'name': 'e', 'kind': 'export', 'fixture': 'small_page', 'format': 'jsonl'}, repeat=1, latency=0, pages=2)
+    assert export['output_bytes'] > 0
+
+
+def test_startup_case_imports_no_scraping_dependencies():
+    startup = run_case({'name': 'startup', 'kind': 'startup'}, repeat=1, latency=0, pages=1)
+    assert startup['status'] == 200
+    assert startup['heavy_modules'] == []
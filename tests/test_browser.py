@@ -0,0 +1,152 @@
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.browser import BrowserPool
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.browser = browser
+        self.url = None
+
+    def route(self, pattern, handler):
+        pass
+
+    def goto(self, url, wait_until=None, timeout=None):
+        self.browser.check_thread()
+        if "crash" in url:
+            self.browser.connected = False
+            raise RuntimeError("Target closed")
+        if "fail" in url:
+            raise RuntimeError("Navigation failed")
+        self.url = url
+
+    def wait_for_selector(self, selector, timeout=None):
+        pass
+
+    def wait_for_timeout(self, ms):
+        pass
+
+    def content(self):
+        return f"<html>{self.url} browser {self.browser.number}</html>"
+
+    def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    def new_page(self):
+        self.browser.check_thread()
+        self.browser.pages += 1
+        return FakePage(self.browser)
+
+    def clear_cookies(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.number = len(driver.browsers)
+        self.thread = threading.current_thread()
+        self.connected = True
+        self.closed = False
+        self.pages = 0
+
+    def check_thread(self):
+        # Playwright objects may only be used from the thread that created them
+        assert threading.current_thread() is self.thread
+
+    def is_connected(self):
+        return self.connected and not self.closed
+
+    def new_context(self):
+        return FakeContext(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    def __init__(self):
+        self.browsers = []
+        self.lock = threading.Lock()
+        self.chromium = self
+        self.stopped = False
+
+    def launch(self, headless=True):
+        with self.lock:
+            browser = FakeBrowser(self)
+            self.browsers.append(browser)
+        return browser
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    driver = FakeDriver()
+    sync_api = types.ModuleType("playwright.sync_api")
+    sync_api.sync_playwright = lambda: types.SimpleNamespace(start=lambda: driver)
+    package = types.ModuleType("playwright")
+    package.sync_api = sync_api
+    monkeypatch.setitem(sys.modules, "playwright", package)
+    monkeypatch.setitem(sys.modules, "playwright.sync_api", sync_api)
+    return driver
+
+
+def test_browser_pool_leases_warm_browsers_across_threads(playwright):
+    pool = BrowserPool(size=2, max_uses=100)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda i: pool.render(f"http://x/{i}"), range(40)))
+    finally:
+        pool.close()
+    assert [url for _, url in results] == [f"http://x/{i}" for i in range(40)]
+    assert len(playwright.browsers) == 2
+    assert sum(b.pages for b in playwright.browsers) == 40
+    assert all(b.closed for b in playwright.browsers)
+    assert playwright.stopped
+
+
+def test_browser_pool_recycles_after_max_uses(playwright):
+    pool = BrowserPool(size=1, max_uses=2)
+    try:
+        for i in range(5):
+            pool.render(f"http://x/{i}")
+    finally:
+        pool.close()
+    assert [b.pages for b in playwright.browsers] == [2, 2, 1]
+    assert all(b.closed for b in playwright.browsers)
+
+
+def test_browser_pool_recovers_after_a_failed_render(playwright):
+    pool = BrowserPool(size=1, max_uses=100)
+    try:
+        pool.render("http://x/1")
+        with pytest.raises(RuntimeError, match="Navigation failed"):
+            pool.render("http://x/fail")
+        # A navigation error leaves the connected browser in service
+        html, _ = pool.render("http://x/2")
+        assert "browser 0" in html
+        with pytest.raises(RuntimeError, match="Target closed"):
+            pool.render("http://x/crash")
+        # A crashed browser is replaced before the next job
+        html, url = pool.render("http://x/3")
+    finally:
+        pool.close()
+    assert url == "http://x/3" and "browser 1" in html
+    assert len(playwright.browsers) == 2
+    assert playwright.browsers[0].closed
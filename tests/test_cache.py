@@ -0,0 +1,40 @@
+import time
+
+from app import fetcher
+from app.cache import ResponseCache, normalize_url
+from app.utils import scrape_data
+
+
+def test_normalize_url():
+    assert normalize_url("HTTP://Example.com:80/a?b=2&a=1#frag") == "http://example.com/a?a=1&b=2"
+    assert normalize_url("https://example.com:8443") == "https://example.com:8443/"
+
+
+def test_revalidates_with_etag(site):
+    url = f"{site.base}/list?page=1"
+    first = fetcher.fetch_text(url)
+    second = fetcher.fetch_text(url)
+    assert (first[2], second[2]) == (fetcher.MISS, fetcher.REVALIDATED)
+    assert first[0] == second[0]
+    assert len(site.hits) == 2
+
+
+def test_fresh_entries_skip_network(site, response_cache):
+    response_cache.ttl = 60
+    stats = {}
+    for _ in range(3):
+        scrape_data(f"{site.base}/list?page=1", stats=stats)
+    assert {k: v for k, v in stats.items() if k.startswith("cache_")} == {"cache_miss": 1, "cache_hit": 2}
+    assert stats["pages"] == 3
+    assert len(site.hits) == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path / "c", ttl=60, max_bytes=2500)
+    for i in range(3):
+        cache.put(cache.key(f"http://x/{i}"), b"x" * 1000, final_url=f"http://x/{i}", etag="e")
+        time.sleep(0.01)
+        cache.get(cache.key("http://x/0"))  # keep the first entry recently used
+    assert cache.get(cache.key("http://x/0")) is not None
+    assert cache.get(cache.key("http://x/1")) is None
+    assert cache.get(cache.key("http://x/2")) is not None
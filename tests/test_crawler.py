@@ -0,0 +1,56 @@
+from app.crawler import Frontier, crawl
+
+
+def _page(name, links):
+    anchors = "".join(f"<a href='{href}'>{href}</a>" for href in links)
+    return (
+        f"<html><body><table><tr><th>name</th></tr><tr><td>{name}</td></tr></table>"
+        f"{anchors}</body></html>"
+    )
+
+
+def _graph(site):
+    site.pages.update({
+        '/': _page('root', ['/a', '/b', '/a#top', '/logo.png', 'https://other.example/x']),
+        '/a': _page('a', ['/c', '/', '/private/secret']),
+        '/b': _page('b', ['/c', '/d']),
+        '/c': _page('c', ['/e']),
+        '/d': _page('d', []),
+        '/e': _page('e', []),
+        '/private/secret': _page('secret', []),
+        '/robots.txt': "User-agent: *\nDisallow: /private\n",
+    })
+
+
+def test_crawl_breadth_first_with_dedup_and_depth(site):
+    _graph(site)
+    stats = {}
+    data = crawl(f"{site.base}/", max_depth=2, concurrency=3, stats=stats)
+    names = [df['name'][0] for df in data.values()]
+    assert names == ['root', 'a', 'b', 'c', 'd']  # /e is depth 3
+    assert data['p2_table_1']['source_url'][0] == f"{site.base}/a"
+    assert stats['robots_blocked'] == 1
+    assert stats['pages'] == 5
+    fetched = [path for path, _ in site.hits]
+    assert fetched.count('/c') == 1 and fetched.count('/robots.txt') == 1
+    assert '/private/secret' not in fetched and '/logo.png' not in fetched
+
+
+def test_crawl_max_pages_and_pattern(site):
+    _graph(site)
+    data = crawl(f"{site.base}/", max_pages=2, respect_robots=False)
+    assert [df['name'][0] for df in data.values()] == ['root', 'a']
+    data = crawl(f"{site.base}/", follow_pattern=r"/[bd]$", respect_robots=False)
+    assert [df['name'][0] for df in data.values()] == ['root', 'b', 'd']
+
+
+def test_frontier_dedups_normalized_urls(tmp_path):
+    frontier = Frontier(str(tmp_path / 'frontier.sqlite'))
+    assert frontier.add(['http://Example.com/a?y=2&x=1', 'http://example.com/b'], 0) == 2
+    assert frontier.add(['http://example.com/a?x=1&y=2', 'http://example.com/c'], 1) == 1
+    assert frontier.pop() == ('http://Example.com/a?y=2&x=1', 0)
+    assert frontier.pop() == ('http://example.com/b', 0)
+    assert frontier.pop() == ('http://example.com/c', 1)
+    assert frontier.pop() is None
+    assert frontier.seen() == 3
+    frontier.close()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.executor import ScrapeExecutor, set_executor
+from app.main import app
+from app.utils import ScrapeCancelled, iter_pages
+
+
+def _request(host):
+    return Request({"type": "http", "client": (host, 1234), "headers": []})
+
+
+def test_admission_returns_429_then_503():
+    executor = ScrapeExecutor(workers=1, queue=1, per_client=1)
+    try:
+        first = executor.admit(_request("10.0.0.1"))
+        with pytest.raises(HTTPException) as exc:
+            executor.admit(_request("10.0.0.1"))
+        assert exc.value.status_code == 429 and exc.value.headers["Retry-After"] == "5"
+        executor.admit(_request("10.0.0.2"))
+        with pytest.raises(HTTPException) as exc:
+            executor.admit(_request("10.0.0.3"))
+        assert exc.value.status_code == 503
+        first.release()
+        first.release()  # idempotent
+        assert executor.active == 1
+        executor.admit(_request("10.0.0.1"))
+    finally:
+        executor.shutdown()
+
+
+def test_cancel_stops_between_pages(site):
+    cancel = threading.Event()
+    pages = iter_pages(f"{site.base}/list", next_selector="a.next", cancel=cancel, use_cache=False)
+    assert next(pages)[0] == 1
+    cancel.set()
+    with pytest.raises(ScrapeCancelled):
+        next(pages)
+    assert len(site.hits) == 1
+
+
+def test_slow_scrape_does_not_block_other_requests(site):
+    site.latency = 0.5
+    set_executor(ScrapeExecutor(workers=2, queue=0))
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            scrape = asyncio.ensure_future(client.post("/scrape", data={
+                "url": f"{site.base}/list", "format": "xlsx",
+                "page_param": "page", "page_start": "1", "page_end": "2", "concurrency": "1",
+            }))
+            await asyncio.sleep(0.1)
+            started = time.perf_counter()
+            home = await client.get("/")
+            elapsed = time.perf_counter() - started
+            return home, elapsed, await scrape
+
+    try:
+        home, elapsed, scraped = asyncio.run(main())
+    finally:
+        set_executor(None)
+    assert home.status_code == 200 and elapsed < 0.4
+    assert scraped.status_code == 200
@@ -0,0 +1,107 @@
+import pandas as pd
+
+from app.extract import ParsedPage, stream_extract
+
+TABLE_PAGE = """<html><body>
+<table><thead><tr><th rowspan=2>Country</th><th colspan=2>GDP</th></tr><tr><th>IMF</th><th>WB</th></tr></thead>
+<tbody><tr><td>USA<br>US</td><td>25,462,700</td><td>25,460,000</td></tr>
+<tr style="display:none"><td>Hidden</td><td>1</td><td>2</td></tr></tbody></table>
+<table style="display:none"><tr><td>hidden table</td></tr></table>
+<a class="next" href="?page=2">next</a>
+</body></html>"""
+
+
+def test_tables_match_read_html_semantics():
+    data = ParsedPage(TABLE_PAGE, "http://example.com/list").extract()
+    assert list(data) == ["table_1"]
+    df = data["table_1"]
+    assert list(df.columns) == ["('Country', 'Country')", "('GDP', 'IMF')", "('GDP', 'WB')"]
+    assert df.iloc[0].tolist() == ["USA US", 25462700, 25460000]
+
+
+def test_malformed_spans_do_not_fail_the_page():
+    html = """<table><tr><th>a</th><th>b</th><th>c</th></tr>
+    <tr><td colspan="2px">wide</td><td rowspan="x">1</td></tr></table>
+    <table><tr><th>ok</th></tr><tr><td>2</td></tr></table>"""
+    data = ParsedPage(html, "http://x/").extract()
+    assert data["table_1"].iloc[0].tolist() == ["wide", "wide", 1]
+    assert data["table_2"]["ok"].tolist() == [2]
+
+
+def test_next_url_uses_same_tree():
+    page = ParsedPage(TABLE_PAGE, "http://example.com/list")
+    assert page.next_url("a.next") == "http://example.com/list?page=2"
+    assert page.next_url("a.missing") is None
+
+
+def test_rows_and_soupsieve_fallback():
+    html = "<html><body><p class=' a  b '>Hello <b>world</b><script>x()</script></p><a href='/x' title='t'>Link</a></body></html>"
+    page = ParsedPage(html, "http://example.com/dir/")
+    rows = page.extract("p:-soup-contains('Hello'), a")
+    assert rows["text"].tolist() == ["Hello world", "Link"]
+    assert rows["classes"].tolist()[0] == "a b"
+    assert rows["href"].tolist()[1] == "http://example.com/x"
+
+
+def test_empty_document():
+    df = ParsedPage("", "http://example.com/").extract()
+    assert df["text"].tolist() == [""]
+
+
+def test_url_resolver_matches_urljoin():
+    from urllib.parse import urljoin
+    from app.extract import UrlResolver
+    base = "https://example.com/dir/page.html?x=1"
+    resolver = UrlResolver(base)
+    for href in ["/a?b=1#c", "a/b", "../up", "/./x", "//cdn.example.com/i.png", "https://other.org/p",
+                 "http://plain.org/", "/q?", "#top", "mailto:someone@example.com", " /space", "/a;p"]:
+        assert resolver.resolve(href) == urljoin(base, href)
+    assert resolver.resolve("") is None
+
+
+def test_fallback_element_cap():
+    html = "<ul>" + "".join(f"<li>item {i}</li>" for i in range(30)) + "</ul>"
+    page = ParsedPage(html, "http://x/")
+    assert len(page.extract(max_elements=10)) == 10 and page.truncated
+    page = ParsedPage(html, "http://x/")
+    assert len(page.extract(max_elements=0)) == 30 and not page.truncated
+
+
+def test_stream_extract_stops_once_rows_are_read():
+    rows = "".join(f"<tr><td>{i}</td><td>v{i}</td></tr>" for i in range(5000))
+    html = f"<html><body><table><tr><th>n</th><th>v</th></tr>{rows}</table></body></html>"
+    chunks = (html[i:i + 4096] for i in range(0, len(html), 4096))
+    consumed = []
+
+    def tracked():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    page, data, stopped = stream_extract(
+        tracked(), "http://x/", lambda p, open_elements: p.extract_limited(None, 20, 0, open_elements), check_bytes=8192)
+    assert stopped and sum(map(len, consumed)) < len(html) / 4
+    expected = ParsedPage(html, "http://x/").extract(max_rows=20)
+    pd.testing.assert_frame_equal(data["table_1"], expected["table_1"])
+    assert len(data["table_1"]) == 20
+
+
+def test_stream_extract_reads_whole_page_when_needed():
+    html = "<ul>" + "".join(f"<li>item {i}</li>" for i in range(30)) + "</ul>"
+    page, data, stopped = stream_extract(
+        [html[:50], html[50:]], "http://x/", lambda p, o: p.extract_limited("li", 100, 0, o), check_bytes=10)
+    assert not stopped and data["text"].tolist() == [f"item {i}" for i in range(30)]
+
+
+def test_stream_extract_with_raw_text_end_tag_split_across_chunks():
+    rows = "".join(f"<tr><td>{i}</td></tr>" for i in range(200))
+    html = ("<html><head><style>p { color: red }</style><script>var a = '<b>';</script></head>"
+            f"<body><table><tr><th>n</th></tr>{rows}</table><p>after</p></body></html>")
+    for tag in ("</style>", "</script>"):
+        start = html.index(tag)
+        for cut in range(start, start + len(tag) + 1):
+            for max_rows in (5, 500):
+                page, data, stopped = stream_extract(
+                    [html[:cut], html[cut:]], "http://x/",
+                    lambda p, o: p.extract_limited(None, max_rows, 0, o), check_bytes=10)
+                assert data["table_1"]["n"].tolist() == list(range(min(max_rows, 200))), (tag, cut)
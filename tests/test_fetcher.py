@@ -0,0 +1,36 @@
+import pytest
+import requests
+from app import fetcher
+
+
+def test_session_is_shared():
+    assert fetcher.get_session() is fetcher.get_session()
+
+
+def test_fetch_retries_transient_errors(site):
+    site.flaky['/list'] = 2
+    resp = fetcher.fetch(f"{site.base}/list?page=1")
+    assert resp.status_code == 200
+    assert len(site.hits) == 3
+
+
+def test_fetch_gives_up_after_retries(site):
+    fetcher.configure(retries=1, backoff=0)
+    try:
+        site.flaky['/list'] = 5
+        with pytest.raises(requests.HTTPError):
+            fetcher.fetch(f"{site.base}/list?page=1")
+        assert len(site.hits) == 2
+    finally:
+        fetcher.configure(retries=3, backoff=0.5)
+
+
+def test_fetch_text_limits_size_and_content_type(site):
+    site.pages['/big'] = "<html><body>" + "<p>x</p>" * 1000 + "</body></html>"
+    site.pages['/image'] = ('image/png', b'\x89PNG\r\n\x1a\n' + b'\0' * 100)
+    with pytest.raises(fetcher.ResponseRejected):
+        fetcher.fetch_text(f"{site.base}/big", use_cache=False, max_bytes=1000)
+    with pytest.raises(fetcher.ResponseRejected):
+        fetcher.fetch_text(f"{site.base}/image", use_cache=False)
+    text, _, _ = fetcher.fetch_text(f"{site.base}/big", use_cache=False, max_bytes=0)
+    assert text == site.pages['/big']
@@ -0,0 +1,57 @@
+import pytest
+
+from app.incremental import SnapshotStore, iter_changes, job_key
+from app.plans import ExtractionPlan
+from app.utils import merge_pages
+
+
+def _table(rows):
+    cells = "".join(f"<tr><td>{a}</td><td>{b}</td></tr>" for a, b in rows)
+    return f"<html><body><table><tr><th>id</th><th>v</th></tr>{cells}</table></body></html>"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.sqlite'))
+    yield store
+    store.close()
+
+
+def test_changes_by_key(site, store):
+    site.pages['/t'] = _table([(1, 'a'), (2, 'b'), (3, 'c')])
+    first = merge_pages(iter_changes(f"{site.base}/t", store=store, key=['id']))
+    assert first['table_1']['_change'].tolist() == ['added'] * 3
+
+    site.pages['/t'] = _table([(1, 'a'), (2, 'B'), (4, 'd')])
+    stats = {}
+    diff = merge_pages(iter_changes(f"{site.base}/t", store=store, key=['id'], stats=stats))['table_1']
+    assert diff[['_change', 'id', 'v']].values.tolist() == [['changed', 2, 'B'], ['added', 4, 'd'], ['removed', 3, 'c']]
+    assert (stats['rows_added'], stats['rows_removed'], stats['rows_changed']) == (1, 1, 1)
+
+
+def test_unchanged_pages_skip_parsing(site, store):
+    options = dict(page_param='page', page_start=1, page_end=3, store=store, use_cache=False)
+    list(iter_changes(f"{site.base}/list", **options))
+    stats = {}
+    data = merge_pages(iter_changes(f"{site.base}/list", stats=stats, **options))
+    assert stats['pages_unchanged'] == 3
+    assert 'time_parse' not in stats
+    assert data['message'].tolist() == ['No data']
+
+
+def test_keyless_changes_and_log(site, store):
+    site.pages['/t'] = _table([(1, 'a'), (1, 'a')])
+    list(iter_changes(f"{site.base}/t", store=store, job='daily'))
+    site.pages['/t'] = _table([(1, 'a'), (1, 'z')])
+    diff = merge_pages(iter_changes(f"{site.base}/t", store=store, job='daily', log=True))['table_1']
+    assert list(diff.columns[:2]) == ['_change', '_at']
+    assert diff[['_change', 'v']].values.tolist() == [['added', 'z'], ['removed', 'a']]
+
+
+def test_job_key_ignores_runtime_options():
+    base = job_key("http://x/", "table", normalize=True)
+    assert job_key("http://x/", "table", normalize=True, max_bytes=1000, parse_workers=4,
+                   page_filter=lambda p, html: True, concurrency=2) == base
+    assert job_key("http://x/", "table", normalize=True, max_rows=5) != base
+    spec = {"selector": "li", "fields": {"name": "h2"}}
+    assert job_key("http://x/", plan=ExtractionPlan("li", {"name": "h2"})) == job_key("http://x/", plan=spec)
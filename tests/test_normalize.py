@@ -0,0 +1,61 @@
+import io
+
+import pandas as pd
+
+from app.normalize import concat_frames, frame_bytes, normalize_frame
+from app.utils import generate_file, iter_file, iter_pages, merge_pages
+
+
+def test_normalize_frame_types():
+    df = pd.DataFrame({
+        'population': ['1,234,567[1]', '12,000', '−5', '—', '7 500'],
+        'gdp': ['1.5[a]', '2', '3.25', 'n/a', '4†'],
+        'phone': ['555 1234', '555 9999', '1', '2', '3'],
+        'founded': ['12 March 2021', 'Mar 5, 2020', '2020-01-01', None, '1 Jan 2000'],
+        'rank': [1, 2, 3, 4, 5],
+    })
+    normalize_frame(df)
+    assert df['population'].tolist()[:3] == [1234567, 12000, -5]
+    assert df['population'].isna().tolist() == [False, False, False, True, False]
+    assert df['gdp'].tolist()[:3] == [1.5, 2, 3.25]
+    assert df['phone'].dtype == object
+    assert df['founded'].dt.strftime('%Y-%m-%d').tolist()[:3] == ['2021-03-12', '2020-03-05', '2020-01-01']
+    assert df['rank'].dtype == 'int8'
+
+
+def test_low_cardinality_strings_become_categoricals():
+    df = pd.DataFrame({'tag': ['a', 'div'] * 500, 'text': [f"item {i}" for i in range(1000)]})
+    before = frame_bytes(df)
+    normalize_frame(df)
+    assert isinstance(df['tag'].dtype, pd.CategoricalDtype)
+    assert df['text'].dtype == object
+    assert frame_bytes(df) < before * 0.6
+
+
+def test_concat_frames_keeps_categoricals():
+    a = pd.DataFrame({'tag': pd.Categorical(['a', 'b'])})
+    b = pd.DataFrame({'tag': pd.Categorical(['c', 'a'])})
+    merged = concat_frames([a, b])
+    assert isinstance(merged['tag'].dtype, pd.CategoricalDtype)
+    assert merged['tag'].tolist() == ['a', 'b', 'c', 'a']
+
+
+def test_normalized_scrape_reports_memory_and_exports(site):
+    rows = "".join(f"<p class='c{i % 2}'>{i:,}[{i % 3 + 1}]</p>" for i in range(990, 1030))
+    site.pages['/rows'] = f"<html><body>{rows}</body></html>"
+    site.pages['/rows2'] = f"<html><body>{rows}<p class='c2'>x</p></body></html>"
+
+    def pages():
+        for p, path in enumerate(['/rows', '/rows2'], start=1):
+            for _, data in iter_pages(f"{site.base}{path}", 'p', normalize=True, stats=stats):
+                yield p, data
+
+    stats = {}
+    merged = merge_pages(pages())
+    assert isinstance(merged['tag'].dtype, pd.CategoricalDtype)
+    assert 0 < stats['memory_bytes'] < stats['memory_raw_bytes']
+    assert 'time_normalize' in stats
+    for fmt in ('csv', 'json'):
+        assert b''.join(iter_file(pages(), fmt)) == generate_file(merge_pages(pages()), fmt)
+    csv = pd.read_csv(io.BytesIO(generate_file(merged, 'csv')))
+    assert csv.columns[0] == 'page' and len(csv) == 81
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.extract import ParsedPage
+from app.plans import ExtractionPlan, clear_plans, compile_plan, get_plan, register_plan, resolve_plan
+from app.utils import scrape_data
+
+PRODUCTS = """
+<html><body><ul>
+  <li class="product" data-sku="A1"><h2>Widget <small>new</small></h2><span class="price">9.99</span><a href="/w">more</a></li>
+  <li class="product" data-sku="B2"><h2>Gadget</h2><span class="price">19.50</span></li>
+  <li class="product"></li>
+</ul><a class="next" href="/p2">next</a></body></html>
+"""
+
+
+@pytest.fixture(autouse=True)
+def plans():
+    clear_plans()
+    yield
+    clear_plans()
+
+
+def test_plan_fields():
+    plan = ExtractionPlan("li.product", {
+        "sku": "@data-sku", "name": "h2", "price": "./span[@class='price']", "url": "a@href", "link": "./a/@href",
+    })
+    df = plan.extract(ParsedPage(PRODUCTS, "https://shop.test/list"))
+    assert df.to_dict("records") == [
+        {"sku": "A1", "name": "Widget new", "price": "9.99", "url": "https://shop.test/w", "link": "https://shop.test/w"},
+        {"sku": "B2", "name": "Gadget", "price": "19.50", "url": None, "link": None},
+    ]
+
+
+def test_plans_are_cached_and_registered(tmp_path, monkeypatch):
+    spec = {"selector": "//li[@data-sku]", "fields": {"sku": "@data-sku"}}
+    assert resolve_plan(spec) is resolve_plan(dict(spec)) is compile_plan(spec["selector"], (("sku", "@data-sku"),))
+    path = tmp_path / "plans.json"
+    path.write_text(json.dumps({"skus": spec}))
+    monkeypatch.setenv("SCRAPER_PLANS", str(path))
+    assert get_plan("skus").fields == {"sku": "@data-sku"}
+    register_plan("names", "li.product", {"name": "h2"})
+    assert resolve_plan("names").name == "names"
+    with pytest.raises(ValueError):
+        get_plan("missing")
+    with pytest.raises(ValueError):
+        resolve_plan({"selector": "li", "fields": {"x": "//["}})
+
+
+def test_scrape_data_with_named_plan(site):
+    site.pages["/p1"] = PRODUCTS
+    site.pages["/p2"] = PRODUCTS.replace("A1", "C3").replace('href="/p2"', "")
+    register_plan("products", "li.product", {"sku": "@data-sku", "price": ".price"})
+    df = scrape_data(f"{site.base}/p1", plan="products", next_selector="a.next")
+    assert df[["page", "sku"]].values.tolist() == [[1, "A1"], [1, "B2"], [2, "C3"], [2, "B2"]]
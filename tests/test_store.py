@@ -0,0 +1,45 @@
+import json
+
+from app.store import ResultStore
+
+
+def _content(n):
+    return b"".join(b"row %06d,some text\n" % i for i in range(n))
+
+
+def test_identical_results_share_a_compressed_blob(tmp_path):
+    store = ResultStore(tmp_path, codec="gzip", block_size=4096)
+    data = _content(2000)
+    first = store.put("job-a", [data[:1000], data[1000:]], "csv")
+    second = store.put("job-b", data, "csv")
+    assert first["digest"] == second["digest"] and first["size"] == len(data)
+    assert first["stored_size"] < len(data) // 2
+    assert len([p for p in (tmp_path / "blobs").glob("*/*") if not p.name.endswith(".idx")]) == 1
+
+    result = store.open("job-b")
+    assert b"".join(result.iter_range()) == data
+    # Ranges crossing frame boundaries only decode the frames they touch
+    assert b"".join(result.iter_range(4000, 9000)) == data[4000:9000]
+    assert b"".join(result.iter_range(len(data) - 5)) == data[-5:]
+
+
+def test_precompressed_artifacts_are_stored_raw(tmp_path):
+    store = ResultStore(tmp_path, codec="gzip")
+    ref = store.put("job", b"PK\x03\x04zipdata", "parquet.zip")
+    assert ref["encoding"] is None
+    assert b"".join(store.open("job").iter_range(2, 6)) == b"\x03\x04zi"
+
+
+def test_ttl_and_quota_eviction(tmp_path):
+    store = ResultStore(tmp_path, codec=None, max_bytes=25_000)
+    store.put("old", _content(1000), "csv")
+    store.put("new", _content(1001), "csv")
+    assert store.open("old") is None and store.open("new") is not None
+
+    store.ttl = 3600
+    ref = tmp_path / "refs" / "new.json"
+    record = json.loads(ref.read_text())
+    ref.write_text(json.dumps({**record, "created_at": record["created_at"] - 7200}))
+    assert store.open("new") is None
+    store.evict()
+    assert not ref.exists()
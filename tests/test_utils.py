@@ -1,5 +1,5 @@
 import pandas as pd
-from app.utils import scrape_data, generate_file
+from app.utils import scrape_data, generate_file, iter_batch, iter_pages
 
 def test_scrape_data():
     # Mock or use a test URL
@@ -10,3 +10,151 @@ def test_generate_file():
     df = pd.DataFrame({'a': [1, 2], 'b': [3, 4]})
     content = generate_file(df, 'csv')
     assert b'a,b' in content
+
+def test_scrape_data_page_param_concurrent(site):
+    site.latency = 0.2
+    data = scrape_data(f"{site.base}/list", page_param='page', page_start=1, page_end=5, concurrency=5)
+    assert list(data) == [f"p{p}_table_1" for p in range(1, 6)]
+    assert data['p3_table_1']['item'].tolist() == ['row3']
+    assert site.max_in_flight > 1
+
+def test_scrape_data_per_host_and_delay(site):
+    scrape_data(f"{site.base}/list", page_param='page', page_start=1, page_end=4,
+                concurrency=4, per_host=1, delay_ms=100)
+    assert site.max_in_flight == 1
+    starts = sorted(t for _, t in site.hits)
+    assert all(b - a >= 0.09 for a, b in zip(starts, starts[1:]))
+
+def test_scrape_data_dynamic_falls_back_to_static(site):
+    data = scrape_data(f"{site.base}/list?page=2", dynamic=True, block_resources=True)
+    assert data['table_1']['item'].tolist() == ['row2']
+
+def test_iter_pages_max_rows_stops_early(site):
+    rows = "".join(f"<tr><td>{i}</td></tr>" for i in range(20000))
+    site.pages['/long'] = f"<html><body><table><tr><th>n</th></tr>{rows}</table></body></html>"
+    stats = {}
+    [(_, data)] = list(iter_pages(f"{site.base}/long", max_rows=5, stats=stats))
+    assert data['table_1']['n'].tolist() == [0, 1, 2, 3, 4]
+    assert stats['pages_stopped_early'] == 1 and stats['rows'] == 5
+    assert 'time_fetch' in stats and 'time_parse' in stats
+    # A page cut short is not cached, so a full read fetches it again
+    full = scrape_data(f"{site.base}/long")
+    assert len(full['table_1']) == 20000 and len(site.hits) == 2
+
+def test_parse_workers_match_in_thread_parsing(site):
+    from app.parsepool import set_parse_pool
+    try:
+        for options in ({'page_param': 'page', 'page_start': 1, 'page_end': 5},
+                        {'next_selector': 'a.next', 'max_pages': 5}):
+            expected = scrape_data(f"{site.base}/list", **options)
+            stats = {}
+            data = scrape_data(f"{site.base}/list", parse_workers=2, normalize=True, stats=stats, **options)
+            assert list(data) == list(expected)
+            assert data['p5_table_1']['value'].tolist() == [50]
+            assert stats['pages'] == 5 and 'time_parse' in stats and 'memory_bytes' in stats
+        [(_, _, batch, error)] = iter_batch([f"{site.base}/list?page=3"], parse_workers=2)
+        assert error is None and batch['table_1']['item'].tolist() == ['row3']
+    finally:
+        set_parse_pool(None)
+
+def test_parse_pool_replaced_while_a_scrape_uses_it(site, monkeypatch):
+    from app import utils
+    from app.parsepool import set_parse_pool
+
+    def no_parent_parsing(*args):
+        raise AssertionError("pages must be parsed in the pool")
+
+    try:
+        monkeypatch.setattr(utils, 'ParsedPage', no_parent_parsing)
+        first = iter_pages(f"{site.base}/list", page_param='page', page_start=1, page_end=5, parse_workers=1)
+        assert next(first)[1]['table_1']['item'].tolist() == ['row1']
+        # A scrape asking for more workers replaces the shared pool mid-way through the first
+        second = scrape_data(f"{site.base}/list?page=1", next_selector='a.next', max_pages=5, parse_workers=2)
+        assert second['p5_table_1']['item'].tolist() == ['row5']
+        rest = [data['table_1']['item'].tolist() for _, data in first]
+        assert rest == [['row2'], ['row3'], ['row4'], ['row5']]
+    finally:
+        set_parse_pool(None)
+
+def test_iter_file_matches_generate_file():
+    import numpy as np
+    from app.utils import iter_file, merge_pages
+
+    def pages():
+        return [
+            (1, {'table_1': pd.DataFrame({'a': [np.nan, 'x'], 'b': [1, 2]})}),
+            (2, {'table_1': pd.DataFrame({'a': [1, 2], 'c': [True, False]})}),
+            (3, pd.DataFrame({'text': ['rows are dropped when tables exist']})),
+        ]
+    for fmt in ('csv', 'txt', 'json'):
+        assert b''.join(iter_file(pages(), fmt)) == generate_file(merge_pages(pages()), fmt)
+    lines = b''.join(iter_file(pages(), 'jsonl')).decode().splitlines()
+    assert lines[0] == '{"table":"p1_table_1","a":null,"b":1}'
+    assert lines[-1] == '{"page":3,"text":"rows are dropped when tables exist"}'
+
+def test_generate_file_parquet_keeps_numeric_dtypes():
+    import io
+    import pyarrow.parquet as pq
+    tables = {
+        'p1_table_1': pd.DataFrame({'name': ['a', 'b'], 'value': ['1', '2']}),
+        'p2_table_1': pd.DataFrame({'name': ['c'], 'value': [3.5]}),
+    }
+    table = pq.read_table(io.BytesIO(generate_file(tables, 'parquet')))
+    assert str(table.schema.field('value').type) == 'double'
+    assert table.column('table').to_pylist() == ['p1_table_1', 'p1_table_1', 'p2_table_1']
+
+def test_generate_file_xlsx_dedupes_sheet_names():
+    import io
+    from openpyxl import load_workbook
+    from app.utils import write_xlsx
+    long = 'p1_table_' + 'x' * 40
+    sheets = {long: pd.DataFrame({'a': [1]}), long + 'y': pd.DataFrame({'a': [2]}), 'a/b': pd.DataFrame()}
+    for engine in ('xlsxwriter', 'openpyxl'):
+        wb = load_workbook(io.BytesIO(write_xlsx(sheets, engine=engine)))
+        assert wb.sheetnames == [long[:31], long[:29] + '~2', 'a_b']
+        assert wb.worksheets[1]['A2'].value == 2
+        assert wb.worksheets[2]['A2'].value == 'No data'
+
+def test_generate_file_xlsx_writes_infinity_as_text():
+    import io
+    from openpyxl import load_workbook
+    from app.utils import write_xlsx
+    df = pd.read_html(io.StringIO("<table><tr><th>v</th></tr><tr><td>inf</td></tr><tr><td>-inf</td></tr><tr><td>1.5</td></tr></table>"))[0]
+    for engine in ('xlsxwriter', 'openpyxl'):
+        sheet = load_workbook(io.BytesIO(write_xlsx({'t': df}, engine=engine))).active
+        assert [sheet[f'A{r}'].value for r in (2, 3, 4)] == ['inf', '-inf', 1.5]
+
+def test_generate_file_xlsx_rejects_oversized_sheets(monkeypatch):
+    import pytest
+    from app import utils
+    monkeypatch.setattr(utils, 'XLSX_MAX_ROWS', 3)
+    assert utils.write_xlsx({'t': pd.DataFrame({'a': [1, 2]})})
+    for engine in ('xlsxwriter', 'openpyxl'):
+        with pytest.raises(ValueError, match="allows 2 per sheet"):
+            utils.write_xlsx({'t': pd.DataFrame({'a': [1, 2, 3]})}, engine=engine)
+
+def test_metrics_histogram_render():
+    from app.metrics import Histogram, _registry
+    h = Histogram('test_latency_seconds', 'Test.', ('stage',), buckets=(0.1, 1))
+    try:
+        h.observe(0.05, stage='a')
+        h.observe(0.5, stage='a')
+        h.observe(5, stage='a')
+        lines = h.render().splitlines()
+    finally:
+        _registry.remove(h)
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{stage="a"} 3' in lines
+
+def test_scrape_batch_keys_by_source(site):
+    from app.utils import scrape_batch
+    stats = {}
+    urls = [f"{site.base}/list?page={n}" for n in (1, 2, 3)] + [f"{site.base}/missing"]
+    data = scrape_batch(urls, url_concurrency=4, per_host=2, stats=stats)
+    assert list(data) == ['u1_table_1', 'u2_table_1', 'u3_table_1', 'errors']
+    assert data['u2_table_1'].iloc[0].tolist() == [urls[1], 'row2', 20]
+    assert data['errors']['source_url'].tolist() == [urls[3]]
+    assert stats['errors'] == 1 and stats['pages'] == 3
+    assert site.max_in_flight <= 2